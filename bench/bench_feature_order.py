@@ -0,0 +1,61 @@
+#!/usr/bin/python
+
+import gzip
+import sys
+
+from shapely.wkt import loads as loads_wkt
+
+from mapbox_vector_tile import encode
+from mapbox_vector_tile.encoder import on_invalid_geometry_ignore
+
+FEATURES_PER_TILE = 500
+FEATURE_ORDERS = (None, "hilbert", "zorder")
+
+
+def make_layers(shapes):
+    print(f"Creating layers with {FEATURES_PER_TILE} shapes each")
+    layers = []
+    features = []
+    for i, shape in enumerate(shapes):
+        try:
+            geom = loads_wkt(shape.strip())
+        except Exception:
+            continue
+        features.append({"geometry": geom, "properties": {"id": i}})
+        if len(features) >= FEATURES_PER_TILE:
+            layers.append(features)
+            features = []
+    if features:
+        layers.append(features)
+    return layers
+
+
+def run_test(layers):
+    print("Running compressed size test")
+    sizes = {feature_order: [0, 0] for feature_order in FEATURE_ORDERS}
+    for layer in layers:
+        layer_description = {"features": layer, "name": "bar"}
+        for feature_order in FEATURE_ORDERS:
+            tile = encode(
+                layer_description,
+                default_options={"on_invalid_geometry": on_invalid_geometry_ignore, "feature_order": feature_order},
+            )
+            sizes[feature_order][0] += len(tile)
+            sizes[feature_order][1] += len(gzip.compress(tile))
+
+    print(f"{len(layers)} tiles produced")
+    print(f"{'feature_order':<15}{'raw bytes':>15}{'gzip bytes':>15}{'gzip ratio':>15}")
+    reference = sizes[None][1]
+    for feature_order, (raw, compressed) in sizes.items():
+        ratio = compressed / reference if reference else 0.0
+        print(f"{feature_order!s:<15}{raw:>15}{compressed:>15}{ratio:>15.3f}")
+
+
+if __name__ == "__main__":
+    print("Usage : ")
+    print("wget https://gist.githubusercontent.com/lexman/c759d1007e520040cb9f1e41b7af85c2/raw/fgeoms.wkt.zip")
+    print("zcat fgeoms.wkt.zip | head -10000 | python bench_feature_order.py")
+    shapes = sys.stdin
+    if not shapes.isatty():
+        layers = make_layers(shapes)
+        run_test(layers)
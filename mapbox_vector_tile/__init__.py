@@ -1,14 +1,18 @@
+import mmap
 import warnings
+from collections.abc import Sequence
+from pathlib import Path
 
 from mapbox_vector_tile import decoder, encoder
 
 
-def decode(tile, per_layer_options=None, default_options=None, **kwargs):
+def decode(tile, per_layer_options=None, default_options=None, cache=None, **kwargs):
     """Decode the provided `tile`
 
     Args:
         tile:
-            The tile to decode.
+            The tile to decode, as `bytes` or any object supporting the buffer protocol, such as a `memoryview` slice
+            of a memory-mapped archive, which is parsed without being copied.
 
         per_layer_options:
             An optional dictionary containing per layer options. The keys are the layer names and the values are
@@ -17,7 +21,12 @@ def decode(tile, per_layer_options=None, default_options=None, **kwargs):
 
         default_options:
             These options are taken for layers without entry in `per_layer_options`. For all missing options values,
-            the global default values are taken.
+            the global default values are taken. The options can also be given as `DecodeOptions` objects from the file
+            `utils.py`, which are validated once and can be reused for many calls.
+
+        cache:
+            An optional `DecodeCache`, from the file `cache.py`, returning the tiles already decoded with the same
+            options as read-only results shared by all the callers.
 
     Returns:
         The decoded layers data.
@@ -35,17 +44,48 @@ def decode(tile, per_layer_options=None, default_options=None, **kwargs):
     if kwargs:
         warnings.warn("`decode` signature has changed, use `default_options` instead", DeprecationWarning, stacklevel=2)
         default_options = {**kwargs, **(default_options or {})}
+    if cache is not None:
+        key = cache.tile_key(tile, per_layer_options, default_options)
+        return cache.decode(key, lambda: decode(tile, per_layer_options, default_options))
     vector_tile = decoder.TileData(pbf_data=tile, per_layer_options=per_layer_options, default_options=default_options)
     message = vector_tile.get_message()
     return message
 
 
-def encode(layers, per_layer_options=None, default_options=None, **kwargs):
+def decode_from_file(path, offset=0, length=None, per_layer_options=None, default_options=None, cache=None):
+    """Decode the tile stored in the file `path` at `offset`, of `length` bytes or up to the end of the file by
+    default. The file is memory-mapped and the tile is parsed from a view of the mapping, so that the tiles of large
+    local archives are read without copying them. The other arguments are the ones of `decode`."""
+    with Path(path).open("rb") as file:
+        size = file.seek(0, 2)
+        end = size if length is None else offset + length
+        if offset < 0 or (length is not None and length < 0) or end > size:
+            raise ValueError(f"The range of {length} bytes at {offset} is out of the {size} bytes of the file {path}.")
+        if offset == end:
+            # empty files can't be memory-mapped
+            return decode(b"", per_layer_options, default_options, cache=cache)
+        # the view must be released before the mapping is closed
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped)[offset:end] as tile:
+            return decode(tile, per_layer_options, default_options, cache=cache)
+
+
+def encode(
+    layers,
+    per_layer_options=None,
+    default_options=None,
+    max_bytes=None,
+    size_strategy="drop_smallest",
+    priority_property=None,
+    threads=None,
+    cache=None,
+    **kwargs,
+):
     """Encode the `layers` into a MVT tile.
 
     Args:
         layers:
-            The layer data to encode.
+            The layer data to encode. The `features` of a layer can be a list of feature dictionaries, or a
+            `FeatureColumns` object from the file `columns.py`, giving the geometries, properties and ids as columns.
 
         per_layer_options:
             An optional dictionary containing per layer options. The keys are the layer names and the values are
@@ -54,7 +94,30 @@ def encode(layers, per_layer_options=None, default_options=None, **kwargs):
 
         default_options:
             These options are taken for layers without entry in `per_layer_options`. For all missing options values,
-            the global default values are taken.
+            the global default values are taken. The options can also be given as `EncodeOptions` objects from the file
+            `utils.py`, which are validated once and can be reused for many calls.
+
+        max_bytes:
+            An optional maximum size of the encoded tile in bytes. When the tile exceeds it, its layers are rebuilt
+            from the already loaded and quantized geometries according to `size_strategy` until the tile fits.
+
+        size_strategy:
+            The strategy used to reduce the size of a tile exceeding `max_bytes`: `simplify` to progressively simplify
+            the geometries, `drop_smallest` to drop the smallest polygons and the shortest lines first, in the same
+            proportion for each geometry type, or `priority` to drop the features with the lowest value of the
+            `priority_property` property first. Default to `drop_smallest`. See `VectorTile.fit_to_size` for more
+            details.
+
+        priority_property:
+            The name of the property used by the `priority` size strategy.
+
+        threads:
+            An optional number of threads preparing the features of the layers concurrently. The encoded tile is the
+            same as with a single thread. See `VectorTile.add_layers` for more details.
+
+        cache:
+            An optional `TileCache`, from the file `cache.py`, returning the tiles already encoded with the same
+            quantized content and options without encoding them again.
 
     Returns:
         The encoded tile.
@@ -75,24 +138,77 @@ def encode(layers, per_layer_options=None, default_options=None, **kwargs):
                 * `on_invalid_geometry_raise`: it raises an error if an invalid geometry exists.
                 * `on_invalid_geometry_ignore`: it ignores the invalid geometry and replaces it with a `None`.
                 * `on_invalid_geometry_make_valid`: it tries to make the geometry valid. If it fails, retrieves `None`.
+            The `RepairCache` class of the file `cache.py` wraps such a function with a cache of the repaired
+            geometries.
             * `check_winding_order`: it forces the check of the winding order for polygons. Default to True.
             * `max_geometry_validate_tries`: the number of tries when trying to enforce the good winding order. Default
             to 5.
+            * `compact_values`: when set to `True`, numeric property values are stored using their smallest encoding:
+            `uint_value` for non-negative integers, `sint_value` for negative ones and `float_value` for floats which
+            can be represented as 32 bits floats without loss. Decoded values are unchanged. Default to `False`.
+            * `feature_order`: when set to `"hilbert"` or `"zorder"`, the features of the layer are sorted by the
+            position of the centre of their bounding box along the Hilbert or Z-order curve, which improves the
+            compression ratio of the tile and the spatial locality of the features. Default to `None`, keeping the
+            input order.
+            * `make_valid_engine`: when set to `"geos"` and `on_invalid_geometry` is `on_invalid_geometry_make_valid`,
+            or a `RepairCache` wrapping it, all the invalid polygons of a layer are repaired at once with a vectorized
+            GEOS `make_valid` call (Shapely 2.1 or newer is required). Only the shapes for which this doesn't produce
+            valid, correctly oriented polygons are passed to `on_invalid_geometry`. The other handlers get each invalid
+            shape as usual. Default to `None`, passing each invalid shape to `on_invalid_geometry`.
+            * `repair_time_budget`: the maximum time in seconds spent repairing the geometry of a feature. The repair
+            functions of `polygon.py` stop at their next checkpoint once it is spent. The vectorized repair of the
+            `geos` `make_valid_engine` isn't bounded by this budget, use `repair_max_vertices` to bound it. Default to
+            `None`, no limit.
+            * `repair_max_vertices`: the maximum number of vertices of a geometry to repair. The budgets don't apply
+            to the `on_invalid_geometry_ignore` and `on_invalid_geometry_raise` handlers, which don't repair the
+            geometries. Default to `None`, no limit.
+            * `repair_fallback`: what to do with the geometries exceeding the repair budget: `"convex_hull"` to take
+            their convex hull, `"buffer"` to take their `buffer(0)`, `"simplify"` to simplify them before taking their
+            `buffer(0)`, or `"drop"` to drop them. Such features are reported with a `RepairBudgetWarning`. Default to
+            `"convex_hull"`.
+            * `schema`: a `LayerSchema`, from the file `schema.py`, declaring the keys, and optionally the common
+            values, written first in the key and value tables of the layer. Default to `None`.
+            * `geometry_cache`: a `GeometryCache`, from the file `cache.py`, keeping the quantized, repaired and
+            encoded geometries of the features, so that the features encoded again with the same geometry and
+            geometry options skip the quantization, the validation and the command encoding. Default to `None`.
     """
     if kwargs:
         warnings.warn("`encode` signature has changed, use `default_options` instead", DeprecationWarning, stacklevel=2)
         default_options = {**kwargs, **(default_options or {})}
-    vector_tile = encoder.VectorTile(default_options=default_options)
+    # the prepared features are only kept to fit the tile into its bytes budget
+    vector_tile = encoder.VectorTile(default_options=default_options, keep_prepared=max_bytes is not None)
     if per_layer_options is None:
         per_layer_options = {}
-    if isinstance(layers, list):
-        for layer in layers:
-            layer_name = layer["name"]
-            layer_options = per_layer_options.get(layer_name, None)
-            vector_tile.add_layer(features=layer["features"], name=layer_name, options=layer_options)
+    if not isinstance(layers, list):
+        layers = [layers]
+
+    if cache is not None:
+        # the features are read once for the key, and once more when the tile isn't cached
+        layers = [
+            layer if isinstance(layer["features"], Sequence) else {**layer, "features": list(layer["features"])}
+            for layer in layers
+        ]
+        key = cache.tile_key(
+            layers,
+            per_layer_options,
+            vector_tile.default_options,
+            max_bytes=max_bytes,
+            size_strategy=size_strategy,
+            priority_property=priority_property,
+        )
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+    vector_tile.add_layers(
+        [(layer["name"], layer["features"], per_layer_options.get(layer["name"])) for layer in layers],
+        threads=threads,
+    )
+
+    if max_bytes is not None:
+        data = vector_tile.fit_to_size(max_bytes, strategy=size_strategy, priority_property=priority_property)
     else:
-        layer_name = layers["name"]
-        layer_options = per_layer_options.get(layer_name, None)
-        vector_tile.add_layer(features=layers["features"], name=layer_name, options=layer_options)
-
-    return vector_tile.tile.SerializeToString()
+        data = vector_tile.tile.SerializeToString()
+    if cache is not None:
+        cache.put(key, data)
+    return data
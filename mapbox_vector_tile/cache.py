@@ -0,0 +1,321 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy
+import shapely
+
+from mapbox_vector_tile.columns import FeatureColumns
+from mapbox_vector_tile.geom_encoder import load_geometry
+from mapbox_vector_tile.polygon import make_it_valid
+from mapbox_vector_tile.utils import get_decode_options, get_encode_options
+
+
+def content_hash(data):
+    """Return a short digest identifying the bytes `data`, used as a cache key."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def options_key(options):
+    """Return a hashable cache key of options, holding the option objects, such as the functions, themselves: their
+    repr only holds their id, which is reused once they are freed."""
+    if isinstance(options, Mapping):
+        return tuple(sorted((name, options_key(value)) for name, value in options.items()))
+    if isinstance(options, (list, tuple)):
+        return tuple(options_key(value) for value in options)
+    return options
+
+
+class LRUCache:
+    """
+    A bounded, thread-safe mapping evicting the least recently used entries once it holds more than `maxsize` entries,
+    or, when `max_bytes` is given, once the size of its values, as estimated by `_sizeof`, exceeds `max_bytes`.
+
+    It counts the cache hits, misses and evictions, so that the benefit of the cache can be monitored.
+    """
+
+    def __init__(self, maxsize=1024, max_bytes=None):
+        if maxsize <= 0:
+            raise ValueError(f"The maxsize must be positive. {maxsize} provided.")
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError(f"The max_bytes must be positive. {max_bytes} provided.")
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sizeof(value):
+        """Return the estimated size in bytes of a cached value, counted against `max_bytes`."""
+        return 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._sizeof(self._entries[key])
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self.bytes += size
+            while len(self._entries) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= self._sizeof(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        """The fraction of the lookups which were hits."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self._entries)}
+
+
+_MISSING = object()
+
+
+class RepairCache(LRUCache):
+    """
+    An `on_invalid_geometry` handler caching the geometries repaired by `handler` (default to `make_it_valid`).
+
+    The cache is keyed by a hash of the WKB of the invalid geometry, which the encoder gives to the handler after
+    quantization. The same invalid source geometries, like large administrative boundaries, are then only repaired
+    once for all the tiles they appear in. Geometries which can't be repaired, i.e. for which the handler returns None,
+    are cached too.
+
+    A single instance can be shared by all the `VectorTile` instances, and the threads, of a process:
+
+        repair_cache = RepairCache(maxsize=10000)
+        encode(layers, default_options={"on_invalid_geometry": repair_cache})
+    """
+
+    def __init__(self, handler=make_it_valid, maxsize=1024):
+        super().__init__(maxsize=maxsize)
+        self.handler = handler
+
+    def __call__(self, shape):
+        key = content_hash(shape.wkb)
+        repaired = self.get(key, _MISSING)
+        if repaired is _MISSING:
+            repaired = self.handler(shape)
+            self.put(key, repaired)
+        return repaired
+
+
+class GeometryCache(LRUCache):
+    """
+    A cache of the prepared and encoded geometries of the features, given as the `geometry_cache` encoding option.
+
+    The entries are keyed by a hash of the WKB of the source geometry and by the options changing the encoded
+    geometry: `y_coord_down`, `transformer`, `quantize_bounds`, `extents` and the validation and repair options. They
+    hold the quantized and oriented shape, the feature type and the geometry commands, so that the features encoded
+    again, like the features lying inside a tile at several zoom levels or static overlays encoded at each release,
+    skip the quantization, the winding order enforcement, the validation and the command encoding. The memory use of
+    the cache is bounded by `maxsize` entries and an estimate of `max_bytes` bytes, default to 64 MiB.
+
+        geometry_cache = GeometryCache(max_bytes=256 * 1024 * 1024)
+        encode(layers, default_options={"geometry_cache": geometry_cache})
+    """
+
+    def __init__(self, maxsize=100_000, max_bytes=64 * 1024 * 1024):
+        super().__init__(maxsize=maxsize, max_bytes=max_bytes)
+
+    @staticmethod
+    def _sizeof(value):
+        shape, _, geometry = value
+        # rough size of the shape coordinates, of the command integers and of the Python objects
+        return 16 * int(shapely.get_num_coordinates(shape)) + 8 * len(geometry) + 256
+
+
+def _quantized_wkb(geometries, options):
+    """Return the WKB of the geometries quantized like `LayerEncoder.quantize`, so that the geometries of the tiles
+    with the same content at different places give the same WKB, or of the geometries as is, when they aren't
+    quantized or when they are transformed first."""
+    geometries = numpy.array(geometries, dtype=object)
+    bounds = options.quantize_bounds
+    if bounds is not None and options.transformer is None:
+        minx, miny, maxx, maxy = bounds
+        factors = (options.extents / (maxx - minx), options.extents / (maxy - miny))
+        # numpy.round rounds half to even, like round
+        geometries = shapely.transform(geometries, lambda coords: numpy.round(factors * (coords - (minx, miny))))
+    return shapely.to_wkb(geometries).tolist()
+
+
+class TileCache(LRUCache):
+    """
+    A memo cache of encoded tiles, given as the `cache` argument of `encode`.
+
+    The tiles are keyed by a hash of the content of their layers, with the geometries quantized, and by the encoding
+    options other than `quantize_bounds`, which the keys hold so that functions freed and replaced by new ones at the
+    same address don't match the cached tiles. The many identical tiles of the low and mid zoom levels, such as the open
+    ocean tiles or the tiles covered by a single landcover polygon, are then encoded once, and returned from the cache
+    without building any protobuf message. The memory use of the cache is bounded by `maxsize` tiles and `max_bytes`
+    bytes of encoded tiles.
+
+        tile_cache = TileCache(maxsize=10000, max_bytes=256 * 1024 * 1024)
+        for z, x, y, layers in tiles:
+            data = encode(layers, default_options={"quantize_bounds": tile_bounds(z, x, y)}, cache=tile_cache)
+
+    The options should not include functions with side effects, such as an `on_invalid_geometry` counting the
+    invalid geometries, as these aren't called for the cached tiles.
+    """
+
+    def __init__(self, maxsize=1024, max_bytes=None):
+        super().__init__(maxsize=maxsize, max_bytes=max_bytes)
+
+    @staticmethod
+    def _sizeof(value):
+        return len(value)
+
+    @property
+    def stats(self):
+        return {**super().stats, "bytes": self.bytes, "hit_rate": self.hit_rate}
+
+    @staticmethod
+    def tile_key(layers, per_layer_options=None, default_options=None, **encode_args):
+        """Return the key of the tile encoded by `encode` with the same arguments."""
+        digest = hashlib.blake2b(digest_size=16)
+        layer_options = []
+        for layer in layers:
+            name, features = layer["name"], layer["features"]
+            options = get_encode_options((per_layer_options or {}).get(name), default_options)
+            key_options = options.items()
+            if options.quantize_bounds is not None and options.transformer is None:
+                key_options = [(option, value) for option, value in key_options if option != "quantize_bounds"]
+            layer_options.append((name, options_key(dict(key_options))))
+            if isinstance(features, FeatureColumns):
+                geometries = features.geometries
+                properties = [
+                    (key, list(uniques), numpy.asarray(inverse).tobytes()) for key, uniques, inverse in features.columns
+                ]
+                properties.append(features.ids)
+            else:
+                geometries = [feature.get("geometry") for feature in features]
+                properties = [(feature.get("properties"), feature.get("id")) for feature in features]
+            digest.update(repr((name, len(geometries))).encode())
+            for wkb in _quantized_wkb([load_geometry(geometry) for geometry in geometries], options):
+                digest.update(len(wkb or b"").to_bytes(8, "little"))
+                digest.update(wkb or b"")
+            digest.update(repr(properties).encode())
+        return digest.digest(), tuple(layer_options), options_key(encode_args)
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError(f"The cached {type(self).__name__} can't be modified, copy.deepcopy it first.")
+
+
+class FrozenDict(dict):
+    """A read-only dictionary of the decoded tiles returned by a `DecodeCache`, which `copy.deepcopy` turns into a
+    regular dictionary."""
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class FrozenList(list):
+    """A read-only list of the decoded tiles returned by a `DecodeCache`, which `copy.deepcopy` turns into a regular
+    list."""
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def _freeze(value):
+    """Return the frozen copy of a decoded dictionary or list, and its estimated size in bytes."""
+    size = sys.getsizeof(value)
+    if type(value) is dict:
+        frozen = FrozenDict()
+        for key, item in value.items():
+            if type(item) is dict or type(item) is list:
+                item, item_size = _freeze(item)
+                size += item_size
+            else:
+                size += sys.getsizeof(item)
+            dict.__setitem__(frozen, key, item)
+        return frozen, size
+    items = []
+    for item in value:
+        if type(item) is dict or type(item) is list:
+            item, item_size = _freeze(item)
+            size += item_size
+        else:
+            size += sys.getsizeof(item)
+        items.append(item)
+    return FrozenList(items), size
+
+
+class DecodeCache(LRUCache):
+    """
+    A cache of decoded tiles, given as the `cache` argument of `decode`.
+
+    The decoded tiles are keyed by the blake2b hash of the tile bytes and by the decoding options, so that the hot
+    tiles of a feature info or rendering service are only decoded once. The cached results are shared by all the
+    callers, and are returned as `FrozenDict` and `FrozenList` objects, which behave like regular dictionaries and
+    lists but raise a `TypeError` when modified. `copy.deepcopy` returns a regular, modifiable copy. The memory use of
+    the cache is bounded by `maxsize` tiles and, optionally, an estimate of `max_bytes` bytes of decoded tiles.
+
+        decode_cache = DecodeCache(maxsize=1000, max_bytes=512 * 1024 * 1024)
+        layers = decode(tile, cache=decode_cache)
+    """
+
+    def __init__(self, maxsize=1024, max_bytes=None):
+        super().__init__(maxsize=maxsize, max_bytes=max_bytes)
+
+    @staticmethod
+    def _sizeof(value):
+        return value[1]
+
+    @property
+    def stats(self):
+        return {**super().stats, "bytes": self.bytes, "hit_rate": self.hit_rate}
+
+    @staticmethod
+    def tile_key(tile, per_layer_options=None, default_options=None):
+        """Return the key of the tile decoded by `decode` with the same arguments."""
+        options = options_key(get_decode_options(layer_options=None, default_options=default_options))
+        per_layer = options_key(per_layer_options or {})
+        return hashlib.blake2b(tile, digest_size=16).digest(), options, per_layer
+
+    def decode(self, key, decode_fn):
+        """Return the cached decoded tile of `key`, or decode it with `decode_fn` and cache it."""
+        cached = self.get(key)
+        if cached is None:
+            cached = _freeze(decode_fn())
+            self.put(key, cached)
+        return cached[0]
@@ -0,0 +1,107 @@
+import math
+from collections.abc import Sequence
+
+import numpy
+
+
+def _factorize(column):
+    """Return the unique values of the column, as Python values, and the index of the value of each row in them. The
+    index of the missing values, None and NaN, is -1."""
+    values = numpy.asarray(column)
+    if values.ndim != 1:
+        raise ValueError(f"The property columns must be one dimensional. A column of shape {values.shape} provided.")
+
+    if values.dtype.kind in "biufU":
+        uniques, inverse = numpy.unique(values, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        if values.dtype.kind == "f":
+            inverse[numpy.isnan(values)] = -1
+        return uniques.tolist(), inverse
+
+    # object columns may mix types, and booleans are kept apart from the equal integers
+    uniques = []
+    seen = {}
+    inverse = numpy.empty(len(values), dtype=numpy.intp)
+    for i, v in enumerate(values.tolist()):
+        if v is None or (isinstance(v, float) and math.isnan(v)):
+            inverse[i] = -1
+            continue
+        try:
+            code = seen.setdefault((type(v) is bool, v), len(uniques))
+        except TypeError:
+            # unhashable values can't be encoded anyway
+            inverse[i] = -1
+            continue
+        if code == len(uniques):
+            uniques.append(v)
+        inverse[i] = code
+    return uniques, inverse
+
+
+class FeatureRow:
+    """A feature of `FeatureColumns`, read like a feature dictionary by the encoder."""
+
+    __slots__ = ("columns", "row")
+
+    def __init__(self, columns, row):
+        self.columns = columns
+        self.row = row
+
+    def get(self, name, default=None):
+        if name == "geometry":
+            return self.columns.geometries[self.row]
+        if name == "properties":
+            return self.columns.row_properties(self.row)
+        if name == "id" and self.columns.ids is not None:
+            return self.columns.ids[self.row]
+        return default
+
+
+class FeatureColumns(Sequence):
+    """
+    The features of a layer given as columns: a sequence of geometries, a dictionary of property columns and an
+    optional sequence of ids. The columns can be lists or NumPy arrays, like the columns of a GeoDataFrame:
+
+        FeatureColumns(gdf.geometry.values, {"name": gdf["name"].values}, ids=gdf.index.values)
+
+    It can be given instead of a list of features to `VectorTile.add_layer`, or as the `features` of a layer to
+    `encode`. The values of each column are deduplicated once with `numpy.unique`, so that the key and value tables
+    and the tags of the features are built column by column rather than feature by feature. NumPy scalar values are
+    encoded as the equivalent Python values, and the None and NaN values are skipped, as missing properties.
+    """
+
+    def __init__(self, geometries, properties=None, ids=None):
+        self.geometries = list(geometries)
+        n_rows = len(self.geometries)
+
+        self.ids = None
+        if ids is not None:
+            self.ids = numpy.asarray(ids).tolist()
+            if len(self.ids) != n_rows:
+                raise ValueError(f"The ids column has {len(self.ids)} rows, rather than {n_rows}.")
+
+        # (key, unique values, index of the value of each row) of each property column
+        self.columns = []
+        for key, column in (properties or {}).items():
+            if not isinstance(key, str):
+                raise ValueError(f"The property keys must be strings. {key!r} provided.")
+            uniques, inverse = _factorize(column)
+            if len(inverse) != n_rows:
+                raise ValueError(f"The property column {key!r} has {len(inverse)} rows, rather than {n_rows}.")
+            self.columns.append((key, uniques, inverse))
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [FeatureRow(self, row) for row in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("FeatureColumns index out of range")
+        return FeatureRow(self, index)
+
+    def row_properties(self, row):
+        """Return the properties of the row as a dictionary."""
+        return {key: uniques[inverse[row]] for key, uniques, inverse in self.columns if inverse[row] >= 0}
@@ -8,6 +8,7 @@ from mapbox_vector_tile.utils import (
     POINT,
     POLYGON,
     get_decode_options,
+    tile_buffer,
     zig_zag_decode,
 )
 
@@ -15,8 +16,9 @@ from mapbox_vector_tile.utils import (
 class TileData:
     def __init__(self, pbf_data, per_layer_options=None, default_options=None):
         self.tile = vector_tile.tile()
-        self.tile.ParseFromString(pbf_data)
-        self.default_options = default_options
+        self.tile.ParseFromString(tile_buffer(pbf_data))
+        # validated once, and used as is for the layers without options
+        self.default_options = get_decode_options(layer_options=None, default_options=default_options)
         self.per_layer_options = per_layer_options if per_layer_options is not None else {}
 
     def get_message(self):
@@ -44,17 +46,17 @@ class TileData:
                     geom=feature.geometry,
                     ftype=feature.type,
                     extent=layer.extent,
-                    y_coord_down=layer_options["y_coord_down"],
-                    transformer=layer_options["transformer"],
+                    y_coord_down=layer_options.y_coord_down,
+                    transformer=layer_options.transformer,
                 )
-                if layer_options["geojson"]:
+                if layer_options.geojson:
                     new_feature = {"geometry": geometry, "properties": props, "id": feature.id, "type": "Feature"}
                 else:
                     new_feature = {"geometry": geometry, "properties": props, "id": feature.id, "type": feature.type}
                 features.append(new_feature)
 
             tile_data = {"extent": layer.extent, "version": layer.version, "features": features}
-            if layer_options["geojson"]:
+            if layer_options.geojson:
                 tile_data["type"] = "FeatureCollection"
 
             tile[layer_name] = tile_data
@@ -1,17 +1,50 @@
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from itertools import compress
 from numbers import Number
 
-from shapely.geometry import shape as shapely_shape
-from shapely.geometry.base import BaseGeometry
+import numpy
+import shapely
 from shapely.geometry.multipolygon import MultiPolygon
-from shapely.geometry.polygon import Polygon, orient
+from shapely.geometry.polygon import orient
 from shapely.ops import transform
-from shapely.wkb import loads as load_wkb
-from shapely.wkt import loads as load_wkt
 
-from mapbox_vector_tile.geom_encoder import GeometryEncoder
+from mapbox_vector_tile.cache import RepairCache, content_hash
+from mapbox_vector_tile.columns import FeatureRow
+from mapbox_vector_tile.geom_encoder import GeometryEncoder, load_geometry
 from mapbox_vector_tile.Mapbox import vector_tile_pb2 as vector_tile
-from mapbox_vector_tile.polygon import make_it_valid
-from mapbox_vector_tile.utils import get_encode_options
+from mapbox_vector_tile.polygon import RepairBudgetExceededError, check_repair_budget, make_it_valid, repair_time_budget
+from mapbox_vector_tile.schema import encode_value
+from mapbox_vector_tile.utils import FEATURE_ORDER_CURVES, get_encode_options
+
+# Fallbacks used when the repair of a geometry exceeds its budget, see `LayerEncoder.repair_fallback`.
+REPAIR_FALLBACKS = ("convex_hull", "buffer", "simplify", "drop")
+# Tolerance, in tile units, of the "simplify" repair fallback.
+REPAIR_FALLBACK_SIMPLIFY_TOLERANCE = 4
+
+# Strategies used to reduce the size of a tile exceeding its bytes budget, see `VectorTile.fit_to_size`.
+SIZE_STRATEGIES = ("simplify", "drop_smallest", "priority")
+# Maximum number of times the layers are rebuilt to fit the tile into its bytes budget.
+MAX_SIZE_PASSES = 8
+# Number of passes of the "simplify" strategy which simplify geometries before starting to drop features.
+SIMPLIFY_PASSES = 4
+
+# Number of features of a layer prepared by a same thread by `VectorTile.add_layers`.
+LAYER_CHUNK_SIZE = 256
+
+# Types of the property values which can be encoded, checked before falling back to `isinstance`.
+_VALUE_TYPES = frozenset((str, bool, int, float))
+
+# Number of bits per axis of the grid used to compute the position of the features along a space filling curve.
+FEATURE_ORDER_BITS = 16
+
+# Type ids of the polygonal geometries, as returned by `shapely.get_type_id`.
+_POLYGONAL_TYPE_IDS = (shapely.GeometryType.POLYGON, shapely.GeometryType.MULTIPOLYGON)
+
+
+def _round_coordinates(coords):
+    # adding 0 turns the negative zeros into zeros, as the Python `round` used to do
+    return numpy.round(coords) + 0.0
 
 
 def on_invalid_geometry_raise(shape):
@@ -26,38 +59,255 @@ def on_invalid_geometry_make_valid(shape):
     return make_it_valid(shape)
 
 
+def is_repairing_handler(handler):
+    """Whether the `on_invalid_geometry` handler repairs the geometries with `make_it_valid`, which the `geos`
+    `make_valid_engine` can replace by a vectorized GEOS repair."""
+    if isinstance(handler, RepairCache):
+        return is_repairing_handler(handler.handler)
+    return handler is on_invalid_geometry_make_valid or handler is make_it_valid
+
+
+class RepairBudgetWarning(UserWarning):
+    """Warning issued for each feature whose geometry repair exceeded its budget."""
+
+
 class VectorTile:
-    def __init__(self, default_options=None):
+    def __init__(self, default_options=None, keep_prepared=True):
         self.tile = vector_tile.tile()
-        self.default_options = default_options
+        # validated once, and used as is for the layers without options
+        self.default_options = get_encode_options(layer_options=None, default_options=default_options)
 
+        # the layer message and the options of the last added layer
         self.layer = None
         self.layer_options = None
-        self.key_idx = 0
-        self.val_idx = 0
-        self.seen_keys_idx = {}
-        self.seen_values_idx = {}
-        self.seen_values_bool_idx = {}
         self.seen_layer_names = set()
-
-    def add_layer(self, name, features, options=None):
+        # encoders of the layers, in the order of the layers of the tile
+        self.layer_encoders = []
+        # whether the layers keep their prepared features, which `fit_to_size` needs
+        self.keep_prepared = keep_prepared
+
+    @property
+    def repair_budget_exceeded(self):
+        """(layer name, feature) of the features whose geometry repair exceeded its budget."""
+        return [item for layer_encoder in self.layer_encoders for item in layer_encoder.repair_budget_exceeded]
+
+    def create_layer_encoder(self, name, options=None):
+        """Add an empty layer named `name` to the tile and return its `LayerEncoder`."""
         if not name:
             raise ValueError(f"A layer name can not be empty. {name!r} was provided.")
         if name in self.seen_layer_names:
             raise ValueError(f"The layer name {name!r} already exists in the vector tile.")
         self.seen_layer_names.add(name)
-        self.layer = self.tile.layers.add()
-        self.layer_options = get_encode_options(layer_options=options, default_options=self.default_options)
+        layer_options = get_encode_options(layer_options=options, default_options=self.default_options)
+        layer_encoder = LayerEncoder(self.tile.layers.add(), name, layer_options, keep_prepared=self.keep_prepared)
+        self.layer_encoders.append(layer_encoder)
+        self.layer = layer_encoder.layer
+        self.layer_options = layer_encoder.layer_options
+        return layer_encoder
+
+    def add_layer(self, name, features, options=None):
+        self.create_layer_encoder(name, options).add_features(features)
+
+    def add_layers(self, layers, threads=None):
+        """Add the layers given as (name, features, options) tuples to the tile.
+
+        With more than one thread, the features of the layers are loaded, quantized and repaired by chunks of
+        `LAYER_CHUNK_SIZE` features on a pool of `threads` threads. Most of this time is spent in GEOS calls, which
+        release the GIL. The features are then written, in order, by the calling thread, so that the encoded tile is
+        the same as the one built by `add_layer`.
+        """
+        if threads is not None and threads <= 0:
+            raise ValueError(f"The number of threads must be positive. {threads} provided.")
+        if threads is None or threads == 1:
+            for name, features, options in layers:
+                self.add_layer(name, features, options)
+            return
+
+        layers = [(self.create_layer_encoder(name, options), list(features)) for name, features, options in layers]
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            chunks = [
+                [
+                    executor.submit(layer_encoder.prepare_features, features[start : start + LAYER_CHUNK_SIZE])
+                    for start in range(0, len(features), LAYER_CHUNK_SIZE)
+                ]
+                for layer_encoder, features in layers
+            ]
+            for (layer_encoder, _), futures in zip(layers, chunks):
+                layer_encoder.add_prepared([item for future in futures for item in future.result()])
+
+    def fit_to_size(self, max_bytes, strategy="drop_smallest", priority_property=None):
+        """Serialize the tile, rebuilding its layers from the already loaded and quantized geometries until the result
+        is at most `max_bytes` long. This takes at most `MAX_SIZE_PASSES` passes.
+
+        The possible strategies are:
+            * `simplify`: geometries are simplified with a tolerance doubling at each pass, starting with 1 tile unit.
+            After `SIMPLIFY_PASSES` passes, the `drop_smallest` strategy is applied to the simplified geometries.
+            * `drop_smallest`: the polygons with the smallest area and the lines with the shortest length are dropped
+            first. As areas and lengths can't be compared, the features are ranked by their size relative to the
+            features of the same geometry type in the tile, the points being dropped from the last ones.
+            * `priority`: the features with the lowest value of the `priority_property` property are dropped first.
+            Features without this property are dropped before all others.
+
+        The features of all the layers are ranked together, and dropped from the lowest ranked ones until their
+        encoded size covers the excess of the tile. If the tile is still too large after the last pass, all the
+        features are dropped.
+
+        Returns the serialized tile.
+        """
+        if not self.keep_prepared:
+            raise ValueError("Fitting the tile to a bytes budget requires a VectorTile keeping its prepared features.")
+        if strategy not in SIZE_STRATEGIES:
+            raise ValueError(f"The size strategy must be one of {', '.join(SIZE_STRATEGIES)}. {strategy!r} provided.")
+        if strategy == "priority" and priority_property is None:
+            raise ValueError("The priority size strategy requires a priority_property.")
+        if strategy != "priority":
+            priority_property = None
+
+        data = self.tile.SerializeToString()
+        layers = [(layer_encoder, layer_encoder.prepared) for layer_encoder in self.layer_encoders]
+        drop_order = None
+        n_dropped = 0
+        for n_pass in range(MAX_SIZE_PASSES):
+            if len(data) <= max_bytes:
+                return data
+
+            if strategy == "simplify" and n_pass < SIMPLIFY_PASSES:
+                layers = [
+                    (layer_encoder, layer_encoder.simplify_features(tolerance=2**n_pass))
+                    for layer_encoder in self.layer_encoders
+                ]
+                for layer_encoder, prepared in layers:
+                    layer_encoder.write_features(prepared)
+            else:
+                if drop_order is None:
+                    drop_order = self._drop_order(layers, priority_property)
+                    sizes = [layer_encoder.feature_sizes(prepared) for layer_encoder, prepared in layers]
+                # the key and value tables shrink too, which the sizes of the dropped features don't account for
+                excess = len(data) - max_bytes
+                while n_dropped < len(drop_order) and excess > 0:
+                    layer_idx, feature_idx = drop_order[n_dropped]
+                    excess -= sizes[layer_idx][feature_idx]
+                    n_dropped += 1
+                self._write_kept_features(layers, drop_order[n_dropped:])
+
+            data = self.tile.SerializeToString()
+
+        if len(data) > max_bytes:
+            self._write_kept_features(layers, [])
+            data = self.tile.SerializeToString()
+            if len(data) > max_bytes:
+                raise ValueError(f"The tile can not be encoded in {max_bytes} bytes, even without any feature.")
+        return data
+
+    def _drop_order(self, layers, priority_property):
+        """Return the (layer index, feature index) of the prepared features of the layers, in the order they are
+        dropped: by priority, or by the rank of their size among the features of the same geometry type. The ties are
+        broken by dropping the last features first."""
+        if priority_property is not None:
+            ranks = [
+                (self._feature_priority(item[0], priority_property), -layer_idx, -feature_idx)
+                for layer_idx, (_, prepared) in enumerate(layers)
+                for feature_idx, item in enumerate(prepared)
+            ]
+            return [(-layer_idx, -feature_idx) for _, layer_idx, feature_idx in sorted(ranks)]
+
+        groups = {}
+        for layer_idx, (_, prepared) in enumerate(layers):
+            for feature_idx, item in enumerate(prepared):
+                shape = item[1]
+                groups.setdefault(shape.geom_type.replace("Multi", ""), []).append(
+                    (self._feature_size(shape), -layer_idx, -feature_idx)
+                )
+        ranks = []
+        for group in groups.values():
+            group.sort()
+            # the sizes of the geometry types can't be compared, their rank in the type can
+            ranks.extend(
+                ((n + 1) / len(group), layer_idx, feature_idx) for n, (_, layer_idx, feature_idx) in enumerate(group)
+            )
+        return [(-layer_idx, -feature_idx) for _, layer_idx, feature_idx in sorted(ranks)]
+
+    def _write_kept_features(self, layers, kept):
+        """Rewrite the layers with the `kept` (layer index, feature index) prepared features."""
+        kept_by_layer = [[] for _ in layers]
+        for layer_idx, feature_idx in kept:
+            kept_by_layer[layer_idx].append(feature_idx)
+        for (layer_encoder, prepared), indices in zip(layers, kept_by_layer):
+            # keep the features in their original order
+            layer_encoder.write_features([prepared[i] for i in sorted(indices)])
+
+    @staticmethod
+    def _feature_size(shape):
+        if shape.geom_type in ("Polygon", "MultiPolygon"):
+            return shape.area
+        # the points all have a length of 0, and keep their order
+        return shape.length
+
+    @staticmethod
+    def _feature_priority(feature, priority_property):
+        value = (feature.get("properties") or {}).get(priority_property)
+        if isinstance(value, Number) and not isinstance(value, bool):
+            return value
+        return float("-inf")
+
+
+class LayerEncoder:
+    """
+    Encode the features of a layer into the `layer` message of a tile.
+
+    All the state of the encoding of a layer lives in its `LayerEncoder`, so that the layers of a tile can be encoded
+    concurrently. `prepare_features` doesn't change this state, so that chunks of the features of a same layer can
+    also be prepared concurrently.
+
+    The prepared features are (feature, shape, geometry cache key, cached geometry) items. The key is set for the
+    shapes whose encoded geometry is to be stored in the `geometry_cache`, and the cached geometry is the (feature
+    type, geometry commands) of the shapes found in it. Both are None without a geometry cache.
+    """
+
+    def __init__(self, layer, name, options, keep_prepared=True):
+        self.layer = layer
+        self.layer_options = options
         self.layer.name = name
         self.layer.version = 2
-        self.layer.extent = self.layer_options["extents"]
+        self.layer.extent = options.extents
 
         self.key_idx = 0
         self.val_idx = 0
         self.seen_keys_idx = {}
         self.seen_values_idx = {}
         self.seen_values_bool_idx = {}
-
+        # prepared features, kept to rebuild the layer when fitting a bytes budget
+        self.keep_prepared = keep_prepared
+        self.prepared = []
+        # (layer name, feature) of the features whose geometry repair exceeded its budget
+        self.repair_budget_exceeded = []
+        # the options changing the prepared and encoded geometries, part of the keys of the geometry cache
+        self.geometry_cache_options = (
+            options.y_coord_down,
+            options.transformer,
+            None if options.quantize_bounds is None else tuple(options.quantize_bounds),
+            options.extents,
+            options.on_invalid_geometry,
+            options.check_winding_order,
+            options.max_geometry_validate_tries,
+            options.make_valid_engine,
+            options.repair_time_budget,
+            options.repair_max_vertices,
+            options.repair_fallback,
+        )
+
+    def add_features(self, features):
+        self.add_prepared(self.prepare_features(features))
+
+    def prepare_features(self, features):
+        """Load, quantize and repair the geometries of the features, and return the prepared items of the features to
+        encode."""
+        geometry_cache = self.layer_options.geometry_cache
+        loaded_features = []
+        shapes = []
+        # geometry cache key, and cached (feature type, geometry commands), of each shape
+        keys = []
+        cached_geometries = []
         for feature in features:
             # skip missing or empty geometries
             geometry_spec = feature.get("geometry")
@@ -71,13 +321,211 @@ class VectorTile:
             if shape.is_empty:
                 continue
 
-            if self.layer_options["quantize_bounds"]:
-                shape = self.quantize(shape)
-            if self.layer_options["check_winding_order"]:
-                shape = self.enforce_winding_order(shape)
-
+            key = cached_geometry = None
+            if geometry_cache is not None:
+                key = (content_hash(shape.wkb), self.geometry_cache_options)
+                cached = geometry_cache.get(key)
+                if cached is not None:
+                    shape, feature_type, geometry = cached
+                    key, cached_geometry = None, (feature_type, geometry)
+
+            loaded_features.append(feature)
+            keys.append(key)
+            cached_geometries.append(cached_geometry)
+            shapes.append(shape)
+
+        # only the shapes which aren't already prepared by the geometry cache
+        pending = [i for i, cached_geometry in enumerate(cached_geometries) if cached_geometry is None]
+        if self.layer_options.quantize_bounds:
+            for i, shape in zip(pending, self.quantize(numpy.array([shapes[i] for i in pending], dtype=object))):
+                shapes[i] = shape
+
+        if self.layer_options.check_winding_order:
+            if len(pending) == len(shapes):
+                shapes = self.enforce_winding_order_all(loaded_features, shapes)
+            else:
+                oriented = self.enforce_winding_order_all(
+                    [loaded_features[i] for i in pending], [shapes[i] for i in pending]
+                )
+                for i, shape in zip(pending, oriented):
+                    shapes[i] = shape
+
+        return [
+            (feature, shape, key, cached_geometry)
+            for feature, shape, key, cached_geometry in zip(loaded_features, shapes, keys, cached_geometries)
+            if shape is not None and not shape.is_empty
+        ]
+
+    def add_prepared(self, prepared):
+        """Write the prepared features to the layer, sorted according to the `feature_order` option."""
+        if self.layer_options.feature_order is not None:
+            prepared = self.sort_features(prepared)
+        if self.keep_prepared:
+            self.prepared = prepared
+        self.write_features(prepared)
+
+    def write_features(self, prepared):
+        """(Re)write the features and the key and value tables of the layer from prepared features, and return the
+        feature message of each of them, None for the features without geometry."""
+        del self.layer.features[:]
+        del self.layer.keys[:]
+        del self.layer.values[:]
+
+        schema = self.layer_options.schema
+        if schema is None:
+            self.key_idx = 0
+            self.val_idx = 0
+            self.seen_keys_idx = {}
+            self.seen_values_idx = {}
+            self.seen_values_bool_idx = {}
+        else:
+            # the tables start with the keys and values of the schema
+            self.layer.keys.extend(schema.keys)
+            self.layer.values.extend(schema.value_messages(self.layer_options.compact_values))
+            self.key_idx = len(schema.keys)
+            self.val_idx = len(schema.values)
+            self.seen_keys_idx = dict(schema.keys_idx)
+            self.seen_values_idx = dict(schema.values_idx)
+            self.seen_values_bool_idx = dict(schema.values_bool_idx)
+
+        if prepared and isinstance(prepared[0][0], FeatureRow):
+            return [
+                self.add_feature(feature, shape, tags, key, cached_geometry)
+                for (feature, shape, key, cached_geometry), tags in zip(prepared, self._column_tags(prepared))
+            ]
+        return [
+            self.add_feature(feature, shape, None, key, cached_geometry)
+            for feature, shape, key, cached_geometry in prepared
+        ]
+
+    def feature_sizes(self, prepared):
+        """Write the prepared features to the layer, and return the number of bytes taken by each of them in the
+        encoded layer, 0 for the features without geometry."""
+        sizes = []
+        for feature in self.write_features(prepared):
+            if feature is None:
+                sizes.append(0)
+                continue
+            size = feature.ByteSize()
+            # the tag and the length prefix of the feature message
+            sizes.append(size + 1 + (max(size.bit_length(), 1) + 6) // 7)
+        return sizes
+
+    def _column_tags(self, prepared):
+        """Return the tags of the prepared `FeatureColumns` rows, adding their keys and values to the tables column by
+        column."""
+        rows = numpy.fromiter((item[0].row for item in prepared), dtype=numpy.intp, count=len(prepared))
+        key_indices = []
+        value_indices = []
+        for key, uniques, inverse in prepared[0][0].columns.columns:
+            codes = inverse[rows]
+            present = codes >= 0
+            lookup = numpy.full(len(uniques) + 1, -1, dtype=numpy.int64)
+            for code in numpy.unique(codes[present]).tolist():
+                v = uniques[code]
+                if self._can_handle_val(v):
+                    lookup[code] = self._value_index(v)
+            # the missing values, with the code -1, map to the last item of the lookup table
+            column_indices = lookup[codes]
+            if (column_indices < 0).all():
+                continue
+            key_indices.append(self._key_index(key))
+            value_indices.append(column_indices)
+
+        if not key_indices:
+            return [()] * len(prepared)
+        values = numpy.column_stack(value_indices)
+        tags = numpy.empty((len(prepared), 2 * len(key_indices)), dtype=numpy.int64)
+        tags[:, 0::2] = key_indices
+        tags[:, 1::2] = values
+        if (values >= 0).all():
+            return tags.tolist()
+        mask = numpy.repeat(values >= 0, 2, axis=1)
+        return [list(compress(row, row_mask)) for row, row_mask in zip(tags.tolist(), mask.tolist())]
+
+    def _key_index(self, k):
+        key_idx = self.seen_keys_idx.get(k)
+        if key_idx is None:
+            self.layer.keys.append(k)
+            key_idx = self.seen_keys_idx[k] = self.key_idx
+            self.key_idx += 1
+        return key_idx
+
+    def _value_index(self, v):
+        values_idx = self.seen_values_bool_idx if type(v) is bool else self.seen_values_idx
+        val_idx = values_idx.get(v)
+        if val_idx is None:
+            val_idx = values_idx[v] = self.val_idx
+            self.val_idx += 1
+            encode_value(self.layer.values.add(), v, self.layer_options.compact_values)
+        return val_idx
+
+    def simplify_features(self, tolerance):
+        """Return the prepared features of the layer with their shapes simplified with `tolerance`."""
+        simplified = []
+        for feature, shape, key, cached_geometry in self.prepared:
+            if shape.geom_type not in ("Point", "MultiPoint"):
+                shape = shape.simplify(tolerance, preserve_topology=True)
+                if self.layer_options.check_winding_order and not shape.is_empty:
+                    shape = self.enforce_winding_order_within_budget(feature, shape)
+                # the simplified shapes are neither taken from, nor put into, the geometry cache
+                key = cached_geometry = None
             if shape is not None and not shape.is_empty:
-                self.add_feature(feature, shape)
+                simplified.append((feature, shape, key, cached_geometry))
+        return simplified
+
+    def sort_features(self, prepared):
+        """Sort the prepared features by the position of the centre of their shape bounding box along the space
+        filling curve given by the `feature_order` option, so that features close in the tile are close in the layer.
+        """
+        curve = FEATURE_ORDER_CURVES[self.layer_options.feature_order]
+        extents = self.layer_options.extents
+        scale = ((1 << FEATURE_ORDER_BITS) - 1) / extents
+
+        def key(item):
+            minx, miny, maxx, maxy = item[1].bounds
+            # features in the buffer around the tile are clamped to its edges
+            x = min(max((minx + maxx) / 2.0, 0), extents)
+            y = min(max((miny + maxy) / 2.0, 0), extents)
+            return curve(int(x * scale), int(y * scale), FEATURE_ORDER_BITS)
+
+        return sorted(prepared, key=key)
+
+    def enforce_winding_order_all(self, features, shapes):
+        """Enforce the winding order of the shapes of a layer like `enforce_winding_order`, but round, orient and
+        validate all the polygonal shapes with vectorized calls. Only the shapes which are then invalid go through the
+        per shape path, or through `enforce_winding_order_batch` when the `on_invalid_geometry` handler repairs them
+        and the `make_valid_engine` is 'geos'.
+        """
+        result = list(shapes)
+        polygonal = []
+        for i, shape in enumerate(shapes):
+            if shape.geom_type in ("Polygon", "MultiPolygon"):
+                polygonal.append(i)
+            else:
+                result[i] = self.enforce_winding_order_within_budget(features[i], shape)
+
+        oriented = self.orient_shapes([shapes[i] for i in polygonal])
+        valid = shapely.is_valid(oriented)
+        for i, shape, is_valid in zip(polygonal, oriented, valid):
+            if is_valid:
+                result[i] = shape
+
+        invalid = [i for i, is_valid in zip(polygonal, valid) if not is_valid]
+        if not invalid:
+            return result
+        # the other handlers, which may keep, drop or reject the invalid shapes, get each of them as is
+        if self.layer_options.make_valid_engine == "geos" and is_repairing_handler(
+            self.layer_options.on_invalid_geometry
+        ):
+            repaired = self.enforce_winding_order_batch(
+                [features[i] for i in invalid], [shapes[i] for i in invalid], oriented[~valid]
+            )
+        else:
+            repaired = [self.enforce_winding_order_within_budget(features[i], shapes[i]) for i in invalid]
+        for i, shape in zip(invalid, repaired):
+            result[i] = shape
+        return result
 
     def enforce_winding_order(self, shape, n_try=1):
         if shape.geom_type == "MultiPolygon":
@@ -97,30 +545,122 @@ class VectorTile:
         # other shapes just get passed through
         return shape
 
-    def quantize(self, shape):
-        minx, miny, maxx, maxy = self.layer_options["quantize_bounds"]
-        extents = self.layer_options["extents"]
-
-        def fn(x, y, z=None):
-            xfac = extents / (maxx - minx)
-            yfac = extents / (maxy - miny)
-            x = xfac * (x - minx)
-            y = yfac * (y - miny)
-            return round(x), round(y)
+    def enforce_winding_order_within_budget(self, feature, shape):
+        """Enforce the winding order of the shape of the feature, repairing it within the time and vertex count budget
+        given by the `repair_time_budget` and `repair_max_vertices` options. When the budget is exceeded, the feature
+        is reported and the shape is replaced with the result of the `repair_fallback` option.
+        """
+        time_budget = self.layer_options.repair_time_budget
+        if time_budget is None and self.layer_options.repair_max_vertices is None:
+            return self.enforce_winding_order(shape)
+
+        try:
+            with repair_time_budget(time_budget):
+                return self.enforce_winding_order(shape)
+        except RepairBudgetExceededError:
+            fallback = self.layer_options.repair_fallback
+            self.repair_budget_exceeded.append((self.layer.name, feature))
+            warnings.warn(
+                f"The repair of the geometry of the feature {feature.get('id')!r} of the layer {self.layer.name!r} "
+                f"exceeded its budget, falling back to {fallback!r}.",
+                RepairBudgetWarning,
+                stacklevel=2,
+            )
+            return self.repair_fallback(shape)
+
+    def repair_fallback(self, shape):
+        """Return a cheaply repaired version of the shape, according to the `repair_fallback` option, or None."""
+        fallback = self.layer_options.repair_fallback
+        if fallback == "drop":
+            return None
+        elif fallback == "convex_hull":
+            shape = shape.convex_hull
+        elif fallback == "buffer":
+            shape = shape.buffer(0)
+        elif fallback == "simplify":
+            shape = shape.simplify(REPAIR_FALLBACK_SIMPLIFY_TOLERANCE, preserve_topology=False).buffer(0)
+
+        if shape.is_empty or shape.geom_type not in ("Polygon", "MultiPolygon"):
+            return None
+        # Starting at the last try means that the shape is dropped if it is still invalid, rather than going through
+        # the expensive repair again.
+        return self.enforce_winding_order(shape, n_try=self.layer_options.max_geometry_validate_tries)
+
+    def enforce_winding_order_batch(self, features, shapes, oriented):
+        """Repair the invalid polygonal shapes of a layer, given with their rounded and oriented version, at once with a
+        single vectorized GEOS `make_valid` call. Only the shapes which this doesn't turn into valid, correctly
+        oriented polygonal shapes go through the `on_invalid_geometry` handler. This call isn't bounded by
+        `repair_time_budget`, so the shapes with more than `repair_max_vertices` vertices are left out of it.
+        """
+        result = list(shapes)
+        batched = numpy.ones(len(shapes), dtype=bool)
+        max_vertices = self.layer_options.repair_max_vertices
+        if max_vertices is not None:
+            # the batch isn't time budgeted, the shapes over the vertex budget go through the per shape path instead
+            batched &= shapely.get_num_coordinates(oriented) <= max_vertices
+            for i, is_batched in enumerate(batched):
+                if not is_batched:
+                    result[i] = self.enforce_winding_order_within_budget(features[i], shapes[i])
+
+        invalid = numpy.flatnonzero(batched)
+        if not len(invalid):
+            return result
+
+        repaired = shapely.make_valid(oriented[batched], method="structure", keep_collapsed=False)
+        polygonal = numpy.isin(shapely.get_type_id(repaired), _POLYGONAL_TYPE_IDS) & ~shapely.is_empty(repaired)
+        # the repaired shapes may have new vertices out of the grid, which need to be rounded again
+        repaired[polygonal] = self.orient_shapes(repaired[polygonal])
+        valid = polygonal & shapely.is_valid(repaired)
+        for i, shape, is_valid in zip(invalid, repaired, valid):
+            # fall back to the per shape path for the shapes GEOS didn't repair
+            result[i] = shape if is_valid else self.enforce_winding_order_within_budget(features[i], shapes[i])
+        return result
+
+    def orient_shape(self, shape):
+        """Round the coordinates of a polygonal shape and orient its rings, without checking its validity."""
+        return self.orient_shapes([shape])[0]
+
+    def orient_shapes(self, shapes):
+        """Round the coordinates of the polygonal shapes, in a single vectorized call, and orient their rings, without
+        checking their validity. Return an array of the oriented shapes."""
+        sign = 1.0 if self.layer_options.y_coord_down else -1.0
+        oriented = numpy.empty(len(shapes), dtype=object)
+        for i, shape in enumerate(shapely.transform(numpy.array(shapes, dtype=object), _round_coordinates)):
+            if shape.geom_type == "MultiPolygon":
+                oriented[i] = MultiPolygon([orient(part, sign=sign) for part in shape.geoms if not part.is_empty])
+            else:
+                oriented[i] = orient(shape, sign=sign)
+        return oriented
 
-        return transform(fn, shape)
+    def quantize(self, shape):
+        """Scale the coordinates of a shape, or of an array of shapes, from the `quantize_bounds` to the extents of the
+        tile, and round them to the grid."""
+        minx, miny, maxx, maxy = self.layer_options.quantize_bounds
+        extents = self.layer_options.extents
+        offset = numpy.array([minx, miny])
+        factor = numpy.array([extents / (maxx - minx), extents / (maxy - miny)])
+        return shapely.transform(shape, lambda coords: _round_coordinates((coords - offset) * factor))
 
     def handle_shape_validity(self, shape, n_try):
         if shape.is_valid:
             return shape
 
-        if n_try >= self.layer_options["max_geometry_validate_tries"]:
+        if n_try >= self.layer_options.max_geometry_validate_tries:
             # ensure that we don't recurse indefinitely with an invalid geometry handler that doesn't validate
             # geometries
             return None
 
-        if self.layer_options["on_invalid_geometry"]:
-            shape = self.layer_options["on_invalid_geometry"](shape)
+        handler = self.layer_options.on_invalid_geometry
+        if handler is not None:
+            # the handlers dropping or rejecting the shape don't repair it, and don't need a budget
+            budgeted = handler is not on_invalid_geometry_ignore and handler is not on_invalid_geometry_raise
+            max_vertices = self.layer_options.repair_max_vertices
+            if budgeted and max_vertices is not None and shapely.get_num_coordinates(shape) > max_vertices:
+                raise RepairBudgetExceededError(f"The geometry has more than {max_vertices} vertices to repair.")
+            shape = handler(shape)
+            if budgeted:
+                # the handler may not check the budget itself, so check it before going through the process again
+                check_repair_budget()
             if shape is not None and not shape.is_empty:
                 # This means that we have a handler that might have altered the geometry. We'll run through the process
                 # again, but keep track of which attempt we are on to terminate the recursion.
@@ -150,52 +690,34 @@ class VectorTile:
     def enforce_polygon_winding_order(self, shape, n_try):
         assert shape.geom_type == "Polygon"
 
-        def fn(point):
-            x, y = point
-            return round(x), round(y)
-
-        exterior = self.apply_map(fn, shape.exterior.coords)
-        rings = None
-
-        if len(shape.interiors) > 0:
-            rings = [self.apply_map(fn, ring.coords) for ring in shape.interiors]
-
-        sign = 1.0 if self.layer_options["y_coord_down"] else -1.0
-        oriented_shape = orient(Polygon(exterior, rings), sign=sign)
+        oriented_shape = self.orient_polygon(shape)
         oriented_shape = self.handle_shape_validity(oriented_shape, n_try)
         return oriented_shape
 
-    @staticmethod
-    def apply_map(fn, x):
-        return list(map(fn, x))
+    def orient_polygon(self, shape):
+        sign = 1.0 if self.layer_options.y_coord_down else -1.0
+        return orient(shapely.transform(shape, _round_coordinates), sign=sign)
 
     def _load_geometry(self, geometry_spec):
-        if isinstance(geometry_spec, BaseGeometry):
-            geom = geometry_spec
-        elif isinstance(geometry_spec, dict):
-            geom = shapely_shape(geometry_spec)
-        else:
-            try:
-                geom = load_wkb(geometry_spec)
-            except Exception:
-                try:
-                    geom = load_wkt(geometry_spec)
-                except Exception:
-                    return None
-
-        if self.layer_options["transformer"] is None:
+        geom = load_geometry(geometry_spec)
+        if geom is None or self.layer_options.transformer is None:
             return geom
         else:
-            return transform(self.layer_options["transformer"], geom)
-
-    def add_feature(self, feature, shape):
-        geom_encoder = GeometryEncoder(self.layer_options["y_coord_down"], self.layer_options["extents"])
-        geometry = geom_encoder.encode(shape)
+            return transform(self.layer_options.transformer, geom)
+
+    def add_feature(self, feature, shape, tags=None, geometry_cache_key=None, cached_geometry=None):
+        if cached_geometry is None:
+            geom_encoder = GeometryEncoder(self.layer_options.y_coord_down, self.layer_options.extents)
+            geometry = geom_encoder.encode(shape)
+            feature_type = self._get_feature_type(shape)
+            if geometry_cache_key is not None:
+                self.layer_options.geometry_cache.put(geometry_cache_key, (shape, feature_type, geometry))
+        else:
+            feature_type, geometry = cached_geometry
 
-        feature_type = self._get_feature_type(shape)
         if len(geometry) == 0:
             # Don't add geometry if it's too small
-            return
+            return None
         f = self.layer.features.add()
 
         fid = feature.get("id")
@@ -203,20 +725,24 @@ class VectorTile:
             f.id = fid
 
         # properties
-        properties = feature.get("properties")
-        if properties is not None:
-            self._handle_attr(self.layer, f, properties)
+        if tags is not None:
+            f.tags.extend(tags)
+        else:
+            properties = feature.get("properties")
+            if properties is not None:
+                self._handle_attr(self.layer, f, properties)
 
         f.type = feature_type
         f.geometry.extend(geometry)
+        return f
 
     def _get_feature_type(self, shape):
         if shape.geom_type == "Point" or shape.geom_type == "MultiPoint":
-            return self.tile.Point
+            return vector_tile.tile.Point
         elif shape.geom_type == "LineString" or shape.geom_type == "MultiLineString":
-            return self.tile.LineString
+            return vector_tile.tile.LineString
         elif shape.geom_type == "Polygon" or shape.geom_type == "MultiPolygon":
-            return self.tile.Polygon
+            return vector_tile.tile.Polygon
         elif shape.geom_type == "GeometryCollection":
             raise ValueError("Encoding geometry collections not supported")
         else:
@@ -239,28 +765,34 @@ class VectorTile:
         return cls._can_handle_key(k) and cls._can_handle_val(v)
 
     def _handle_attr(self, layer, feature, props):
+        seen_keys_idx = self.seen_keys_idx
+        tags = []
         for k, v in props.items():
-            if self._can_handle_attr(k, v):
-                if k not in self.seen_keys_idx:
-                    layer.keys.append(k)
-                    self.seen_keys_idx[k] = self.key_idx
-                    self.key_idx += 1
-
-                feature.tags.append(self.seen_keys_idx[k])
-
-                values_idx = self.seen_values_bool_idx if isinstance(v, bool) else self.seen_values_idx
-                if v not in values_idx:
-                    values_idx[v] = self.val_idx
-                    self.val_idx += 1
-
-                    val = layer.values.add()
-                    if isinstance(v, bool):
-                        val.bool_value = v
-                    elif isinstance(v, str):
-                        val.string_value = v
-                    elif isinstance(v, int):
-                        val.int_value = v
-                    elif isinstance(v, float):
-                        val.double_value = v
-
-                feature.tags.append(values_idx[v])
+            value_type = type(v)
+            if value_type not in _VALUE_TYPES:
+                if isinstance(v, numpy.generic):
+                    # NumPy scalars are encoded as the equivalent Python values
+                    v = v.item()
+                    value_type = type(v)
+                if not self._can_handle_val(v):
+                    continue
+
+            # the keys of the schema, and the keys already seen, are known to be valid
+            key_idx = seen_keys_idx.get(k)
+            if key_idx is None:
+                if not self._can_handle_key(k):
+                    continue
+                layer.keys.append(k)
+                key_idx = seen_keys_idx[k] = self.key_idx
+                self.key_idx += 1
+
+            values_idx = self.seen_values_bool_idx if value_type is bool else self.seen_values_idx
+            val_idx = values_idx.get(v)
+            if val_idx is None:
+                val_idx = values_idx[v] = self.val_idx
+                self.val_idx += 1
+                encode_value(layer.values.add(), v, self.layer_options.compact_values)
+
+            tags.append(key_idx)
+            tags.append(val_idx)
+        feature.tags.extend(tags)
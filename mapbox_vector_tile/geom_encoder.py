@@ -1,8 +1,31 @@
 import itertools as it
 
+from shapely.geometry import shape as shapely_shape
+from shapely.geometry.base import BaseGeometry
+from shapely.wkb import loads as load_wkb
+from shapely.wkt import loads as load_wkt
+
 from mapbox_vector_tile.utils import CMD_BITS, CMD_FAKE, CMD_LINE_TO, CMD_MOVE_TO, CMD_SEG_END, zig_zag_encode
 
 
+def load_geometry(geometry_spec):
+    """Return the shapely geometry of a feature geometry given as a shapely geometry, a GeoJSON-like dictionary, WKB
+    bytes, a hexadecimal WKB string or WKT, or None when it can't be loaded."""
+    if isinstance(geometry_spec, BaseGeometry):
+        return geometry_spec
+    if isinstance(geometry_spec, dict):
+        return shapely_shape(geometry_spec)
+    if isinstance(geometry_spec, (bytearray, memoryview)):
+        geometry_spec = bytes(geometry_spec)
+    try:
+        return load_wkb(geometry_spec)
+    except Exception:
+        try:
+            return load_wkt(geometry_spec)
+        except Exception:
+            return None
+
+
 class GeometryEncoder:
     def __init__(self, y_coord_down, extents):
         self._geometry = []
@@ -0,0 +1,207 @@
+import gzip
+import hashlib
+import sqlite3
+from pathlib import Path
+
+# Number of tiles written per transaction, and fetched per cursor batch when reading.
+MBTILES_BATCH_SIZE = 1024
+
+
+def _tms_row(z, y):
+    # the rows of an MBTiles archive are counted from the south, unlike the XYZ rows
+    return (1 << z) - 1 - y
+
+
+class MBTilesWriter:
+    """
+    Write encoded tiles into an MBTiles archive, in transactions of `batch_size` tiles.
+
+    Args:
+        path:
+            The path of the archive, created when it doesn't exist.
+
+        metadata:
+            An optional dictionary of the archive metadata, such as `name` or `minzoom`. The `format` defaults to
+            `pbf`.
+
+        batch_size:
+            The number of tiles written per transaction. Default to `MBTILES_BATCH_SIZE`.
+
+        deduplicate:
+            Whether to store the identical tiles once, with the `images` and `map` tables of the MBTiles
+            specification, which is worth it for the many identical ocean or land tiles of the high zoom levels.
+            Default to `False`.
+
+        compress:
+            Whether to gzip the tiles, as expected by most MBTiles servers. Default to `False`.
+
+        wal:
+            Whether to write the archive in the SQLite write-ahead log mode. The archive is switched back to the
+            default journal mode when it is closed. Default to `True`.
+
+    The tiles are addressed by their XYZ coordinates, with the rows counted from the north, and stored with the TMS
+    rows of the MBTiles specification:
+
+        with MBTilesWriter("tiles.mbtiles", {"name": "roads"}) as writer:
+            writer.write_tiles(TilePyramid(layers).tiles())
+    """
+
+    def __init__(self, path, metadata=None, batch_size=MBTILES_BATCH_SIZE, deduplicate=False, compress=False, wal=True):
+        if batch_size < 1:
+            raise ValueError(f"The batch size must be strictly positive. {batch_size} provided.")
+        self.batch_size = batch_size
+        self.deduplicate = deduplicate
+        self.compress = compress
+        self.wal = wal
+        self.pending = []
+
+        self.connection = sqlite3.connect(str(path))
+        if wal:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self._create_schema()
+            metadata = {"format": "pbf", **(metadata or {})}
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?)",
+                [(name, str(value)) for name, value in metadata.items()],
+            )
+
+    def _create_schema(self):
+        execute = self.connection.execute
+        execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT)")
+        execute("CREATE UNIQUE INDEX IF NOT EXISTS metadata_index ON metadata (name)")
+        if not self.deduplicate:
+            execute(
+                "CREATE TABLE IF NOT EXISTS tiles "
+                "(zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)"
+            )
+            execute("CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row)")
+            return
+        execute("CREATE TABLE IF NOT EXISTS images (tile_data BLOB, tile_id TEXT)")
+        execute("CREATE UNIQUE INDEX IF NOT EXISTS images_id ON images (tile_id)")
+        execute(
+            "CREATE TABLE IF NOT EXISTS map (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT)"
+        )
+        execute("CREATE UNIQUE INDEX IF NOT EXISTS map_index ON map (zoom_level, tile_column, tile_row)")
+        execute(
+            "CREATE VIEW IF NOT EXISTS tiles AS SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column, "
+            "map.tile_row AS tile_row, images.tile_data AS tile_data "
+            "FROM map JOIN images ON images.tile_id = map.tile_id"
+        )
+
+    def write_tile(self, z, x, y, data):
+        """Queue the encoded tile (`z`, `x`, `y`), written with the next batch."""
+        if self.compress:
+            data = gzip.compress(data, mtime=0)
+        self.pending.append((z, x, _tms_row(z, y), data))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def write_tiles(self, tiles):
+        """Queue the (z, x, y, encoded tile) of `tiles`, such as the ones yielded by `TilePyramid.tiles`."""
+        for z, x, y, data in tiles:
+            self.write_tile(z, x, y, data)
+
+    def flush(self):
+        """Write the queued tiles in a single transaction."""
+        if not self.pending:
+            return
+        with self.connection:
+            if self.deduplicate:
+                ids = [hashlib.blake2b(data, digest_size=16).hexdigest() for _, _, _, data in self.pending]
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO images VALUES (?, ?)",
+                    [(data, tile_id) for (_, _, _, data), tile_id in zip(self.pending, ids)],
+                )
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO map VALUES (?, ?, ?, ?)",
+                    [(z, x, row, tile_id) for (z, x, row, _), tile_id in zip(self.pending, ids)],
+                )
+            else:
+                self.connection.executemany("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", self.pending)
+        self.pending = []
+
+    def close(self):
+        """Write the queued tiles and close the archive."""
+        try:
+            self.flush()
+            if self.wal:
+                self.connection.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # the tiles of the batch in progress are dropped, the previous batches are already committed
+            self.pending = []
+            self.connection.close()
+
+
+class MBTilesReader:
+    """
+    Read the encoded tiles of an MBTiles archive, with the tiles addressed by their XYZ coordinates and the gzipped
+    tiles decompressed, ready for `decode`:
+
+        with MBTilesReader("tiles.mbtiles") as reader:
+            for z, x, y, data in reader.tiles(min_zoom=10):
+                layers = decode(data)
+    """
+
+    def __init__(self, path, batch_size=MBTILES_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(f"{Path(path).absolute().as_uri()}?mode=ro", uri=True)
+
+    @property
+    def metadata(self):
+        """The metadata of the archive, as a dictionary."""
+        return dict(self.connection.execute("SELECT name, value FROM metadata"))
+
+    @staticmethod
+    def _tile_bytes(data):
+        data = bytes(data)
+        if data[:2] == b"\x1f\x8b":
+            return gzip.decompress(data)
+        return data
+
+    def get_tile(self, z, x, y):
+        """Return the encoded tile (`z`, `x`, `y`), or `None` when the archive doesn't have it."""
+        row = self.connection.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, _tms_row(z, y)),
+        ).fetchone()
+        return None if row is None else self._tile_bytes(row[0])
+
+    def tiles(self, min_zoom=None, max_zoom=None):
+        """Yield the (z, x, y, encoded tile) of the tiles of the archive in the zoom level range, fetching them from a
+        cursor in batches rather than loading the whole archive."""
+        query = "SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles WHERE zoom_level BETWEEN ? AND ?"
+        cursor = self.connection.execute(
+            query, (0 if min_zoom is None else min_zoom, 32 if max_zoom is None else max_zoom)
+        )
+        try:
+            while True:
+                batch = cursor.fetchmany(self.batch_size)
+                if not batch:
+                    break
+                for z, x, row, data in batch:
+                    yield z, x, _tms_row(z, row), self._tile_bytes(data)
+        finally:
+            cursor.close()
+
+    def __iter__(self):
+        return self.tiles()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
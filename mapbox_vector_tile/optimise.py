@@ -1,7 +1,24 @@
+import gzip
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import time
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
 
 from mapbox_vector_tile.Mapbox import vector_tile_pb2 as vector_tile
-from mapbox_vector_tile.utils import CMD_LINE_TO, CMD_MOVE_TO, LINESTRING, zig_zag_decode, zig_zag_encode
+from mapbox_vector_tile.utils import (
+    CMD_LINE_TO,
+    CMD_MOVE_TO,
+    LINESTRING,
+    tile_buffer,
+    zig_zag_decode,
+    zig_zag_encode,
+)
 
 
 class StringTableOptimiser:
@@ -204,12 +221,12 @@ def optimise_multilinestring(geom):
 
 def optimise_tile(tile_bytes):
     """
-    Decode a sequence of bytes as an MVT tile and reorder the string table of its layers and the order of its
-    multilinestrings to save a few bytes.
+    Decode a sequence of bytes, or any object supporting the buffer protocol, as an MVT tile and reorder the string
+    table of its layers and the order of its multilinestrings to save a few bytes.
     """
 
     t = vector_tile.tile()
-    t.ParseFromString(tile_bytes)
+    t.ParseFromString(tile_buffer(tile_bytes))
 
     for layer in t.layers:
         sto = StringTableOptimiser()
@@ -226,16 +243,211 @@ def optimise_tile(tile_bytes):
     return t.SerializeToString()
 
 
-if __name__ == "__main__":
+def _optimise_blob(tile_bytes):
+    """
+    Optimise a tile blob as stored on disk or in an archive, which may be gzip-compressed. The compression of the
+    input is preserved in the output.
+    """
+    if tile_bytes[:2] == b"\x1f\x8b":
+        return gzip.compress(optimise_tile(gzip.decompress(tile_bytes)), mtime=0)
+    return optimise_tile(tile_bytes)
+
+
+def _write_atomic(path, data):
+    """
+    Write data to path by writing a temporary file in the same directory and renaming it over the destination, so
+    that readers never observe a partially written tile.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        tmp_path.replace(path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+class OptimiseStats:
+    """
+    Aggregate statistics of a batch optimisation: number of tiles processed, total bytes before and after, and the
+    distribution of the time spent optimising each tile.
+    """
+
+    def __init__(self):
+        self.tiles = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.durations = []
+
+    def add(self, bytes_before, bytes_after, duration):
+        self.tiles += 1
+        self.bytes_before += bytes_before
+        self.bytes_after += bytes_after
+        self.durations.append(duration)
+
+    def percentile(self, q):
+        """Return the q-th percentile (nearest rank) of the per-tile durations in seconds."""
+        if not self.durations:
+            return 0.0
+        durations = sorted(self.durations)
+        rank = max(1, min(len(durations), math.ceil(q / 100.0 * len(durations))))
+        return durations[rank - 1]
+
+    def summary(self):
+        saved = self.bytes_before - self.bytes_after
+        ratio = 100.0 * saved / self.bytes_before if self.bytes_before else 0.0
+        timings = ", ".join(f"p{q}={self.percentile(q) * 1000:.2f}ms" for q in (50, 90, 99, 100))
+        return (
+            f"tiles processed: {self.tiles}\n"
+            f"bytes before: {self.bytes_before}\n"
+            f"bytes after: {self.bytes_after} ({saved} saved, {ratio:.1f}%)\n"
+            f"time per tile: {timings}"
+        )
+
+
+def _iter_tile_directory(root):
+    """
+    Yield the tile files of a z/x/y directory tree, i.e. files at a depth of three whose directory names and file
+    stem are integers.
+    """
+    for path in sorted(root.glob("*/*/*")):
+        if path.is_file() and path.parent.name.isdigit() and path.parent.parent.name.isdigit():
+            stem = path.name.split(".", 1)[0]
+            if stem.isdigit():
+                yield path
+
+
+def _optimise_file(paths):
+    input_path, output_path = paths
+    data = input_path.read_bytes()
+    start = time.perf_counter()
+    result = _optimise_blob(data)
+    duration = time.perf_counter() - start
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(output_path, result)
+    return len(data), len(result), duration
+
+
+def _timed_optimise_blob(tile_bytes):
+    start = time.perf_counter()
+    result = _optimise_blob(tile_bytes)
+    return result, time.perf_counter() - start
+
+
+_MBTILES_BATCH_SIZE = 1024
+
+
+def _pool(processes):
+    """Return a process pool, or a null context when running in the current process is requested."""
+    if processes == 1:
+        return nullcontext()
+    return ProcessPoolExecutor(max_workers=processes)
+
+
+def _map(executor, fn, items):
+    if executor is None:
+        return map(fn, items)
+    return executor.map(fn, items, chunksize=16)
+
+
+def optimise_directory(input_dir, output_dir=None, processes=None):
+    """
+    Optimise every tile of a z/x/y directory tree using a pool of `processes` worker processes (default to the number
+    of CPUs). Optimised tiles are written atomically into `output_dir` with the same layout, or in place when no
+    output directory is given.
+
+    Returns an `OptimiseStats` instance.
+    """
+    input_dir = Path(input_dir)
+    output_dir = input_dir if output_dir is None else Path(output_dir)
+    jobs = ((path, output_dir / path.relative_to(input_dir)) for path in _iter_tile_directory(input_dir))
+
+    stats = OptimiseStats()
+    with _pool(processes) as executor:
+        for bytes_before, bytes_after, duration in _map(executor, _optimise_file, jobs):
+            stats.add(bytes_before, bytes_after, duration)
+    return stats
+
+
+def optimise_mbtiles(input_path, output_path=None, processes=None):
+    """
+    Optimise every tile of an MBTiles archive using a pool of `processes` worker processes (default to the number of
+    CPUs). The result, including the archive metadata, is built in a temporary file which then atomically replaces
+    `output_path`, or the input archive when no output path is given.
+
+    Returns an `OptimiseStats` instance.
+    """
+    input_path = Path(input_path)
+    output_path = input_path if output_path is None else Path(output_path)
+    fd, tmp_name = tempfile.mkstemp(dir=output_path.parent, prefix=f".{output_path.name}.", suffix=".tmp")
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+
+    stats = OptimiseStats()
+    src = sqlite3.connect(str(input_path))
+    dst = sqlite3.connect(str(tmp_path))
+    try:
+        dst.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        dst.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+        dst.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        dst.executemany("INSERT INTO metadata VALUES (?, ?)", src.execute("SELECT name, value FROM metadata"))
+
+        rows = src.execute("SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles")
+        with _pool(processes) as executor:
+            while True:
+                # bound the memory use to a batch of tiles in flight, rather than the whole archive
+                batch = rows.fetchmany(_MBTILES_BATCH_SIZE)
+                if not batch:
+                    break
+                results = _map(executor, _timed_optimise_blob, [bytes(data) for _, _, _, data in batch])
+                for (z, x, y, data), (result, duration) in zip(batch, results):
+                    dst.execute("INSERT INTO tiles VALUES (?, ?, ?, ?)", (z, x, y, sqlite3.Binary(result)))
+                    stats.add(len(data), len(result), duration)
+        dst.commit()
+    except BaseException:
+        dst.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        src.close()
+    dst.close()
+    tmp_path.replace(output_path)
+    return stats
+
+
+def main(argv=None):
     import argparse
-    import sys
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument("input_file", help="Input MVT file", type=argparse.FileType("r"))
+    parser = argparse.ArgumentParser(
+        description="Optimise an MVT tile, every tile of a z/x/y directory tree or every tile of an MBTiles archive."
+    )
+    parser.add_argument("input", help="Input MVT file, z/x/y tile directory or MBTiles archive", type=Path)
     parser.add_argument(
-        "--output-file", help="Output file, default is stdout", type=argparse.FileType("w"), default=sys.stdout
+        "--output-file",
+        help="Output file, directory or archive. Default is stdout for a single tile, and in place for directories "
+        "and archives",
+        type=Path,
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--processes", help="Number of worker processes for batches, default is the number of CPUs", type=int
+    )
+    args = parser.parse_args(argv)
+
+    if args.input.is_dir():
+        stats = optimise_directory(args.input, args.output_file, processes=args.processes)
+    elif args.input.suffix == ".mbtiles":
+        stats = optimise_mbtiles(args.input, args.output_file, processes=args.processes)
+    else:
+        output_bytes = optimise_tile(args.input.read_bytes())
+        if args.output_file is None:
+            sys.stdout.buffer.write(output_bytes)
+        else:
+            _write_atomic(args.output_file, output_bytes)
+        return
+    print(stats.summary())
 
-    output_bytes = optimise_tile(args.input_file.read())
-    args.output_file.write(output_bytes)
+
+if __name__ == "__main__":
+    main()
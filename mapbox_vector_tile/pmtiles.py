@@ -0,0 +1,417 @@
+# Tile archives in the PMTiles version 3 layout: a fixed header, a root directory, the JSON metadata, leaf directories
+# and the tile data, in a single file read through mmap.
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from bisect import bisect_right
+from collections import OrderedDict
+from pathlib import Path
+
+from mapbox_vector_tile.splice import _encode_varint, _read_varint
+
+PMTILES_MAGIC = b"PMTiles\x03"
+# The header and the root directory are read together in the first bytes of the archive.
+PMTILES_ROOT_SIZE = 16384
+# Number of entries per leaf directory when the entries don't fit into the root directory.
+PMTILES_LEAF_SIZE = 4096
+# Number of parsed directories kept by a reader.
+PMTILES_DIRECTORY_CACHE_SIZE = 64
+
+COMPRESSION_NONE = 1
+COMPRESSION_GZIP = 2
+TILE_TYPE_MVT = 1
+
+# magic and version, 11 offsets, lengths and counts, clustered flag, compressions, tile type, zoom range, bounds,
+# center zoom and center
+_HEADER = struct.Struct("<8s11Q6B4iB2i")
+
+
+def zxy_to_tile_id(z, x, y):
+    """Return the PMTiles id of the XYZ tile (`z`, `x`, `y`): the number of tiles of the lower zoom levels, plus the
+    position of the tile along the Hilbert curve of its zoom level."""
+    n = 1 << z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError(f"Invalid tile ({z}, {x}, {y}).")
+    tile_id = (n * n - 1) // 3
+    s = n >> 1
+    while s:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        tile_id += s * s * ((3 * rx) ^ ry)
+        if not ry:
+            if rx:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return tile_id
+
+
+def tile_id_to_zxy(tile_id):
+    """Return the (z, x, y) XYZ tile of a PMTiles id."""
+    z = 0
+    first = 0
+    while first + (1 << (2 * z)) <= tile_id:
+        first += 1 << (2 * z)
+        z += 1
+    n = 1 << z
+    position = tile_id - first
+    x = y = 0
+    s = 1
+    while s < n:
+        rx = 1 & (position >> 1)
+        ry = 1 & (position ^ rx)
+        if not ry:
+            if rx:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+        x += s * rx
+        y += s * ry
+        position >>= 2
+        s <<= 1
+    return z, x, y
+
+
+def _compress(data, compression):
+    return gzip.compress(data, mtime=0) if compression == COMPRESSION_GZIP else data
+
+
+def _decompress(data, compression):
+    if compression == COMPRESSION_GZIP:
+        return gzip.decompress(data)
+    if compression != COMPRESSION_NONE:
+        raise ValueError(f"Unsupported archive compression {compression}.")
+    return data
+
+
+def _serialize_directory(entries, compression):
+    """Serialize the (tile id, run length, offset, length) directory entries, column by column with delta encoded tile
+    ids, and with the offsets of the entries contiguous with the previous one stored as 0."""
+    data = bytearray(_encode_varint(len(entries)))
+    last_id = 0
+    for tile_id, _, _, _ in entries:
+        data += _encode_varint(tile_id - last_id)
+        last_id = tile_id
+    for _, run_length, _, _ in entries:
+        data += _encode_varint(run_length)
+    for _, _, _, length in entries:
+        data += _encode_varint(length)
+    next_offset = None
+    for _, _, offset, length in entries:
+        data += _encode_varint(0 if offset == next_offset else offset + 1)
+        next_offset = offset + length
+    return _compress(bytes(data), compression)
+
+
+def _parse_directory(data, compression):
+    """Return the tile ids, run lengths, offsets and lengths lists of a serialized directory."""
+    data = _decompress(data, compression)
+    count, pos = _read_varint(data, 0)
+    columns = []
+    for _ in range(4):
+        column = []
+        for _ in range(count):
+            value, pos = _read_varint(data, pos)
+            column.append(value)
+        columns.append(column)
+    tile_ids, run_lengths, lengths, offsets = columns
+    last_id = 0
+    for i in range(count):
+        last_id = tile_ids[i] = last_id + tile_ids[i]
+        if offsets[i]:
+            offsets[i] -= 1
+        elif i:
+            offsets[i] = offsets[i - 1] + lengths[i - 1]
+        else:
+            raise ValueError("Invalid archive: the first directory entry has no offset.")
+    return tile_ids, run_lengths, offsets, lengths
+
+
+def _build_directories(entries, compression):
+    """Return the serialized root directory and leaf directories of the entries, splitting them into leaf directories
+    when the root directory doesn't fit into the first bytes of the archive."""
+    root = _serialize_directory(entries, compression)
+    leaves = b""
+    leaf_size = PMTILES_LEAF_SIZE
+    while len(root) > PMTILES_ROOT_SIZE - _HEADER.size:
+        root_entries = []
+        leaves = bytearray()
+        for i in range(0, len(entries), leaf_size):
+            leaf = _serialize_directory(entries[i : i + leaf_size], compression)
+            root_entries.append((entries[i][0], 0, len(leaves), len(leaf)))
+            leaves += leaf
+        root = _serialize_directory(root_entries, compression)
+        leaf_size *= 2
+    return root, bytes(leaves)
+
+
+class PMTilesWriter:
+    """
+    Write encoded tiles into a single file archive in the PMTiles version 3 layout, read by `PMTilesReader`.
+
+    The tiles are given in any order and their data is spooled into a temporary file, where the identical tiles are
+    stored once. When the archive is closed, the tiles are sorted by their id along the Hilbert curve of each zoom
+    level, the consecutive tiles with identical data are collapsed into runs, and the archive is assembled with the
+    tile data in the order of the ids, streamed from the spool so that the memory use doesn't grow with the size of the
+    tile data.
+
+    Args:
+        path:
+            The path of the archive.
+
+        metadata:
+            An optional dictionary of JSON metadata.
+
+        compress:
+            Whether to gzip the tiles. Default to `False`, which lets the readers hand out the tiles without copying
+            them.
+
+        bounds, center:
+            The optional (min lon, min lat, max lon, max lat) bounds of the archive and its (lon, lat, zoom) center.
+
+    For example:
+
+        with PMTilesWriter("tiles.pmtiles", {"name": "roads"}) as writer:
+            writer.write_tiles(TilePyramid(layers).tiles())
+    """
+
+    def __init__(self, path, metadata=None, compress=False, bounds=(-180, -85, 180, 85), center=None):
+        self.path = Path(path)
+        self.metadata = metadata or {}
+        self.tile_compression = COMPRESSION_GZIP if compress else COMPRESSION_NONE
+        self.internal_compression = COMPRESSION_GZIP
+        self.bounds = bounds
+        self.center = center
+        self.entries = []
+        self.blobs = {}
+        self.data_length = 0
+        # the spool is closed with the writer
+        self.spool = tempfile.TemporaryFile(dir=self.path.parent)  # noqa:SIM115
+
+    def write_tile(self, z, x, y, data):
+        """Add the encoded tile (`z`, `x`, `y`)."""
+        data = _compress(bytes(data), self.tile_compression)
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        offset = self.blobs.get(digest)
+        if offset is None:
+            offset = self.blobs[digest] = self.data_length
+            self.spool.write(data)
+            self.data_length += len(data)
+        self.entries.append((zxy_to_tile_id(z, x, y), z, offset, len(data)))
+
+    def write_tiles(self, tiles):
+        """Add the (z, x, y, encoded tile) of `tiles`, such as the ones yielded by `TilePyramid.tiles`."""
+        for z, x, y, data in tiles:
+            self.write_tile(z, x, y, data)
+
+    def _cluster(self):
+        """Return the directory entries, the (offset, length) ranges of the spool to copy to lay the tile data out in
+        the order of the tile ids, and the length of the tile data."""
+        self.entries.sort()
+        entries = []
+        ranges = []
+        data_length = 0
+        new_offsets = {}
+        for tile_id, _, spool_offset, length in self.entries:
+            if entries and entries[-1][0] == tile_id:
+                raise ValueError(f"The tile {tile_id_to_zxy(tile_id)} is written twice.")
+            offset = new_offsets.get(spool_offset)
+            if offset is None:
+                offset = new_offsets[spool_offset] = data_length
+                data_length += length
+                # the tiles spooled in the order of their ids are copied at once
+                if ranges and sum(ranges[-1]) == spool_offset:
+                    ranges[-1] = (ranges[-1][0], ranges[-1][1] + length)
+                else:
+                    ranges.append((spool_offset, length))
+            last = entries[-1] if entries else None
+            # run of consecutive tiles with the same data
+            if last and last[2] == offset and last[0] + last[1] == tile_id:
+                entries[-1] = (last[0], last[1] + 1, offset, length)
+            else:
+                entries.append((tile_id, 1, offset, length))
+        return entries, ranges, data_length
+
+    def _copy_data(self, fh, ranges):
+        """Copy the `ranges` of the spool to `fh`, without loading the whole tile data in memory."""
+        if not self.data_length:
+            return
+        with mmap.mmap(self.spool.fileno(), 0, access=mmap.ACCESS_READ) as spool, memoryview(spool) as view:
+            for offset, length in ranges:
+                fh.write(view[offset : offset + length])
+
+    def close(self):
+        """Assemble the archive and write it atomically, streaming the tile data from the spool."""
+        try:
+            self.spool.flush()
+            self._write_archive()
+        finally:
+            self.spool.close()
+
+    def _write_archive(self):
+        entries, ranges, data_length = self._cluster()
+        root, leaves = _build_directories(entries, self.internal_compression)
+        metadata = _compress(json.dumps(self.metadata).encode(), self.internal_compression)
+        zooms = [z for _, z, _, _ in self.entries] or [0]
+        center = self.center or ((self.bounds[0] + self.bounds[2]) / 2, (self.bounds[1] + self.bounds[3]) / 2, 0)
+        root_offset = _HEADER.size
+        metadata_offset = root_offset + len(root)
+        leaves_offset = metadata_offset + len(metadata)
+        data_offset = leaves_offset + len(leaves)
+        header = _HEADER.pack(
+            PMTILES_MAGIC,
+            root_offset,
+            len(root),
+            metadata_offset,
+            len(metadata),
+            leaves_offset,
+            len(leaves),
+            data_offset,
+            data_length,
+            len(self.entries),
+            len(entries),
+            len(self.blobs),
+            1,
+            self.internal_compression,
+            self.tile_compression,
+            TILE_TYPE_MVT,
+            min(zooms),
+            max(zooms),
+            *(round(value * 10_000_000) for value in self.bounds),
+            center[2],
+            round(center[0] * 10_000_000),
+            round(center[1] * 10_000_000),
+        )
+
+        fd, tmp_name = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        tmp_path = Path(tmp_name)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in (header, root, metadata, leaves):
+                    fh.write(chunk)
+                self._copy_data(fh, ranges)
+            tmp_path.replace(self.path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.spool.close()
+
+
+class PMTilesReader:
+    """
+    Read the tiles of a PMTiles version 3 archive through mmap.
+
+    A tile lookup is a binary search in the root directory, and in a leaf directory for large archives, and the tile is
+    returned as a `memoryview` slice of the mapped file, which `decode` accepts without copying it. The parsed
+    directories are kept in a LRU cache of `cache_size` directories. The slices must be released before the reader is
+    closed.
+
+        with PMTilesReader("tiles.pmtiles") as reader:
+            layers = decode(reader.get_tile(14, 8185, 5449))
+    """
+
+    def __init__(self, path, cache_size=PMTILES_DIRECTORY_CACHE_SIZE):
+        if cache_size < 1:
+            raise ValueError(f"The cache size must be strictly positive. {cache_size} provided.")
+        self.cache_size = cache_size
+        self._directories = OrderedDict()
+        with Path(path).open("rb") as fh:
+            self.mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mmap)
+        if len(self.buffer) < _HEADER.size or self.buffer[:8] != PMTILES_MAGIC:
+            self.close()
+            raise ValueError("Invalid archive: not a PMTiles version 3 archive.")
+        fields = _HEADER.unpack_from(self.buffer)
+        (
+            self.root_offset,
+            self.root_length,
+            self.metadata_offset,
+            self.metadata_length,
+            self.leaves_offset,
+            self.leaves_length,
+            self.data_offset,
+            self.data_length,
+        ) = fields[1:9]
+        self.internal_compression, self.tile_compression = fields[13:15]
+        self.min_zoom, self.max_zoom = fields[16:18]
+
+    @property
+    def metadata(self):
+        """The JSON metadata of the archive."""
+        data = self.buffer[self.metadata_offset : self.metadata_offset + self.metadata_length]
+        return json.loads(_decompress(bytes(data), self.internal_compression))
+
+    def _directory(self, offset, length):
+        directory = self._directories.get(offset)
+        if directory is not None:
+            self._directories.move_to_end(offset)
+            return directory
+        data = bytes(self.buffer[offset : offset + length])
+        directory = self._directories[offset] = _parse_directory(data, self.internal_compression)
+        if len(self._directories) > self.cache_size:
+            self._directories.popitem(last=False)
+        return directory
+
+    def _tile_slice(self, offset, length):
+        data = self.buffer[self.data_offset + offset : self.data_offset + offset + length]
+        if self.tile_compression == COMPRESSION_NONE:
+            return data
+        return _decompress(bytes(data), self.tile_compression)
+
+    def get_tile(self, z, x, y):
+        """Return the encoded tile (`z`, `x`, `y`), or `None` when the archive doesn't have it."""
+        tile_id = zxy_to_tile_id(z, x, y)
+        offset, length = self.root_offset, self.root_length
+        # the archives have at most a root directory and leaf directories
+        for _ in range(4):
+            tile_ids, run_lengths, offsets, lengths = self._directory(offset, length)
+            i = bisect_right(tile_ids, tile_id) - 1
+            if i < 0:
+                return None
+            if run_lengths[i]:
+                if tile_id < tile_ids[i] + run_lengths[i]:
+                    return self._tile_slice(offsets[i], lengths[i])
+                return None
+            offset, length = self.leaves_offset + offsets[i], lengths[i]
+        raise ValueError("Invalid archive: too many nested directories.")
+
+    def _entries(self, offset, length):
+        tile_ids, run_lengths, offsets, lengths = self._directory(offset, length)
+        for tile_id, run_length, entry_offset, entry_length in zip(tile_ids, run_lengths, offsets, lengths):
+            if run_length:
+                yield tile_id, run_length, entry_offset, entry_length
+            else:
+                yield from self._entries(self.leaves_offset + entry_offset, entry_length)
+
+    def tiles(self):
+        """Yield the (z, x, y, encoded tile) of the tiles of the archive, in the order of their ids."""
+        for tile_id, run_length, offset, length in self._entries(self.root_offset, self.root_length):
+            for run_id in range(tile_id, tile_id + run_length):
+                yield (*tile_id_to_zxy(run_id), self._tile_slice(offset, length))
+
+    def __iter__(self):
+        return self.tiles()
+
+    def close(self):
+        self._directories.clear()
+        self.buffer.release()
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
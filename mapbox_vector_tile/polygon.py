@@ -1,10 +1,45 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 import pyclipper
+import shapely
 from shapely.geometry.multipolygon import MultiPolygon
 from shapely.geometry.polygon import Polygon
 from shapely.ops import unary_union
 from shapely.validation import explain_validity
 
 
+class RepairBudgetExceededError(Exception):
+    """Raised when the repair of a geometry exceeds its time or complexity budget."""
+
+
+# Deadline, in `time.monotonic` seconds, of the repair in progress in the current thread or task.
+_repair_deadline = ContextVar("repair_deadline", default=None)
+
+
+@contextmanager
+def repair_time_budget(seconds):
+    """
+    Context manager bounding the time spent repairing geometries in its block to `seconds`. Once the budget is spent,
+    the repair functions of this module raise `RepairBudgetExceededError` at their next checkpoint. A `None` budget
+    doesn't set any limit.
+    """
+    deadline = None if seconds is None else time.monotonic() + seconds
+    token = _repair_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _repair_deadline.reset(token)
+
+
+def check_repair_budget():
+    """Raise `RepairBudgetExceededError` if the time budget of the repair in progress is spent."""
+    deadline = _repair_deadline.get()
+    if deadline is not None and time.monotonic() > deadline:
+        raise RepairBudgetExceededError("The time budget of the geometry repair is exceeded.")
+
+
 def _coords(shape):
     """
     Return a list of lists of coordinates of the polygon. The list consists firstly of the list of exterior
@@ -27,12 +62,13 @@ def _drop_degenerate_inners(shape):
     """
     assert shape.geom_type == "Polygon"
 
-    new_inners = []
-    for inner in shape.interiors:
-        # need to make a polygon of the linearring to get the _filled_ area of
-        # the closed ring.
-        if abs(Polygon(inner).area) >= 0.5:
-            new_inners.append(inner)
+    inners = list(shape.interiors)
+    if not inners:
+        return shape
+
+    # need to make polygons of the linearrings to get the _filled_ area of the closed rings.
+    areas = shapely.area(shapely.polygons(inners))
+    new_inners = [inner for inner, area in zip(inners, areas) if area >= 0.5]
 
     return Polygon(shape.exterior, new_inners)
 
@@ -76,12 +112,72 @@ def _generate_polys(contours):
         yield p
 
 
+def _polygon_from_rings(contour, holes):
+    """
+    Build the polygon of an outer contour and its hole contours, as returned by a pyclipper union, in one go. The
+    union already returns correctly nested and non-overlapping rings, so that the result is usually valid.
+
+    Returns None if the result is not valid.
+    """
+    try:
+        poly = Polygon(contour, holes)
+    except ValueError:
+        return None
+    return poly if poly.is_valid else None
+
+
+def _polygon_by_difference(contour, holes):
+    """
+    Build the polygon of an outer contour and its hole contours by subtracting each hole from the outer polygon,
+    discarding the holes which can't be subtracted. This is much slower than `_polygon_from_rings`, but robust to
+    holes crossing or touching the outer contour.
+    """
+    poly = _contour_to_poly(contour)
+
+    # We add each inner one-by-one so that we can reject them individually if they cause the polygon to become
+    # invalid. If the shape has lots of inners, then this can mean a proportional amount of work, and may take
+    # 1,000s of seconds. Instead, we can group inners together, which reduces the number of times we call the
+    # expensive 'difference' method.
+    block_size = 200
+    inners = _union_in_blocks(holes, block_size) if len(holes) > block_size else _generate_polys(holes)
+
+    for inner in inners:
+        check_repair_budget()
+
+        # The difference of two valid polygons may fail, and in this  situation we'd like to be able to display
+        # the polygon anyway. So we discard the bad inner and continue.
+        #
+        # See test_polygon_inners_crossing_outer for a test case.
+        try:
+            diff = poly.difference(inner)
+        except Exception:
+            continue
+
+        if not diff.is_valid:
+            diff = diff.buffer(0)
+
+        # Keep this for when https://trac.osgeo.org/geos/ticket/789 is resolved.
+        #
+        # assert diff.is_valid, (
+        #     f"Difference of {poly.wkt} and {inner.wkt} did not make valid polygon {diff.wkt} "
+        #     f" because {explain_validity(diff)}"
+        # )
+        # NOTE: this throws away the inner ring if we can't produce a valid difference. Not ideal, but we'd
+        # rather produce something that's valid than nothing.
+        if diff.is_valid:
+            poly = diff
+
+    return poly
+
+
 def _polytree_node_to_shapely(node):
     """
     Recurses down a Clipper PolyTree, extracting the results as Shapely objects.
 
     Returns a tuple of (list of polygons, list of children)
     """
+    check_repair_budget()
+
     polygons = []
     children = []
     for ch in node.Childs:
@@ -96,38 +192,9 @@ def _polytree_node_to_shapely(node):
         children = [node.Contour] if node.Contour else []
 
     elif node.Contour:
-        poly = _contour_to_poly(node.Contour)
-
-        # We add each inner one-by-one so that we can reject them individually if they cause the polygon to become
-        # invalid. If the shape has lots of inners, then this can mean a proportional amount of work, and may take
-        # 1,000s of seconds. Instead, we can group inners together, which reduces the number of times we call the
-        # expensive 'difference' method.
-        block_size = 200
-        inners = _union_in_blocks(children, block_size) if len(children) > block_size else _generate_polys(children)
-
-        for inner in inners:
-            # The difference of two valid polygons may fail, and in this  situation we'd like to be able to display
-            # the polygon anyway. So we discard the bad inner and continue.
-            #
-            # See test_polygon_inners_crossing_outer for a test case.
-            try:
-                diff = poly.difference(inner)
-            except Exception:
-                continue
-
-            if not diff.is_valid:
-                diff = diff.buffer(0)
-
-            # Keep this for when https://trac.osgeo.org/geos/ticket/789 is resolved.
-            #
-            # assert diff.is_valid, (
-            #     f"Difference of {poly.wkt} and {inner.wkt} did not make valid polygon {diff.wkt} "
-            #     f" because {explain_validity(diff)}"
-            # )
-            # NOTE: this throws away the inner ring if we can't produce a valid difference. Not ideal, but we'd
-            # rather produce something that's valid than nothing.
-            if diff.is_valid:
-                poly = diff
+        poly = _polygon_from_rings(node.Contour, children)
+        if poly is None:
+            poly = _polygon_by_difference(node.Contour, children)
 
         assert poly.is_valid
         if poly.geom_type == "MultiPolygon":
@@ -208,6 +275,7 @@ def make_valid_multipolygon(shape):
     for g in shape.geoms:
         if g.is_empty:
             continue
+        check_repair_budget()
 
         valid_g = make_valid_polygon(g)
 
@@ -0,0 +1,202 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import numpy
+import shapely
+
+from mapbox_vector_tile import encode
+from mapbox_vector_tile.geom_encoder import load_geometry
+from mapbox_vector_tile.tiles import _bbox_cover, lonlat_to_mercator, tile_bounds, tile_size
+from mapbox_vector_tile.utils import get_encode_options
+
+# Number of tiles encoded by a worker process per task.
+PYRAMID_BATCH_SIZE = 64
+# Number of tasks submitted ahead to each worker process, bounding the memory used by the pending tiles.
+PYRAMID_TASKS_PER_PROCESS = 4
+
+
+def _load_geometry(geometry_spec):
+    geometry = load_geometry(geometry_spec)
+    if geometry is None:
+        raise NotImplementedError("Can't do geometries that are not wkt, wkb, or shapely geometries")
+    return geometry
+
+
+class _PyramidLayer:
+    def __init__(self, name, features, geometries, min_zoom, max_zoom):
+        self.name = name
+        self.features = features
+        self.geometries = geometries
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self._tree = None
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = shapely.STRtree(self.geometries)
+        return self._tree
+
+    def __getstate__(self):
+        # the tree is only used by the process computing the contents of the tiles
+        return {**self.__dict__, "_tree": None}
+
+
+class TilePyramid:
+    """
+    Build the tiles of a range of zoom levels from the features of several layers.
+
+    The geometries are loaded, and projected to Web Mercator when `lonlat` is set, once for all the zoom levels. For
+    each zoom level, the candidate tiles of each feature are enumerated from its bounding box, and the features of each
+    tile are selected with a single query of an STRtree of the geometries of the layer. The geometries of each tile are
+    then clipped to the tile, enlarged by `buffer` tile units on each side, and encoded with the bounds of the tile as
+    `quantize_bounds`.
+
+    Args:
+        layers:
+            The layers, as dictionaries with a `name`, `features` like the ones given to `encode`, and optional
+            `min_zoom` and `max_zoom` zoom levels restricting the zoom levels of the layer.
+
+        min_zoom, max_zoom:
+            The range of zoom levels of the pyramid. Default to 0 and 14.
+
+        options:
+            The encoding options of the tiles, see `encode`. The `quantize_bounds` option is set for each tile.
+
+        buffer:
+            The size of the buffer around the tiles, in tile units. Default to 64.
+
+        lonlat:
+            Whether the geometries are in longitude and latitude, rather than in Web Mercator. Default to `True`.
+
+    The tiles are yielded by `tiles`:
+
+        for z, x, y, data in TilePyramid(layers, max_zoom=10).tiles(processes=4):
+            ...
+    """
+
+    def __init__(self, layers, min_zoom=0, max_zoom=14, options=None, buffer=64, lonlat=True):
+        if not 0 <= min_zoom <= max_zoom:
+            raise ValueError(f"The zoom levels must be positive and ordered. {min_zoom} and {max_zoom} provided.")
+        if buffer < 0:
+            raise ValueError(f"The buffer must be positive or zero. {buffer} provided.")
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.options = get_encode_options(layer_options=options, default_options=None)
+        self.buffer = buffer
+
+        self.layers = []
+        for layer in layers:
+            features = list(layer["features"])
+            geometries = numpy.array([_load_geometry(feature["geometry"]) for feature in features], dtype=object)
+            if lonlat and len(geometries):
+                geometries = lonlat_to_mercator(geometries)
+            self.layers.append(
+                _PyramidLayer(
+                    layer["name"],
+                    features,
+                    geometries,
+                    layer.get("min_zoom", min_zoom),
+                    layer.get("max_zoom", max_zoom),
+                )
+            )
+
+    def _margin(self, zoom):
+        return tile_size(zoom) * self.buffer / self.options.extents
+
+    def tile_members(self, zoom):
+        """Return a dictionary of the (layer index, feature indices) of the layers of each (x, y) tile of the zoom
+        level with features."""
+        margin = self._margin(zoom)
+        members = {}
+        for layer_idx, layer in enumerate(self.layers):
+            if not layer.min_zoom <= zoom <= layer.max_zoom or not len(layer.geometries):
+                continue
+            bounds = shapely.bounds(layer.geometries) + (-margin, -margin, margin, margin)
+            _, x, y = _bbox_cover(bounds, zoom)
+            tiles = numpy.unique(numpy.column_stack((x, y)), axis=0)
+            boxes = shapely.box(*numpy.array([tile_bounds(zoom, tx, ty) for tx, ty in tiles.tolist()]).T)
+            boxes = shapely.buffer(boxes, margin, join_style="mitre") if margin else boxes
+            tile_indices, feature_indices = layer.tree.query(boxes, predicate="intersects")
+            order = numpy.lexsort((feature_indices, tile_indices))
+            tile_indices = tile_indices[order]
+            feature_indices = feature_indices[order]
+            starts = numpy.flatnonzero(numpy.r_[True, tile_indices[1:] != tile_indices[:-1]])
+            for tile_idx, tile_features in zip(tile_indices[starts], numpy.split(feature_indices, starts[1:])):
+                tx, ty = tiles[tile_idx].tolist()
+                members.setdefault((tx, ty), []).append((layer_idx, tile_features))
+        return members
+
+    def encode_tile(self, z, x, y, members):
+        """Return the encoded tile (`z`, `x`, `y`) with the features given by its `members`, as returned by
+        `tile_members`."""
+        bounds = tile_bounds(z, x, y)
+        margin = self._margin(z)
+        clip_bounds = (bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin)
+        layers = []
+        for layer_idx, feature_indices in members:
+            layer = self.layers[layer_idx]
+            clipped = shapely.clip_by_rect(layer.geometries[feature_indices], *clip_bounds)
+            features = []
+            for feature_idx, geometry in zip(feature_indices.tolist(), clipped):
+                if geometry.is_empty:
+                    continue
+                feature = layer.features[feature_idx]
+                features.append(
+                    {"geometry": geometry, "properties": feature.get("properties"), "id": feature.get("id")}
+                )
+            layers.append({"name": layer.name, "features": features})
+        return encode(layers, default_options=self.options.replace(quantize_bounds=bounds))
+
+    def tiles(self, processes=1):
+        """Yield the (z, x, y, encoded tile) of the tiles with features, ordered by zoom level, column and row. The
+        tiles are encoded by a pool of `processes` worker processes (the number of CPUs when `None`), or in the current
+        process when `processes` is 1."""
+        if processes is None:
+            processes = os.cpu_count() or 1
+        # bound the number of pending tiles, rather than submitting all the tiles of a zoom level at once
+        window = PYRAMID_TASKS_PER_PROCESS * processes
+        with _pool(processes, self) as executor:
+            for zoom in range(self.min_zoom, self.max_zoom + 1):
+                members = self.tile_members(zoom)
+                jobs = [(zoom, x, y, members[x, y]) for x, y in sorted(members)]
+                if executor is None:
+                    for z, x, y, tile_members in jobs:
+                        yield z, x, y, self.encode_tile(z, x, y, tile_members)
+                    continue
+                batches = [jobs[i : i + PYRAMID_BATCH_SIZE] for i in range(0, len(jobs), PYRAMID_BATCH_SIZE)]
+                for results in _imap(executor, _encode_tiles, batches, window):
+                    yield from results
+
+
+def _pool(processes, pyramid):
+    """Return a process pool whose workers hold the pyramid, or a null context when running in the current process is
+    requested."""
+    if processes == 1:
+        return nullcontext()
+    return ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(pyramid,))
+
+
+def _imap(executor, fn, items, window):
+    """Like `executor.map`, but with at most `window` pending tasks."""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+_worker_pyramid = None
+
+
+def _init_worker(pyramid):
+    global _worker_pyramid
+    _worker_pyramid = pyramid
+
+
+def _encode_tiles(jobs):
+    return [(z, x, y, _worker_pyramid.encode_tile(z, x, y, members)) for z, x, y, members in jobs]
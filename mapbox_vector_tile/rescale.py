@@ -0,0 +1,352 @@
+import shapely
+from shapely.geometry.polygon import Polygon, orient
+
+from mapbox_vector_tile.geom_encoder import GeometryEncoder
+from mapbox_vector_tile.Mapbox import vector_tile_pb2 as vector_tile
+from mapbox_vector_tile.splice import prune_tables
+from mapbox_vector_tile.utils import (
+    CMD_BITS,
+    CMD_LINE_TO,
+    CMD_MOVE_TO,
+    CMD_SEG_END,
+    LINESTRING,
+    POINT,
+    POLYGON,
+    tile_buffer,
+    zig_zag_decode,
+    zig_zag_encode,
+)
+
+#
+# Command streams
+#
+
+
+def decode_geometry(geometry):
+    """Return the parts of the command stream `geometry` as lists of (x, y) integer tile coordinates: a part per
+    MoveTo command of a point geometry, a part per line, or a part per ring, without its closing vertex."""
+    parts = []
+    part = None
+    x = y = 0
+    i = 0
+    n = len(geometry)
+    while i < n:
+        cmd_int = geometry[i]
+        i += 1
+        cmd = cmd_int & ((1 << CMD_BITS) - 1)
+        count = cmd_int >> CMD_BITS
+        if cmd in (CMD_MOVE_TO, CMD_LINE_TO):
+            if cmd == CMD_MOVE_TO:
+                part = []
+                parts.append(part)
+            elif part is None:
+                raise ValueError("Invalid geometry: LineTo command before any MoveTo command.")
+            if i + 2 * count > n:
+                raise ValueError("Invalid geometry: truncated command.")
+            for _ in range(count):
+                x += zig_zag_decode(geometry[i])
+                y += zig_zag_decode(geometry[i + 1])
+                i += 2
+                part.append((x, y))
+        elif cmd != CMD_SEG_END:
+            raise ValueError(f"Invalid geometry: unknown command {cmd}.")
+    return parts
+
+
+def encode_geometry(geom_type, parts):
+    """Return the command stream of the parts of a geometry, as returned by `decode_geometry`. The lines must have at
+    least 2 vertices and the rings at least 3, without consecutive duplicates."""
+    encode_cmd_length = GeometryEncoder.encode_cmd_length
+    geometry = []
+    last_x = last_y = 0
+    if geom_type == POINT:
+        points = [point for part in parts for point in part]
+        if points:
+            geometry.append(encode_cmd_length(CMD_MOVE_TO, len(points)))
+            for x, y in points:
+                geometry.append(zig_zag_encode(x - last_x))
+                geometry.append(zig_zag_encode(y - last_y))
+                last_x, last_y = x, y
+        return geometry
+
+    for part in parts:
+        x, y = part[0]
+        geometry.extend((encode_cmd_length(CMD_MOVE_TO, 1), zig_zag_encode(x - last_x), zig_zag_encode(y - last_y)))
+        last_x, last_y = x, y
+        geometry.append(encode_cmd_length(CMD_LINE_TO, len(part) - 1))
+        for x, y in part[1:]:
+            geometry.append(zig_zag_encode(x - last_x))
+            geometry.append(zig_zag_encode(y - last_y))
+            last_x, last_y = x, y
+        if geom_type == POLYGON:
+            geometry.append(encode_cmd_length(CMD_SEG_END, 1))
+    return geometry
+
+
+def _dedupe(part):
+    """Return the vertices of the part without the consecutive duplicates."""
+    result = [part[0]]
+    for point in part[1:]:
+        if point != result[-1]:
+            result.append(point)
+    return result
+
+
+def _ring_area(ring):
+    """Return twice the signed area of the ring."""
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]))
+
+
+def _clean_ring(ring, sign):
+    """Return the ring without consecutive duplicates, or None if it is degenerate or doesn't have the winding order
+    `sign` anymore."""
+    ring = _dedupe(ring)
+    while len(ring) > 1 and ring[-1] == ring[0]:
+        ring.pop()
+    if len(ring) < 3 or _ring_area(ring) * sign <= 0:
+        return None
+    return ring
+
+
+def _polygons(rings):
+    """Group the rings into (exterior, interiors, winding order of the exteriors) polygons. The winding order of the
+    exteriors is the one of the first ring, and rings without area are dropped, like in `TileData.parse_geometry`."""
+    polygons = []
+    sign = 0
+    for ring in rings:
+        area = _ring_area(ring)
+        if area == 0:
+            continue
+        if sign == 0:
+            sign = 1 if area > 0 else -1
+        if area * sign > 0:
+            polygons.append((ring, [], sign))
+        else:
+            polygons[-1][1].append(ring)
+    return polygons
+
+
+#
+# Clipping
+#
+
+
+def _bounds(part):
+    xs = [x for x, _ in part]
+    ys = [y for _, y in part]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _clip_segment(x0, y0, x1, y1, bounds):
+    """Return the (t0, t1) parameters of the part of the segment inside the bounds, or None (Liang-Barsky)."""
+    xmin, ymin, xmax, ymax = bounds
+    dx, dy = x1 - x0, y1 - y0
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)):
+        if p == 0:
+            if q < 0:
+                return None
+            continue
+        t = q / p
+        if p < 0:
+            if t > t1:
+                return None
+            t0 = max(t0, t)
+        else:
+            if t < t0:
+                return None
+            t1 = min(t1, t)
+    return t0, t1
+
+
+def _clip_line(line, bounds):
+    """Return the pieces of the line inside the bounds, with their new vertices rounded to the grid."""
+    xmin, ymin, xmax, ymax = bounds
+    line_xmin, line_ymin, line_xmax, line_ymax = _bounds(line)
+    if xmin <= line_xmin and line_xmax <= xmax and ymin <= line_ymin and line_ymax <= ymax:
+        pieces = [line]
+    else:
+        pieces = []
+        current = []
+        for (x0, y0), (x1, y1) in zip(line, line[1:]):
+            clipped = _clip_segment(x0, y0, x1, y1, bounds)
+            if clipped is None:
+                if current:
+                    pieces.append(current)
+                    current = []
+                continue
+            t0, t1 = clipped
+            if t0 > 0:
+                # the segment enters the bounds
+                if current:
+                    pieces.append(current)
+                current = [(round(x0 + t0 * (x1 - x0)), round(y0 + t0 * (y1 - y0)))]
+            elif not current:
+                current = [(x0, y0)]
+            if t1 < 1:
+                # the segment leaves the bounds
+                current.append((round(x0 + t1 * (x1 - x0)), round(y0 + t1 * (y1 - y0))))
+                pieces.append(current)
+                current = []
+            else:
+                current.append((x1, y1))
+        if current:
+            pieces.append(current)
+    return [piece for piece in map(_dedupe, pieces) if len(piece) >= 2]
+
+
+def _clip_polygon(exterior, interiors, sign, bounds):
+    """Return the rings of the polygon clipped to the bounds by GEOS, rounded to the grid."""
+    clipped = shapely.clip_by_rect(Polygon(exterior, interiors), *bounds)
+    rings = []
+    for polygon in shapely.get_parts(clipped):
+        if polygon.geom_type != "Polygon" or polygon.is_empty:
+            continue
+        polygon = orient(polygon, sign=float(sign))
+        ring = _clean_ring([(round(x), round(y)) for x, y in polygon.exterior.coords], sign)
+        if ring is None:
+            continue
+        rings.append(ring)
+        for interior in polygon.interiors:
+            ring = _clean_ring([(round(x), round(y)) for x, y in interior.coords], -sign)
+            if ring is not None:
+                rings.append(ring)
+    return rings
+
+
+def clip_parts(geom_type, parts, bounds):
+    """Return the parts of a geometry, as returned by `decode_geometry`, clipped to the (xmin, ymin, xmax, ymax)
+    bounds. Only the polygons crossing the bounds are clipped by GEOS."""
+    xmin, ymin, xmax, ymax = bounds
+    if geom_type == POINT:
+        return [[(x, y) for part in parts for x, y in part if xmin <= x <= xmax and ymin <= y <= ymax]]
+    if geom_type == LINESTRING:
+        return [piece for part in parts if len(part) >= 2 for piece in _clip_line(part, bounds)]
+
+    rings = []
+    for exterior, interiors, sign in _polygons(parts):
+        exterior_xmin, exterior_ymin, exterior_xmax, exterior_ymax = _bounds(exterior)
+        if xmin <= exterior_xmin and exterior_xmax <= xmax and ymin <= exterior_ymin and exterior_ymax <= ymax:
+            rings.append(exterior)
+            rings.extend(interiors)
+        elif exterior_xmin < xmax and exterior_xmax > xmin and exterior_ymin < ymax and exterior_ymax > ymin:
+            rings.extend(_clip_polygon(exterior, interiors, sign, bounds))
+    return rings
+
+
+def scale_parts(geom_type, parts, factor):
+    """Return the parts of a geometry, as returned by `decode_geometry`, scaled by `factor` and rounded to the grid.
+    The zero-length segments are dropped, like in `GeometryEncoder.encode_arc`, as well as the lines left with a single
+    vertex, the rings left with less than 3 vertices or without area, and the interiors of the dropped exteriors."""
+    if geom_type == POINT:
+        return [[(round(x * factor), round(y * factor)) for x, y in part] for part in parts]
+    if geom_type == LINESTRING:
+        lines = (_dedupe([(round(x * factor), round(y * factor)) for x, y in part]) for part in parts if part)
+        return [line for line in lines if len(line) >= 2]
+
+    rings = []
+    for exterior, interiors, sign in _polygons(parts):
+        exterior = _clean_ring([(round(x * factor), round(y * factor)) for x, y in exterior], sign)
+        if exterior is None:
+            continue
+        rings.append(exterior)
+        for interior in interiors:
+            interior = _clean_ring([(round(x * factor), round(y * factor)) for x, y in interior], -sign)
+            if interior is not None:
+                rings.append(interior)
+    return rings
+
+
+#
+# Tiles
+#
+
+
+def _rewrite_features(layer, rewrite):
+    """Replace the geometry of each feature of the layer with `rewrite(feature type, parts)`, dropping the features
+    left without geometry, and prune the key and value tables of the layer."""
+    dropped = []
+    for i, feature in enumerate(layer.features):
+        geometry = []
+        if feature.type in (POINT, LINESTRING, POLYGON):
+            geometry = encode_geometry(feature.type, rewrite(feature.type, decode_geometry(feature.geometry)))
+        if geometry:
+            del feature.geometry[:]
+            feature.geometry.extend(geometry)
+        else:
+            dropped.append(i)
+    for i in reversed(dropped):
+        del layer.features[i]
+    if dropped:
+        prune_tables(layer)
+
+
+def overzoom(parent_bytes, parent_zxy, child_zxy, buffer=0):
+    """Return the encoded tile `child_zxy` derived from the encoded tile `parent_zxy` of a lower zoom level.
+
+    The geometries of the parent tile are scaled and clipped in the integer space of the tiles, to the child tile
+    enlarged by `buffer` tile units on each side. The features left without geometry are dropped, and the key and value
+    tables of the layers are pruned to the values still used. The extents of the layers are kept.
+
+    Args:
+        parent_bytes:
+            The encoded parent tile.
+
+        parent_zxy:
+            The (z, x, y) coordinates of the parent tile.
+
+        child_zxy:
+            The (z, x, y) coordinates of the child tile, in the parent tile.
+
+        buffer:
+            The size of the buffer around the child tile, in tile units. Default to 0.
+
+    Returns:
+        The encoded child tile.
+    """
+    parent_z, parent_x, parent_y = parent_zxy
+    child_z, child_x, child_y = child_zxy
+    dz = child_z - parent_z
+    if dz < 0 or (child_x >> dz, child_y >> dz) != (parent_x, parent_y):
+        raise ValueError(f"The tile {tuple(child_zxy)} is not in the tile {tuple(parent_zxy)}.")
+    if buffer < 0:
+        raise ValueError(f"The buffer must be positive or zero. {buffer} provided.")
+    scale = 1 << dz
+    offset_x = child_x - (parent_x << dz)
+    offset_y = child_y - (parent_y << dz)
+
+    tile = vector_tile.tile()
+    tile.ParseFromString(tile_buffer(parent_bytes))
+    for layer in tile.layers:
+        extent = layer.extent
+        dx = offset_x * extent
+        dy = offset_y * extent
+        bounds = (-buffer, -buffer, extent + buffer, extent + buffer)
+
+        def rewrite(geom_type, parts, dx=dx, dy=dy, bounds=bounds):
+            parts = [[(x * scale - dx, y * scale - dy) for x, y in part] for part in parts]
+            return clip_parts(geom_type, parts, bounds)
+
+        _rewrite_features(layer, rewrite)
+    return tile.SerializeToString()
+
+
+def rescale_extent(tile_bytes, new_extent):
+    """Return the encoded tile with the extent of all its layers set to `new_extent`, and their geometries scaled
+    accordingly in the integer space of the tiles. See `scale_parts` for the geometries dropped when the extent is
+    reduced. The features left without geometry are dropped, and the key and value tables of the layers are pruned to
+    the values still used.
+    """
+    if new_extent <= 0:
+        raise ValueError(f"The extent must be positive. {new_extent} provided.")
+
+    tile = vector_tile.tile()
+    tile.ParseFromString(tile_buffer(tile_bytes))
+    for layer in tile.layers:
+        extent = layer.extent
+        layer.extent = new_extent
+        if extent == new_extent:
+            continue
+        factor = new_extent / extent
+        _rewrite_features(layer, lambda geom_type, parts, factor=factor: scale_parts(geom_type, parts, factor))
+    return tile.SerializeToString()
@@ -0,0 +1,88 @@
+import struct
+
+from mapbox_vector_tile.Mapbox import vector_tile_pb2 as vector_tile
+
+
+def _is_float32(v):
+    """Return True if the float `v` can be stored as a 32 bits float without any loss of precision."""
+    try:
+        return struct.unpack("<f", struct.pack("<f", v))[0] == v
+    except OverflowError:
+        return False
+
+
+def encode_value(val, v, compact_values):
+    """Store the property value `v` in the `val` value message, using its smallest encoding if `compact_values`."""
+    if isinstance(v, bool):
+        val.bool_value = v
+    elif isinstance(v, str):
+        val.string_value = v
+    elif isinstance(v, int):
+        if not compact_values:
+            val.int_value = v
+        elif v >= 0:
+            val.uint_value = v
+        else:
+            val.sint_value = v
+    elif isinstance(v, float):
+        if compact_values and _is_float32(v):
+            val.float_value = v
+        else:
+            val.double_value = v
+
+
+class LayerSchema:
+    """
+    The keys, and optionally the common values, of the properties of a layer, declared up front.
+
+    Given as the `schema` encoding option, the keys and values of the schema are written at the start of the key and
+    value tables of the layer, so that the properties found in the schema are mapped to their tag indices without
+    growing the tables feature by feature. Properties outside of the schema are still encoded, after the ones of the
+    schema. The keys and values of the schema are written even if no feature uses them.
+
+    A schema is immutable, and can be shared by all the tiles, and the threads, of a tileset:
+
+        schema = LayerSchema(keys=["kind", "name"], values=["primary", "secondary"])
+        encode(layers, default_options={"schema": schema})
+    """
+
+    def __init__(self, keys, values=()):
+        self.keys = tuple(keys)
+        self.keys_idx = {}
+        for key in self.keys:
+            if not isinstance(key, str):
+                raise ValueError(f"The keys of a schema must be strings. {key!r} provided.")
+            if key in self.keys_idx:
+                raise ValueError(f"The key {key!r} is declared several times in the schema.")
+            self.keys_idx[key] = len(self.keys_idx)
+
+        # booleans are indexed apart, as True and False are equal to 1 and 0
+        self.values_idx = {}
+        self.values_bool_idx = {}
+        unique_values = []
+        for v in values:
+            if not isinstance(v, (str, bool, int, float)):
+                raise ValueError(
+                    f"The values of a schema must be strings, booleans, integers or floats. {v!r} provided."
+                )
+            values_idx = self.values_bool_idx if isinstance(v, bool) else self.values_idx
+            if v not in values_idx:
+                values_idx[v] = len(unique_values)
+                unique_values.append(v)
+        self.values = tuple(unique_values)
+        self._value_messages = {}
+
+    def value_messages(self, compact_values):
+        """Return the value messages of the values of the schema, encoded according to `compact_values`."""
+        messages = self._value_messages.get(compact_values)
+        if messages is None:
+            messages = []
+            for v in self.values:
+                val = vector_tile.tile.value()
+                encode_value(val, v, compact_values)
+                messages.append(val)
+            messages = self._value_messages[compact_values] = tuple(messages)
+        return messages
+
+    def __repr__(self):
+        return f"LayerSchema(keys={list(self.keys)!r}, values={list(self.values)!r})"
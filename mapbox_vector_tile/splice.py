@@ -0,0 +1,272 @@
+# The layers of a tile are independent length-delimited fields of the tile message, so they can be listed, dropped,
+# replaced, merged and filtered by splicing the bytes of encoded tiles, without decoding and re-encoding them. The
+# layers are given and returned as serialized `Layer` messages, like the ones returned by `get_layer`.
+
+from mapbox_vector_tile.decoder import TileData
+from mapbox_vector_tile.Mapbox import vector_tile_pb2 as vector_tile
+
+# Number of the field of the layers in the tile message, and of the name in the layer message.
+TILE_LAYERS_FIELD = 3
+LAYER_NAME_FIELD = 1
+
+# Protobuf wire types
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH_DELIMITED = 2
+WIRE_FIXED32 = 5
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("Invalid tile: truncated varint.")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 64:
+            raise ValueError("Invalid tile: varint too long.")
+
+
+def _encode_varint(value):
+    data = bytearray()
+    while value > 0x7F:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def _iter_fields(data):
+    """Yield the (field number, wire type, start of the field, start of the value, end of the field) of each field of
+    the serialized message `data`. The value of a length-delimited field starts after its length."""
+    pos = 0
+    while pos < len(data):
+        start = pos
+        key, pos = _read_varint(data, pos)
+        field_number, wire_type = key >> 3, key & 0x7
+        if wire_type == WIRE_VARINT:
+            _, end = _read_varint(data, pos)
+        elif wire_type == WIRE_FIXED64:
+            end = pos + 8
+        elif wire_type == WIRE_LENGTH_DELIMITED:
+            length, pos = _read_varint(data, pos)
+            end = pos + length
+        elif wire_type == WIRE_FIXED32:
+            end = pos + 4
+        else:
+            raise ValueError(f"Invalid tile: unsupported wire type {wire_type}.")
+        if end > len(data):
+            raise ValueError("Invalid tile: truncated field.")
+        yield field_number, wire_type, start, pos, end
+        pos = end
+
+
+def _layer_name(layer):
+    for field_number, wire_type, _, value_start, end in _iter_fields(layer):
+        if field_number == LAYER_NAME_FIELD and wire_type == WIRE_LENGTH_DELIMITED:
+            return bytes(layer[value_start:end]).decode("utf-8")
+    raise ValueError("Invalid layer: the layer has no name.")
+
+
+def _split_tile(tile_bytes):
+    """Return the (layer name, serialized layer) of each layer of the tile, and the other fields of the tile."""
+    data = memoryview(tile_bytes).cast("B")
+    layers = []
+    others = []
+    for field_number, wire_type, start, value_start, end in _iter_fields(data):
+        if field_number == TILE_LAYERS_FIELD and wire_type == WIRE_LENGTH_DELIMITED:
+            layer = data[value_start:end]
+            layers.append((_layer_name(layer), bytes(layer)))
+        else:
+            others.append(bytes(data[start:end]))
+    return layers, b"".join(others)
+
+
+def _join_tile(layers, others=b""):
+    key = _encode_varint(TILE_LAYERS_FIELD << 3 | WIRE_LENGTH_DELIMITED)
+    seen_layer_names = set()
+    parts = []
+    for name, layer in layers:
+        if name in seen_layer_names:
+            raise ValueError(f"The layer name {name!r} already exists in the vector tile.")
+        seen_layer_names.add(name)
+        parts.extend((key, _encode_varint(len(layer)), layer))
+    parts.append(others)
+    return b"".join(parts)
+
+
+def list_layers(tile_bytes):
+    """Return the names of the layers of the encoded tile, in order."""
+    return [name for name, _ in _split_tile(tile_bytes)[0]]
+
+
+def get_layer(tile_bytes, name):
+    """Return the serialized `Layer` message of the layer `name` of the encoded tile, or None."""
+    for layer_name, layer in _split_tile(tile_bytes)[0]:
+        if layer_name == name:
+            return layer
+    return None
+
+
+def drop_layers(tile_bytes, names):
+    """Return the encoded tile without the layers whose name is in `names`."""
+    names = {names} if isinstance(names, str) else set(names)
+    layers, others = _split_tile(tile_bytes)
+    return _join_tile([(name, layer) for name, layer in layers if name not in names], others)
+
+
+def add_layer(tile_bytes, layer_bytes):
+    """Return the encoded tile with the serialized `Layer` message `layer_bytes` appended to its layers.
+
+    Raises a ValueError if the tile already has a layer with the same name.
+    """
+    layers, others = _split_tile(tile_bytes)
+    layer_bytes = bytes(layer_bytes)
+    layers.append((_layer_name(layer_bytes), layer_bytes))
+    return _join_tile(layers, others)
+
+
+def replace_layer(tile_bytes, name, layer_bytes):
+    """Return the encoded tile with its layer `name` replaced, in place, with the serialized `Layer` message
+    `layer_bytes`. The layer is appended when the tile has no layer `name`.
+
+    Raises a ValueError if the new layer is renamed to the name of another layer of the tile.
+    """
+    layers, others = _split_tile(tile_bytes)
+    layer_bytes = bytes(layer_bytes)
+    new_layer = (_layer_name(layer_bytes), layer_bytes)
+    names = [layer_name for layer_name, _ in layers]
+    if name in names:
+        layers[names.index(name)] = new_layer
+    else:
+        layers.append(new_layer)
+    return _join_tile(layers, others)
+
+
+def merge_tiles(tiles):
+    """Return the encoded tile with the layers of all the encoded `tiles`, in order.
+
+    Raises a ValueError if several tiles have a layer with the same name.
+    """
+    layers = []
+    others = []
+    for tile_bytes in tiles:
+        tile_layers, tile_others = _split_tile(tile_bytes)
+        layers.extend(tile_layers)
+        others.append(tile_others)
+    return _join_tile(layers, b"".join(others))
+
+
+def filter_tile(tile_bytes, layers=None, keep_keys=None, drop_keys=None, feature_predicate=None):
+    """Return the encoded tile with a subset of its layers, features and properties, without decoding the geometries.
+
+    The layers which are kept as is are copied without being parsed. In the other layers, the tags of the features are
+    rewritten and the key and value tables are rebuilt with only the keys and values still used.
+
+    Args:
+        tile_bytes:
+            The encoded tile.
+
+        layers:
+            The names of the layers to keep. Default to `None`, keeping all the layers.
+
+        keep_keys:
+            The property keys to keep. Default to `None`, keeping all the keys.
+
+        drop_keys:
+            The property keys to drop. Default to `None`, dropping none of the keys.
+
+        feature_predicate:
+            A function called with the name of the layer and a feature dictionary with the `id`, `type` and
+            `properties` of the feature, and returning whether the feature is kept. Default to `None`, keeping all the
+            features.
+
+    Returns:
+        The filtered encoded tile.
+    """
+    if isinstance(layers, str):
+        layers = [layers]
+    layers = None if layers is None else set(layers)
+    keep_keys = None if keep_keys is None else set(keep_keys)
+    drop_keys = None if drop_keys is None else set(drop_keys)
+
+    def keep_key(key):
+        return (keep_keys is None or key in keep_keys) and (drop_keys is None or key not in drop_keys)
+
+    filter_keys = keep_keys is not None or drop_keys is not None
+    tile_layers, others = _split_tile(tile_bytes)
+    filtered = []
+    for name, layer_bytes in tile_layers:
+        if layers is not None and name not in layers:
+            continue
+        if not filter_keys and feature_predicate is None:
+            filtered.append((name, layer_bytes))
+            continue
+
+        layer = vector_tile.tile.layer.FromString(layer_bytes)
+        if feature_predicate is not None:
+            dropped = [
+                i for i, feature in enumerate(layer.features) if not feature_predicate(name, _feature(layer, feature))
+            ]
+            for i in reversed(dropped):
+                del layer.features[i]
+        prune_tables(layer, keep_key if filter_keys else None)
+        filtered.append((name, layer.SerializeToString()))
+    return _join_tile(filtered, others)
+
+
+def _feature(layer, feature):
+    """Return the feature dictionary, without geometry, given to the feature predicates of `filter_tile`."""
+    tags = feature.tags
+    properties = {
+        layer.keys[key_idx]: TileData.parse_value(layer.values[val_idx])
+        for key_idx, val_idx in zip(tags[::2], tags[1::2])
+    }
+    return {"id": feature.id, "type": feature.type, "properties": properties}
+
+
+def prune_tables(layer, keep_key=None):
+    """Rebuild the key and value tables of the parsed `layer` message with only the keys and values referenced by the
+    tags of its features, in their order of first use, and remap the tags. The tags whose key is rejected by the
+    optional `keep_key` predicate are removed."""
+    keys = layer.keys
+    values = layer.values
+    new_keys_idx = {}
+    new_values_idx = {}
+    new_keys = []
+    new_values = []
+    for feature in layer.features:
+        tags = feature.tags
+        new_tags = []
+        for key_idx, val_idx in zip(tags[::2], tags[1::2]):
+            new_key_idx = new_keys_idx.get(key_idx)
+            if new_key_idx is None:
+                if keep_key is not None and not keep_key(keys[key_idx]):
+                    new_key_idx = -1
+                else:
+                    new_key_idx = len(new_keys)
+                    new_keys.append(keys[key_idx])
+                new_keys_idx[key_idx] = new_key_idx
+            if new_key_idx < 0:
+                continue
+
+            new_val_idx = new_values_idx.get(val_idx)
+            if new_val_idx is None:
+                new_val_idx = new_values_idx[val_idx] = len(new_values)
+                value = vector_tile.tile.value()
+                value.CopyFrom(values[val_idx])
+                new_values.append(value)
+            new_tags.append(new_key_idx)
+            new_tags.append(new_val_idx)
+        del tags[:]
+        tags.extend(new_tags)
+
+    del layer.keys[:]
+    layer.keys.extend(new_keys)
+    del layer.values[:]
+    layer.values.extend(new_values)
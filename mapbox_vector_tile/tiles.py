@@ -0,0 +1,183 @@
+import numpy
+import shapely
+
+# Half the size of the square Web Mercator (EPSG:3857) world, in meters.
+MERCATOR_HALF_SIZE = 20037508.342789244
+# Latitude of the north and south edges of the Web Mercator world.
+MERCATOR_MAX_LATITUDE = 85.0511287798066
+
+
+def lonlat_to_mercator(geometries):
+    """Return the geometries, or the array of geometries, with their longitude and latitude coordinates projected to
+    Web Mercator. The latitudes are clamped to the edges of the Web Mercator world."""
+
+    def project(coords):
+        lon = coords[:, 0]
+        lat = numpy.clip(coords[:, 1], -MERCATOR_MAX_LATITUDE, MERCATOR_MAX_LATITUDE)
+        x = lon * MERCATOR_HALF_SIZE / 180.0
+        y = numpy.log(numpy.tan((90.0 + lat) * numpy.pi / 360.0)) * MERCATOR_HALF_SIZE / numpy.pi
+        return numpy.column_stack((x, y))
+
+    return shapely.transform(geometries, project)
+
+
+def tile_size(zoom):
+    """Return the size of the tiles of the zoom level, in Web Mercator meters."""
+    return 2.0 * MERCATOR_HALF_SIZE / (1 << zoom)
+
+
+def tile_bounds(z, x, y):
+    """Return the (minx, miny, maxx, maxy) Web Mercator bounds of the XYZ tile (`z`, `x`, `y`), with the tile rows
+    counted from the north. These bounds are the `quantize_bounds` encoding option of the tile."""
+    size = tile_size(z)
+    minx = -MERCATOR_HALF_SIZE + x * size
+    maxy = MERCATOR_HALF_SIZE - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def _tile_ranges(bounds, zoom):
+    """Return the (xmin, ymin, xmax, ymax) inclusive ranges of the columns and rows of the tiles of the zoom level
+    intersecting each of the (n, 4) array of Web Mercator `bounds`, clamped to the world."""
+    bounds = numpy.asarray(bounds, dtype=float).reshape(-1, 4)
+    size = tile_size(zoom)
+    last = (1 << zoom) - 1
+    xmin = numpy.floor((bounds[:, 0] + MERCATOR_HALF_SIZE) / size)
+    xmax = numpy.floor((bounds[:, 2] + MERCATOR_HALF_SIZE) / size)
+    # the rows are counted from the north
+    ymin = numpy.floor((MERCATOR_HALF_SIZE - bounds[:, 3]) / size)
+    ymax = numpy.floor((MERCATOR_HALF_SIZE - bounds[:, 1]) / size)
+    return tuple(numpy.clip(v, 0, last).astype(numpy.int64) for v in (xmin, ymin, xmax, ymax))
+
+
+def _bbox_cover(bounds, zoom):
+    """Return the (index, x, y) arrays of the tiles of the zoom level intersecting the bounding box of each of the (n,
+    4) array of Web Mercator `bounds`. The rows of empty bounds, whose coordinates are NaN, are skipped."""
+    bounds = numpy.asarray(bounds, dtype=float).reshape(-1, 4)
+    indices = numpy.flatnonzero(~numpy.isnan(bounds).any(axis=1))
+    xmin, ymin, xmax, ymax = _tile_ranges(bounds[indices], zoom)
+    widths = xmax - xmin + 1
+    counts = widths * (ymax - ymin + 1)
+    rows = numpy.repeat(numpy.arange(len(indices)), counts)
+    # position of each tile in the range of its bounds
+    offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    x = xmin[rows] + offsets % widths[rows]
+    y = ymin[rows] + offsets // widths[rows]
+    return indices[rows], x, y
+
+
+def _tile_units(coords, zoom):
+    """Return the (n, 2) array of Web Mercator `coords` in tile units of the zoom level, with the rows counted from
+    the north and the coordinates clamped to the world."""
+    size = tile_size(zoom)
+    u = (coords[:, 0] + MERCATOR_HALF_SIZE) / size
+    v = (MERCATOR_HALF_SIZE - coords[:, 1]) / size
+    return numpy.clip(numpy.column_stack((u, v)), 0, 1 << zoom)
+
+
+def _segments(lines, zoom):
+    """Return the line indices and the (n, 4) array of the (u0, v0, u1, v1) segments in tile units of the lines."""
+    coords, indices = shapely.get_coordinates(lines, return_index=True)
+    coords = _tile_units(coords, zoom)
+    same_line = indices[1:] == indices[:-1]
+    return indices[1:][same_line], numpy.column_stack((coords[:-1][same_line], coords[1:][same_line]))
+
+
+def _line_cover(indices, segments, zoom):
+    """Return the (index, x, y) arrays of the tiles crossed by the segments, by walking the tile grid: the tiles are
+    the ones of the midpoints between the consecutive crossings of the grid lines along each segment."""
+    u0, v0, u1, v1 = segments.T
+    all_segments = numpy.arange(len(segments))
+    # the ends of the segments, then their crossings of the vertical and horizontal grid lines
+    ids = [all_segments, all_segments]
+    ts = [numpy.zeros(len(segments)), numpy.ones(len(segments))]
+    for start, end in ((u0, u1), (v0, v1)):
+        low = numpy.floor(numpy.minimum(start, end))
+        counts = (numpy.ceil(numpy.maximum(start, end)) - low - 1).clip(0).astype(numpy.int64)
+        segment_ids = numpy.repeat(all_segments, counts)
+        lines = low[segment_ids] + 1 + numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        ids.append(segment_ids)
+        ts.append((lines - start[segment_ids]) / (end - start)[segment_ids])
+    segment_ids, t = numpy.concatenate(ids), numpy.concatenate(ts)
+    order = numpy.lexsort((t, segment_ids))
+    segment_ids, t = segment_ids[order], t[order]
+    # midpoints of the consecutive crossings, and the end points for the degenerate segments
+    pairs = segment_ids[1:] == segment_ids[:-1]
+    segment_ids = segment_ids[1:][pairs]
+    t = (t[1:][pairs] + t[:-1][pairs]) / 2
+    last = (1 << zoom) - 1
+    x = numpy.floor(u0[segment_ids] + t * (u1 - u0)[segment_ids]).clip(0, last).astype(numpy.int64)
+    y = numpy.floor(v0[segment_ids] + t * (v1 - v0)[segment_ids]).clip(0, last).astype(numpy.int64)
+    return indices[segment_ids], x, y
+
+
+def _fill_cover(indices, segments):
+    """Return the (index, x, y) arrays of the tiles whose centers are inside the polygons whose ring segments are
+    given, by even-odd scanlines through the centers of the tile rows."""
+    u0, v0, u1, v1 = segments.T
+    low = numpy.ceil(numpy.minimum(v0, v1) - 0.5)
+    counts = (numpy.ceil(numpy.maximum(v0, v1) - 0.5) - low).clip(0).astype(numpy.int64)
+    segment_ids = numpy.repeat(numpy.arange(len(segments)), counts)
+    rows = low[segment_ids] + numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    centers = rows + 0.5
+    crossings = u0[segment_ids] + (centers - v0[segment_ids]) / (v1 - v0)[segment_ids] * (u1 - u0)[segment_ids]
+    index = indices[segment_ids]
+    order = numpy.lexsort((crossings, rows, index))
+    index, rows, crossings = index[order], rows[order], crossings[order]
+    # the crossings of a row of a polygon come in pairs enclosing its inside
+    starts, ends = slice(0, None, 2), slice(1, None, 2)
+    index, rows = index[starts], rows[starts]
+    first = numpy.ceil(crossings[starts] - 0.5)
+    counts = (numpy.floor(crossings[ends] - 0.5) - first + 1).clip(0).astype(numpy.int64)
+    spans = numpy.repeat(numpy.arange(len(first)), counts)
+    x = first[spans] + numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    return index[spans], x.astype(numpy.int64), rows[spans].astype(numpy.int64)
+
+
+def tile_cover(geometries, zoom, exact=False):
+    """
+    Return the (n, 3) array of the (feature index, x, y) rows of the XYZ tiles of the zoom level covered by each of the
+    Web Mercator `geometries`, ordered by feature index, row and column. The tiles are the ones of `tile_bounds`, whose
+    bounds are the `quantize_bounds` of the encoded tiles, half open on their eastern and southern edges.
+
+    By default, the tiles are the ones intersecting the bounding box of each geometry, which is fast but
+    overestimates the cover of long diagonal lines and sparse multi geometries. With `exact`, the lines and the
+    boundaries of the polygons are rasterized onto the tile grid, and the tiles inside the polygons are filled by
+    scanlines, which gives the tiles actually intersecting the geometries.
+    """
+    geometries = numpy.asarray(geometries, dtype=object).reshape(-1)
+    if not exact:
+        indices, x, y = _bbox_cover(shapely.bounds(geometries), zoom)
+        return numpy.column_stack((indices, x, y)).astype(numpy.int64).reshape(-1, 3)
+
+    parts, part_indices = shapely.get_parts(geometries, return_index=True)
+    non_empty = ~shapely.is_empty(parts)
+    parts, part_indices = parts[non_empty], part_indices[non_empty]
+    type_ids = shapely.get_type_id(parts)
+    covers = []
+
+    points = type_ids == shapely.GeometryType.POINT
+    coords = _tile_units(shapely.get_coordinates(parts[points]), zoom)
+    last = (1 << zoom) - 1
+    covers.append((part_indices[points], *numpy.floor(coords).clip(0, last).astype(numpy.int64).T))
+
+    lines = numpy.isin(type_ids, (shapely.GeometryType.LINESTRING, shapely.GeometryType.LINEARRING))
+    index, x, y = _line_cover(*_segments(parts[lines], zoom), zoom)
+    covers.append((part_indices[lines][index], x, y))
+
+    polygons = type_ids == shapely.GeometryType.POLYGON
+    rings, ring_polygons = shapely.get_rings(parts[polygons], return_index=True)
+    segment_rings, segments = _segments(rings, zoom)
+    # the scanlines cross the rings of each polygon
+    segment_polygons = ring_polygons[segment_rings]
+    for index, x, y in (_line_cover(segment_polygons, segments, zoom), _fill_cover(segment_polygons, segments)):
+        covers.append((part_indices[polygons][index], x, y))
+
+    index, x, y = (numpy.concatenate(values).astype(numpy.int64) for values in zip(*covers))
+    # a single sort of the rows and columns packed together is much faster than numpy.unique along an axis
+    cells = (y << zoom) | x
+    order = numpy.lexsort((cells, index))
+    index, cells = index[order], cells[order]
+    first = numpy.ones(len(index), dtype=bool)
+    first[1:] = (index[1:] != index[:-1]) | (cells[1:] != cells[:-1])
+    index, cells = index[first], cells[first]
+    return numpy.column_stack((index, cells & last, cells >> zoom))
@@ -1,3 +1,10 @@
+import re
+from collections.abc import Mapping
+
+import shapely
+
+from mapbox_vector_tile.schema import LayerSchema
+
 #
 # Geometry manipulation
 #
@@ -32,6 +39,54 @@ def zig_zag_decode(n):
     return (n >> 1) ^ (-(n & 1))
 
 
+#
+# Space filling curves
+#
+def zorder_index(x, y, order):
+    """Return the position of the cell (`x`, `y`) along the Z-order (Morton) curve of a 2^`order` sized grid."""
+    d = 0
+    for i in range(order):
+        d |= ((x >> i) & 1) << (2 * i) | ((y >> i) & 1) << (2 * i + 1)
+    return d
+
+
+def hilbert_index(x, y, order):
+    """Return the position of the cell (`x`, `y`) along the Hilbert curve of a 2^`order` sized grid."""
+    n = 1 << order
+    d = 0
+    s = n >> 1
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant so that the curve is continuous
+        if ry == 0:
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return d
+
+
+FEATURE_ORDER_CURVES = {"hilbert": hilbert_index, "zorder": zorder_index}
+
+
+#
+# Tile buffers
+#
+def tile_buffer(data):
+    """Return the encoded tile `data`, given as any object supporting the buffer protocol, such as `bytes`, a
+    `memoryview`, a `mmap` or an `array`, in a form the protobuf parser accepts without copying it."""
+    if isinstance(data, (bytes, bytearray)):
+        return data
+    view = memoryview(data)
+    if view.format != "B" or view.ndim != 1:
+        # the parser reads the raw bytes of the unsigned bytes views only
+        view = view.cast("B")
+    return view
+
+
 #
 # Options management
 #
@@ -44,6 +99,14 @@ DEFAULT_ENCODE_OPTIONS = {
     "on_invalid_geometry": None,
     "check_winding_order": True,
     "max_geometry_validate_tries": 5,
+    "compact_values": False,
+    "feature_order": None,
+    "make_valid_engine": None,
+    "repair_time_budget": None,
+    "repair_max_vertices": None,
+    "repair_fallback": "convex_hull",
+    "schema": None,
+    "geometry_cache": None,
 }
 
 DEFAULT_DECODE_OPTIONS = {"y_coord_down": False, "transformer": None, "geojson": True}
@@ -89,8 +152,111 @@ def _get_options(layer_options, default_options, global_default_options, operati
     return result
 
 
+class _Options(Mapping):
+    """Base class of the immutable options objects.
+
+    The options are validated once, when the object is created, so that the same object can be reused for many tiles,
+    and they are read as attributes in the hot loops. The objects are also read-only mappings, so that they can be used
+    wherever an options dictionary is expected.
+    """
+
+    __slots__ = ()
+    _defaults = {}
+    _operation_name = ""
+
+    def __init__(self, **options):
+        extra_keys = set(options).difference(self._defaults)
+        if extra_keys:
+            extra_keys_msg = ", ".join(f"{str(x)!r}" for x in sorted(extra_keys))
+            raise ValueError(
+                f"The following options are not allowed for {self._operation_name} a tile: {extra_keys_msg}."
+            )
+        for name, default in self._defaults.items():
+            object.__setattr__(self, name, options.get(name, default))
+        self._validate()
+
+    def _validate(self):
+        pass
+
+    def replace(self, **changes):
+        """Return a copy of the options with the given options changed."""
+        return type(self)(**{**self, **changes})
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} objects are immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} objects are immutable.")
+
+    def __reduce__(self):
+        return _make_options, (type(self), dict(self))
+
+    def __getitem__(self, key):
+        if key not in self._defaults:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self._defaults)
+
+    def __len__(self):
+        return len(self._defaults)
+
+    def __repr__(self):
+        options = ", ".join(f"{name}={value!r}" for name, value in self.items())
+        return f"{type(self).__name__}({options})"
+
+
+def _shapely_version():
+    return tuple(int(part) for part in re.match(r"(\d+)\.(\d+)", shapely.__version__).groups())
+
+
+def _make_options(cls, options):
+    return cls(**options)
+
+
+class EncodeOptions(_Options):
+    """The validated options of the encoding of a layer, see `encode` for their description."""
+
+    __slots__ = tuple(DEFAULT_ENCODE_OPTIONS)
+    _defaults = DEFAULT_ENCODE_OPTIONS
+    _operation_name = "encoding"
+
+    def _validate(self):
+        if self.extents <= 0:
+            raise ValueError(f"The extents must be positive. {self.extents} provided.")
+        if self.max_geometry_validate_tries <= 0:
+            raise ValueError(
+                f"The max_geometry_validate_tries must be positive. {self.max_geometry_validate_tries} provided."
+            )
+        if self.feature_order is not None and self.feature_order not in FEATURE_ORDER_CURVES:
+            raise ValueError(f"The feature_order must be None, 'hilbert' or 'zorder'. {self.feature_order!r} provided.")
+        if self.make_valid_engine is not None and self.make_valid_engine != "geos":
+            raise ValueError(f"The make_valid_engine must be None or 'geos'. {self.make_valid_engine!r} provided.")
+        if self.make_valid_engine == "geos" and _shapely_version() < (2, 1):
+            # the "structure" method of `shapely.make_valid` was added in Shapely 2.1
+            raise ValueError(
+                f"The 'geos' make_valid_engine requires Shapely 2.1 or newer. Shapely {shapely.__version__} installed."
+            )
+        if self.repair_fallback not in ("convex_hull", "buffer", "simplify", "drop"):
+            raise ValueError(
+                "The repair_fallback must be 'convex_hull', 'buffer', 'simplify' or 'drop'. "
+                f"{self.repair_fallback!r} provided."
+            )
+        if self.schema is not None and not isinstance(self.schema, LayerSchema):
+            raise ValueError(f"The schema must be None or a LayerSchema. {self.schema!r} provided.")
+
+
+class DecodeOptions(_Options):
+    """The validated options of the decoding of a layer, see `decode` for their description."""
+
+    __slots__ = tuple(DEFAULT_DECODE_OPTIONS)
+    _defaults = DEFAULT_DECODE_OPTIONS
+    _operation_name = "decoding"
+
+
 def get_encode_options(layer_options, default_options):
-    """Get the entire encoding options dictionary filled using: first, the provided `layer_options`, then the provided
+    """Get the entire encoding options filled using: first, the provided `layer_options`, then the provided
     `default_options` and finally filled using the global default options
 
     Args:
@@ -101,28 +267,25 @@ def get_encode_options(layer_options, default_options):
             The default options of the encoding operation.
 
     Returns:
-        The options to use for encoding the layer.
+        The `EncodeOptions` to use for encoding the layer. An `EncodeOptions` given as `layer_options`, or as
+        `default_options` without `layer_options`, is returned as is.
     """
+    if isinstance(layer_options, EncodeOptions):
+        return layer_options
+    if layer_options is None and isinstance(default_options, EncodeOptions):
+        return default_options
+
     result = _get_options(
         layer_options=layer_options,
         default_options=default_options,
         global_default_options=DEFAULT_ENCODE_OPTIONS,
         operation_name="encoding",
     )
-
-    # Checks on final values
-    extents = result["extents"]
-    max_geometry_validate_tries = result["max_geometry_validate_tries"]
-    if extents <= 0:
-        raise ValueError(f"The extents must be positive. {extents} provided.")
-    if max_geometry_validate_tries <= 0:
-        raise ValueError(f"The max_geometry_validate_tries must be positive. {max_geometry_validate_tries} provided.")
-
-    return result
+    return EncodeOptions(**result)
 
 
 def get_decode_options(layer_options, default_options):
-    """Get the entire decoding options dictionary filled using: first, the provided `layer_options`, then the provided
+    """Get the entire decoding options filled using: first, the provided `layer_options`, then the provided
     `default_options` and finally filled using the global default options
 
     Args:
@@ -133,11 +296,18 @@ def get_decode_options(layer_options, default_options):
             The default options of the decoding operation.
 
     Returns:
-        The options to use for decoding the layer.
+        The `DecodeOptions` to use for decoding the layer. A `DecodeOptions` given as `layer_options`, or as
+        `default_options` without `layer_options`, is returned as is.
     """
-    return _get_options(
+    if isinstance(layer_options, DecodeOptions):
+        return layer_options
+    if layer_options is None and isinstance(default_options, DecodeOptions):
+        return default_options
+
+    result = _get_options(
         layer_options=layer_options,
         default_options=default_options,
         global_default_options=DEFAULT_DECODE_OPTIONS,
         operation_name="decoding",
     )
+    return DecodeOptions(**result)
@@ -0,0 +1,288 @@
+"""
+Tests for vector_tile/cache.py
+"""
+
+import copy
+import json
+import unittest
+
+from shapely import wkt
+from shapely.geometry import box
+
+from mapbox_vector_tile import decode, encode
+from mapbox_vector_tile.cache import DecodeCache, GeometryCache, LRUCache, RepairCache, TileCache
+from mapbox_vector_tile.columns import FeatureColumns
+from mapbox_vector_tile.encoder import on_invalid_geometry_make_valid
+from mapbox_vector_tile.tiles import tile_bounds
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(1, cache.get("a"))
+        cache.put("c", 3)
+        # "b" is the least recently used entry
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(3, cache.get("c"))
+        self.assertEqual({"hits": 2, "misses": 1, "evictions": 1, "size": 2}, cache.stats)
+
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual({"hits": 0, "misses": 0, "evictions": 0, "size": 0}, cache.stats)
+
+    def test_invalid_maxsize(self):
+        with self.assertRaises(ValueError):
+            LRUCache(maxsize=0)
+        with self.assertRaises(ValueError):
+            LRUCache(max_bytes=0)
+
+    def test_max_bytes(self):
+        cache = TileCache(max_bytes=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"5678")
+        cache.put("a", b"12")
+        self.assertEqual(6, cache.bytes)
+        cache.put("c", b"90123")
+        # "b" is evicted to make room for "c"
+        self.assertEqual(["a", "c"], list(cache._entries))
+        self.assertEqual(7, cache.bytes)
+
+
+class RepairCacheTest(unittest.TestCase):
+    def test_repair_cache(self):
+        calls = []
+
+        def handler(shape):
+            calls.append(shape)
+            return shape.buffer(0) if shape.area > 10 else None
+
+        cache = RepairCache(handler=handler)
+        bowtie = wkt.loads("POLYGON ((0 0, 0 20, 10 10, 20 20, 20 0, 10 10, 0 0))")
+        small_bowtie = wkt.loads("POLYGON ((0 0, 0 2, 1 1, 2 2, 2 0, 1 1, 0 0))")
+        self.assertTrue(cache(bowtie).is_valid)
+        self.assertTrue(cache(wkt.loads(bowtie.wkt)).is_valid)
+        self.assertIsNone(cache(small_bowtie))
+        self.assertIsNone(cache(small_bowtie))
+        self.assertEqual(2, len(calls))
+        self.assertEqual({"hits": 2, "misses": 2, "evictions": 0, "size": 2}, cache.stats)
+
+    def test_shared_across_tiles(self):
+        cache = RepairCache()
+        source = {
+            "name": "layer",
+            "features": [{"geometry": "POLYGON ((10 10, 20 10, 20 20, 15 15, 15 5, 10 10))", "properties": {}}],
+        }
+        tiles = [encode(source, default_options={"on_invalid_geometry": cache}) for _ in range(3)]
+        self.assertEqual(1, cache.misses)
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(tiles[0], tiles[2])
+        self.assertEqual(1, len(decode(tiles[0])["layer"]["features"]))
+
+
+class TileCacheTest(unittest.TestCase):
+    def ocean(self, z, x, y, kind="ocean"):
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        margin = (maxx - minx) / 64
+        return {
+            "name": "water",
+            "features": [
+                {
+                    "geometry": box(minx - margin, miny - margin, maxx + margin, maxy + margin),
+                    "properties": {"kind": kind},
+                }
+            ],
+        }
+
+    def encode(self, layers, z, x, y, **kwargs):
+        return encode(layers, default_options={"quantize_bounds": tile_bounds(z, x, y)}, **kwargs)
+
+    def test_identical_tiles(self):
+        cache = TileCache()
+        tiles = [self.encode(self.ocean(6, x, 20), 6, x, 20, cache=cache) for x in range(10)]
+        self.assertEqual([self.encode(self.ocean(6, x, 20), 6, x, 20) for x in range(10)], tiles)
+        self.assertEqual(
+            {"hits": 9, "misses": 1, "evictions": 0, "size": 1, "bytes": len(tiles[0]), "hit_rate": 0.9}, cache.stats
+        )
+
+    def test_different_tiles(self):
+        cache = TileCache()
+        self.encode(self.ocean(6, 0, 20), 6, 0, 20, cache=cache)
+        self.assertEqual(
+            self.encode(self.ocean(6, 1, 20, kind="lake"), 6, 1, 20),
+            self.encode(self.ocean(6, 1, 20, kind="lake"), 6, 1, 20, cache=cache),
+        )
+        self.encode(self.ocean(6, 1, 20), 6, 1, 20, cache=cache, per_layer_options={"water": {"extents": 512}})
+        # the tile is only partly covered by the polygon
+        layers = self.ocean(6, 0, 20)
+        self.encode(layers, 6, 1, 20, cache=cache)
+        self.assertEqual(0, cache.hits)
+        self.assertEqual(4, len(cache))
+
+    def test_feature_sources(self):
+        cache = TileCache()
+        layer = self.ocean(6, 0, 20)
+        expected = self.encode(layer, 6, 0, 20, cache=cache)
+        generator = {"name": "water", "features": (feature for feature in layer["features"])}
+        self.assertEqual(expected, self.encode(generator, 6, 0, 20, cache=cache))
+        self.assertEqual(1, cache.hits)
+
+        geometries = [feature["geometry"] for feature in layer["features"]]
+        columns = {"name": "water", "features": FeatureColumns(geometries, {"kind": ["ocean"]})}
+        self.assertEqual(expected, self.encode(columns, 6, 0, 20, cache=cache))
+        self.assertEqual(expected, self.encode(columns, 6, 0, 20, cache=cache))
+        self.assertEqual(2, cache.hits)
+
+    def test_function_options(self):
+        cache = TileCache()
+        layer = {"name": "layer", "features": [{"geometry": "POINT (10 10)", "properties": {}}]}
+        # the lambdas of the previous iterations are freed, and their id may be reused
+        for k in (1, 2, 3):
+            tile = encode(
+                layer, default_options={"transformer": lambda x, y, k=k: (x * float(k), y * float(k))}, cache=cache
+            )
+            self.assertEqual([10 * k, 10 * k], decode(tile)["layer"]["features"][0]["geometry"]["coordinates"])
+        self.assertEqual(0, cache.hits)
+
+    def test_geometry_formats(self):
+        cache = TileCache()
+        geometry = box(0, 0, 10, 10)
+        # the geometries are loaded like `encode` does, including the hexadecimal WKB strings
+        for geometry_spec in (geometry, geometry.wkt, geometry.wkb, geometry.wkb_hex):
+            layer = {"name": "layer", "features": [{"geometry": geometry_spec, "properties": {}}]}
+            self.assertEqual(encode(layer), encode(layer, cache=cache))
+        self.assertEqual({"hits": 3, "misses": 1}, {"hits": cache.hits, "misses": cache.misses})
+
+
+class GeometryCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.layers = [
+            {
+                "name": "layer",
+                "features": [
+                    {"geometry": "POLYGON ((0 0, 0 10, 10 10, 10 0, 0 0))", "properties": {"kind": "square"}},
+                    # an invalid polygon, repaired once
+                    {"geometry": "POLYGON ((0 0, 0 20, 10 10, 20 20, 20 0, 10 10, 0 0))", "properties": {}},
+                    {"geometry": "LINESTRING (0 0, 1 1, 5 8)"},
+                    {"geometry": "POINT (3.6 4.4)", "id": 3},
+                ],
+            }
+        ]
+        self.options = {"quantize_bounds": (0, 0, 40, 40), "on_invalid_geometry": on_invalid_geometry_make_valid}
+
+    def test_same_tiles(self):
+        cache = GeometryCache()
+        options = {**self.options, "geometry_cache": cache}
+        expected = encode(self.layers, default_options=self.options)
+        self.assertEqual(expected, encode(self.layers, default_options=options))
+        self.assertEqual(expected, encode(self.layers, default_options=options))
+        self.assertEqual(expected, encode(self.layers, default_options=options, threads=2))
+        self.assertEqual({"hits": 8, "misses": 4, "evictions": 0, "size": 4}, cache.stats)
+
+    def test_prepared_items(self):
+        from mapbox_vector_tile.encoder import VectorTile
+
+        cache = GeometryCache()
+        features = self.layers[0]["features"]
+        tile = VectorTile(default_options={**self.options, "geometry_cache": cache})
+        layer_encoder = tile.create_layer_encoder("layer")
+        prepared = layer_encoder.prepare_features(features)
+        # the keys are carried by the prepared items, and the geometries are only cached once written
+        self.assertEqual([None] * 4, [cached_geometry for _, _, _, cached_geometry in prepared])
+        self.assertEqual(4, len({key for _, _, key, _ in prepared}))
+        self.assertEqual(0, len(cache))
+        layer_encoder.add_prepared(prepared)
+        self.assertEqual(4, len(cache))
+
+        prepared = tile.create_layer_encoder("other").prepare_features(features)
+        self.assertEqual([None] * 4, [key for _, _, key, _ in prepared])
+        self.assertEqual(
+            [feature.type for feature in tile.tile.layers[0].features],
+            [cached_geometry[0] for _, _, _, cached_geometry in prepared],
+        )
+
+    def test_geometry_options(self):
+        cache = GeometryCache()
+        encode(self.layers, default_options={**self.options, "geometry_cache": cache})
+        for options in ({"y_coord_down": True}, {"extents": 512}, {"quantize_bounds": [0, 0, 20, 20]}):
+            self.assertEqual(
+                encode(self.layers, default_options={**self.options, **options}),
+                encode(self.layers, default_options={**self.options, **options, "geometry_cache": cache}),
+            )
+        self.assertEqual(0, cache.hits)
+
+    def test_max_bytes(self):
+        cache = GeometryCache(max_bytes=700)
+        encode(self.layers, default_options={**self.options, "geometry_cache": cache})
+        self.assertEqual(2, len(cache))
+        self.assertEqual(2, cache.evictions)
+        self.assertLessEqual(cache.bytes, 700)
+
+
+class DecodeCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tile = encode(
+            {
+                "name": "layer",
+                "features": [
+                    {"geometry": "LINESTRING (0 0, 10 10)", "properties": {"kind": "road", "lanes": 2}, "id": 1},
+                    {"geometry": "POINT (3 4)", "properties": {"kind": "poi"}, "id": 2},
+                ],
+            }
+        )
+
+    def test_function_options(self):
+        cache = DecodeCache()
+        # the lambdas of the previous iterations are freed, and their id may be reused
+        for k in (1, 2, 3):
+            layers = decode(self.tile, default_options={"transformer": lambda x, y, k=k: (x * k, y * k)}, cache=cache)
+            self.assertEqual([3 * k, 4 * k], layers["layer"]["features"][1]["geometry"]["coordinates"])
+        for k in (1, 2, 3):
+            layers = decode(self.tile, {"layer": {"transformer": lambda x, y, k=k: (x * k, y * k)}}, cache=cache)
+            self.assertEqual([3 * k, 4 * k], layers["layer"]["features"][1]["geometry"]["coordinates"])
+        self.assertEqual(0, cache.hits)
+
+    def test_hits(self):
+        cache = DecodeCache()
+        expected = decode(self.tile)
+        self.assertEqual(expected, decode(self.tile, cache=cache))
+        self.assertIs(decode(self.tile, cache=cache), decode(memoryview(self.tile), cache=cache))
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(1, cache.misses)
+        self.assertGreater(cache.bytes, len(self.tile))
+        self.assertEqual(json.dumps(expected), json.dumps(decode(self.tile, cache=cache)))
+
+        # the options are part of the key
+        self.assertEqual(
+            decode(self.tile, default_options={"y_coord_down": True}),
+            decode(self.tile, default_options={"y_coord_down": True}, cache=cache),
+        )
+        self.assertEqual(
+            decode(self.tile, per_layer_options={"layer": {"geojson": False}}),
+            decode(self.tile, per_layer_options={"layer": {"geojson": False}}, cache=cache),
+        )
+        self.assertEqual(3, cache.misses)
+
+    def test_read_only(self):
+        cache = DecodeCache()
+        decoded = decode(self.tile, cache=cache)
+        feature = decoded["layer"]["features"][0]
+        with self.assertRaises(TypeError):
+            feature["properties"]["kind"] = "path"
+        with self.assertRaises(TypeError):
+            feature["geometry"]["coordinates"].append([20, 20])
+        with self.assertRaises(TypeError):
+            decoded.pop("layer")
+
+        # deep copies are regular objects, which can be modified
+        copied = copy.deepcopy(decoded)
+        copied["layer"]["features"][0]["properties"]["kind"] = "path"
+        copied["layer"]["features"][0]["geometry"]["coordinates"].append([20, 20])
+        self.assertEqual(decode(self.tile), decode(self.tile, cache=cache))
+
+    def test_max_bytes(self):
+        cache = DecodeCache(max_bytes=1)
+        decode(self.tile, cache=cache)
+        self.assertEqual(0, len(cache))
+        self.assertEqual({"hits": 0, "misses": 1, "evictions": 1, "size": 0, "bytes": 0, "hit_rate": 0.0}, cache.stats)
@@ -0,0 +1,92 @@
+"""
+Tests for vector_tile/columns.py
+"""
+
+import unittest
+
+import numpy
+from shapely.geometry import Point
+
+from mapbox_vector_tile import decode, encode
+from mapbox_vector_tile.columns import FeatureColumns
+
+
+class FeatureColumnsTest(unittest.TestCase):
+    def setUp(self):
+        n_rows = 600
+        self.geometries = [Point(i % 100 * 40, i // 100 * 40) for i in range(n_rows)]
+        self.properties = {
+            "kind": numpy.array(["school", "shop", "park"])[numpy.arange(n_rows) % 3],
+            "rank": numpy.arange(n_rows, dtype=numpy.int64) % 7,
+            "height": (numpy.arange(n_rows) % 5).astype(numpy.float32) / 2,
+            "open": numpy.arange(n_rows) % 2 == 0,
+        }
+        self.ids = numpy.arange(1, n_rows + 1, dtype=numpy.uint32)
+
+    def feature_dicts(self):
+        return [
+            {
+                "geometry": geometry,
+                "properties": {key: column[i].item() for key, column in self.properties.items()},
+                "id": int(self.ids[i]),
+            }
+            for i, geometry in enumerate(self.geometries)
+        ]
+
+    def test_same_as_features(self):
+        columns = FeatureColumns(self.geometries, self.properties, ids=self.ids)
+        expected = decode(encode({"name": "pois", "features": self.feature_dicts()}))
+        self.assertEqual(expected, decode(encode({"name": "pois", "features": columns})))
+        self.assertEqual(expected, decode(encode({"name": "pois", "features": columns}, threads=3)))
+
+    def test_compact_values(self):
+        columns = FeatureColumns(self.geometries, self.properties, ids=self.ids)
+        options = {"compact_values": True, "feature_order": "hilbert"}
+        self.assertEqual(
+            decode(encode({"name": "pois", "features": self.feature_dicts()}, default_options=options)),
+            decode(encode({"name": "pois", "features": columns}, default_options=options)),
+        )
+
+    def test_missing_values(self):
+        columns = FeatureColumns(
+            self.geometries[:4],
+            {
+                "name": ["a", None, 1, True],
+                "width": [1.5, float("nan"), 2.0, float("nan")],
+                "tags": [None, None, None, None],
+            },
+        )
+        features = decode(encode({"name": "pois", "features": columns}))["pois"]["features"]
+        self.assertEqual(
+            [{"name": "a", "width": 1.5}, {}, {"name": 1, "width": 2.0}, {"name": True}],
+            [feature["properties"] for feature in features],
+        )
+        # features without ids
+        self.assertEqual([0, 0, 0, 0], [feature["id"] for feature in features])
+
+    def test_max_bytes(self):
+        columns = FeatureColumns(self.geometries, self.properties, ids=self.ids)
+        layer = {"name": "pois", "features": columns}
+        max_bytes = len(encode(layer)) // 3
+        encoded = encode(layer, max_bytes=max_bytes, size_strategy="priority", priority_property="rank")
+        self.assertLessEqual(len(encoded), max_bytes)
+        ranks = {feature["properties"]["rank"] for feature in decode(encoded)["pois"]["features"]}
+        self.assertIn(6, ranks)
+        self.assertNotIn(0, ranks)
+
+    def test_numpy_scalar_properties(self):
+        feature = {
+            "geometry": "POINT (1 2)",
+            "properties": {"int": numpy.int64(3), "float": numpy.float32(0.5), "bool": numpy.bool_(True)},
+        }
+        properties = decode(encode({"name": "pois", "features": [feature]}))["pois"]["features"][0]["properties"]
+        self.assertEqual({"int": 3, "float": 0.5, "bool": True}, properties)
+        self.assertIs(True, properties["bool"])
+
+    def test_invalid_columns(self):
+        with self.assertRaises(ValueError):
+            FeatureColumns(self.geometries, {"kind": ["school"]})
+        with self.assertRaises(ValueError):
+            FeatureColumns(self.geometries, ids=[1, 2])
+        with self.assertRaises(ValueError):
+            FeatureColumns(self.geometries, {1: self.properties["rank"]})
@@ -2,7 +2,11 @@
 Tests for vector_tile/decoder.py
 """
 
+import array
+import mmap
+import tempfile
 import unittest
+from pathlib import Path
 
 import mapbox_vector_tile
 from mapbox_vector_tile.utils import DEFAULT_DECODE_OPTIONS, get_decode_options
@@ -139,8 +143,80 @@ class BaseTestCase(unittest.TestCase):
         )
         self.assertEqual(get_decode_options(layer_options=None, default_options=None), DEFAULT_DECODE_OPTIONS)
 
+    def test_decode_options_object(self):
+        from mapbox_vector_tile.utils import DecodeOptions
+
+        options = DecodeOptions(geojson=False)
+        self.assertEqual({**DEFAULT_DECODE_OPTIONS, "geojson": False}, options)
+        self.assertFalse(options.geojson)
+        self.assertIs(options, get_decode_options(layer_options=None, default_options=options))
+        with self.assertRaises(AttributeError):
+            options.geojson = True
+
+        vector_tile = mapbox_vector_tile.encode(
+            {"name": "layer", "features": [{"geometry": "POINT (1 2)", "properties": {"a": 1}}]}
+        )
+        self.assertEqual(
+            mapbox_vector_tile.decode(vector_tile, default_options={"geojson": False}),
+            mapbox_vector_tile.decode(vector_tile, default_options=options),
+        )
+
     def test_options_error(self):
         expected_result = "The following options are not allowed for decoding a tile: 'opt', 'unknown'."
         with self.assertRaises(ValueError) as ex:
             get_decode_options(layer_options={"geojson": False, "unknown": 23}, default_options={"opt": 42})
         self.assertEqual(str(ex.exception), expected_result)
+
+
+class BufferDecodeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tile = mapbox_vector_tile.encode(
+            {"name": "layer", "features": [{"geometry": "LINESTRING (0 0, 10 20)", "properties": {"a": 1}}]}
+        )
+        self.expected = mapbox_vector_tile.decode(self.tile)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "archive.bin"
+        self.path.write_bytes(b"header" + self.tile + b"trailer")
+
+    def test_buffer_protocol_objects(self):
+        self.assertEqual(mapbox_vector_tile.decode(bytearray(self.tile)), self.expected)
+        self.assertEqual(mapbox_vector_tile.decode(memoryview(b"xx" + self.tile)[2:]), self.expected)
+
+        # the views of other formats are parsed from their raw bytes
+        self.assertEqual(mapbox_vector_tile.decode(array.array("b", self.tile)), self.expected)
+
+        with self.path.open("rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:  # noqa:SIM117
+            with memoryview(mapped)[6 : 6 + len(self.tile)] as tile:
+                self.assertEqual(mapbox_vector_tile.decode(tile), self.expected)
+
+    def test_decode_from_file(self):
+        self.assertEqual(mapbox_vector_tile.decode_from_file(self.path, 6, len(self.tile)), self.expected)
+
+        only_tile = Path(self.path.parent) / "tile.mvt"
+        only_tile.write_bytes(self.tile)
+        self.assertEqual(mapbox_vector_tile.decode_from_file(only_tile), self.expected)
+        self.assertEqual(
+            mapbox_vector_tile.decode_from_file(only_tile, default_options={"geojson": False}),
+            mapbox_vector_tile.decode(self.tile, default_options={"geojson": False}),
+        )
+
+        empty = Path(self.path.parent) / "empty.mvt"
+        empty.write_bytes(b"")
+        self.assertEqual(mapbox_vector_tile.decode_from_file(empty), {})
+
+    def test_decode_from_file_cache(self):
+        from mapbox_vector_tile.cache import DecodeCache
+
+        cache = DecodeCache()
+        for _ in range(2):
+            self.assertEqual(
+                mapbox_vector_tile.decode_from_file(self.path, 6, len(self.tile), cache=cache), self.expected
+            )
+        self.assertEqual(cache.stats["hits"], 1)
+
+    def test_decode_from_file_out_of_range(self):
+        size = self.path.stat().st_size
+        for offset, length in ((size, 1), (-1, None), (0, size + 1), (2, -1)):
+            with self.assertRaises(ValueError):
+                mapbox_vector_tile.decode_from_file(self.path, offset, length)
@@ -440,6 +440,33 @@ class TestDifferentGeomFormats(BaseTestCase):
         self.assertTrue(isinstance(act_props["foo"], bool))
         self.assertFalse(isinstance(act_props["bar"], bool))
 
+    def test_encode_compact_values(self):
+        from mapbox_vector_tile.Mapbox import vector_tile_pb2 as vector_tile
+
+        properties = {"pos": 3, "neg": -3, "half": 0.5, "tenth": 0.1, "same": 3.0}
+        source = {"name": "layer", "features": [{"geometry": "POINT(0 0)", "properties": properties}]}
+        encoded = encode(source, default_options={"compact_values": True})
+        self.assertLess(len(encoded), len(encode(source)))
+
+        tile = vector_tile.tile()
+        tile.ParseFromString(encoded)
+        values = tile.layers[0].values
+        # equal numbers share one entry of the values table
+        self.assertEqual(
+            ["uint_value", "sint_value", "float_value", "double_value"],
+            [value.ListFields()[0][0].name for value in values],
+        )
+
+        decoded = decode(encoded)["layer"]["features"][0]["properties"]
+        self.assertEqual(decode(encode(source))["layer"]["features"][0]["properties"], decoded)
+        self.assertEqual(properties, decoded)
+
+    def test_encode_compact_values_large_int(self):
+        properties = {"big": 2**63}
+        source = {"name": "layer", "features": [{"geometry": "POINT(0 0)", "properties": properties}]}
+        encoded = encode(source, default_options={"compact_values": True})
+        self.assertEqual(properties, decode(encoded)["layer"]["features"][0]["properties"])
+
 
 class TestDictGeometries(BaseTestCase):
     def _test_encoder_dict(self, geometry):
@@ -559,6 +586,24 @@ class QuantizeTest(unittest.TestCase):
         exp_geom = {"type": "Point", "coordinates": [2458, 1638]}
         self.assertEqual(exp_geom, act_geom)
 
+    def test_quantize_shapes(self):
+        import numpy
+        import shapely
+
+        from mapbox_vector_tile.encoder import VectorTile
+
+        layer_encoder = VectorTile().create_layer_encoder("layername", {"quantize_bounds": (0.0, 0.0, 2048.0, 2048.0)})
+        shapes = numpy.array(
+            [wkt.loads("POINT Z (5 -0.1 7)"), wkt.loads("LINESTRING(0.25 1.25, 0.75 -0.75, 1024 2048)")], dtype=object
+        )
+        quantized = layer_encoder.quantize(shapes)
+        # the coordinates are rounded half to even, like Python's `round`, without negative zeros or z coordinates
+        self.assertEqual([[10.0, 0.0]], shapely.get_coordinates(quantized[0]).tolist())
+        self.assertEqual("0.0", str(shapely.get_coordinates(quantized[0])[0, 1]))
+        self.assertEqual(2, shapely.get_coordinate_dimension(quantized[0]))
+        self.assertEqual([[0.0, 2.0], [2.0, -2.0], [2048.0, 4096.0]], shapely.get_coordinates(quantized[1]).tolist())
+        self.assertEqual(quantized[1], layer_encoder.quantize(shapes[1]))
+
 
 class ExtentTest(unittest.TestCase):
     def test_custom_extent(self):
@@ -578,6 +623,204 @@ class ExtentTest(unittest.TestCase):
         self.assertEqual(exp_geom, act_geom)
 
 
+class FeatureOrderTest(unittest.TestCase):
+    def test_space_filling_curves(self):
+        from mapbox_vector_tile.utils import hilbert_index, zorder_index
+
+        order = 4
+        n = 1 << order
+        cells = [(x, y) for x in range(n) for y in range(n)]
+        for curve in (hilbert_index, zorder_index):
+            self.assertEqual(list(range(n * n)), sorted(curve(x, y, order) for x, y in cells))
+
+        # consecutive cells along the Hilbert curve are neighbours
+        by_index = sorted(cells, key=lambda c: hilbert_index(c[0], c[1], order))
+        for (x0, y0), (x1, y1) in zip(by_index, by_index[1:]):
+            self.assertEqual(1, abs(x1 - x0) + abs(y1 - y0))
+        self.assertEqual(0b0111, zorder_index(3, 1, order))
+
+    def test_feature_order(self):
+        points = [(4000, 4000), (10, 10), (4000, 10), (10, 4000), (20, 20)]
+        features = [{"geometry": f"POINT({x} {y})", "properties": {"i": i}} for i, (x, y) in enumerate(points)]
+        source = {"name": "layer", "features": features}
+
+        def order(**options):
+            decoded = decode(encode(source, default_options={"y_coord_down": True, **options}))
+            return [f["properties"]["i"] for f in decoded["layer"]["features"]]
+
+        self.assertEqual([0, 1, 2, 3, 4], order())
+        self.assertEqual([1, 4, 3, 0, 2], order(feature_order="hilbert"))
+        self.assertEqual([1, 4, 2, 3, 0], order(feature_order="zorder"))
+
+    def test_invalid_feature_order(self):
+        with self.assertRaises(ValueError):
+            get_encode_options(layer_options={"feature_order": "random"}, default_options=None)
+
+
+class SizeBudgetTest(unittest.TestCase):
+    def setUp(self):
+        features = []
+        for i in range(200):
+            x, y = (i % 20) * 200, (i // 20) * 400
+            size = 10 + i % 50
+            features.append(
+                {
+                    "geometry": f"POLYGON (({x} {y}, {x + size} {y}, {x + size} {y + size}, {x} {y + size}, {x} {y}))",
+                    "properties": {"rank": i, "name": f"feature {i}"},
+                }
+            )
+            features.append(
+                {
+                    "geometry": f"LINESTRING ({x} {y}, "
+                    + ", ".join(f"{x + j} {y + 3 * (j % 2)}" for j in range(1, 40))
+                    + ")",
+                    "properties": {"rank": i},
+                }
+            )
+        self.layers = [{"name": "polygons", "features": features[::2]}, {"name": "lines", "features": features[1::2]}]
+        self.full_size = len(encode(self.layers))
+
+    def test_under_budget(self):
+        self.assertEqual(encode(self.layers), encode(self.layers, max_bytes=self.full_size))
+
+    def test_drop_smallest(self):
+        max_bytes = self.full_size // 3
+        encoded = encode(self.layers, max_bytes=max_bytes)
+        self.assertLessEqual(len(encoded), max_bytes)
+        decoded = decode(encoded)
+        polygons = decoded["polygons"]["features"]
+        self.assertTrue(polygons)
+        # the largest polygons are kept
+        self.assertIn(49, [f["properties"]["rank"] for f in polygons])
+        self.assertNotIn(0, [f["properties"]["rank"] for f in polygons])
+
+    def test_drop_smallest_mixed_types(self):
+        features = [{"geometry": f"POINT ({i} {i})", "properties": {"type": "point"}} for i in range(100)]
+        features += [
+            {
+                "geometry": f"POLYGON (({i} 0, {i + 10} 0, {i + 10} 10, {i} 10, {i} 0))",
+                "properties": {"type": "polygon"},
+            }
+            for i in range(0, 1000, 10)
+        ]
+        layer = {"name": "mixed", "features": features}
+        encoded = encode(layer, max_bytes=len(encode(layer)) // 2)
+        types = [f["properties"]["type"] for f in decode(encoded)["mixed"]["features"]]
+        # the points and the polygons are dropped in the same proportion
+        self.assertTrue(30 <= types.count("point") <= 50)
+        self.assertTrue(30 <= types.count("polygon") <= 50)
+
+    def test_single_feature_layer(self):
+        layers = [
+            {
+                "name": "water",
+                "features": [{"geometry": "POLYGON ((0 0, 4000 0, 4000 4000, 0 4000, 0 0))", "properties": {"p": 100}}],
+            },
+            {
+                "name": "pois",
+                "features": [
+                    {"geometry": f"POINT ({i % 4000} {i // 4000})", "properties": {"p": i % 50}} for i in range(3000)
+                ],
+            },
+        ]
+        max_bytes = len(encode(layers)) - 10
+        for options in ({}, {"size_strategy": "priority", "priority_property": "p"}):
+            encoded = encode(layers, max_bytes=max_bytes, **options)
+            self.assertLessEqual(len(encoded), max_bytes)
+            decoded = decode(encoded)
+            # the largest, highest priority feature is kept, and only a few points are dropped
+            self.assertEqual(1, len(decoded["water"]["features"]))
+            self.assertGreater(len(decoded["pois"]["features"]), 2990)
+
+    def test_prepared_features_kept_for_budget_only(self):
+        from mapbox_vector_tile.encoder import VectorTile
+
+        tile = VectorTile(keep_prepared=False)
+        tile.add_layer("polygons", self.layers[0]["features"])
+        self.assertEqual([], tile.layer_encoders[0].prepared)
+        with self.assertRaises(ValueError):
+            tile.fit_to_size(self.full_size // 2)
+
+        tile = VectorTile()
+        tile.add_layer("polygons", self.layers[0]["features"])
+        self.assertEqual(200, len(tile.layer_encoders[0].prepared))
+
+    def test_priority(self):
+        max_bytes = self.full_size // 2
+        encoded = encode(self.layers, max_bytes=max_bytes, size_strategy="priority", priority_property="rank")
+        self.assertLessEqual(len(encoded), max_bytes)
+        ranks = [f["properties"]["rank"] for f in decode(encoded)["lines"]["features"]]
+        self.assertTrue(ranks)
+        self.assertEqual(list(range(200 - len(ranks), 200)), ranks)
+
+    def test_simplify(self):
+        max_bytes = self.full_size * 3 // 4
+        encoded = encode(self.layers, max_bytes=max_bytes, size_strategy="simplify")
+        self.assertLessEqual(len(encoded), max_bytes)
+        decoded = decode(encoded)
+        # the zigzag lines are simplified, rather than dropped
+        self.assertEqual(200, len(decoded["lines"]["features"]))
+        self.assertEqual(200, len(decoded["polygons"]["features"]))
+
+    def test_tiny_budget(self):
+        encoded = encode(self.layers, max_bytes=100)
+        self.assertLessEqual(len(encoded), 100)
+        self.assertEqual([], decode(encoded)["lines"]["features"])
+        with self.assertRaises(ValueError):
+            encode(self.layers, max_bytes=1)
+
+    def test_invalid_strategy(self):
+        with self.assertRaises(ValueError):
+            encode(self.layers, max_bytes=100, size_strategy="unknown")
+        with self.assertRaises(ValueError):
+            encode(self.layers, max_bytes=100, size_strategy="priority")
+
+
+class ThreadedEncodingTest(unittest.TestCase):
+    def setUp(self):
+        from mapbox_vector_tile.encoder import LAYER_CHUNK_SIZE
+
+        self.layers = []
+        for n_layer in range(4):
+            features = []
+            # more features than a chunk, so that the features of a layer are prepared by several threads
+            for i in range(LAYER_CHUNK_SIZE + 50):
+                x, y = (i % 30) * 130, (i // 30) * 130
+                # every fifth polygon is a self-intersecting bow tie
+                ring = (
+                    f"{x} {y}, {x + 100} {y + 100}, {x + 100} {y}, {x} {y + 100}"
+                    if i % 5 == 0
+                    else (f"{x} {y}, {x + 100} {y}, {x + 100} {y + 100}, {x} {y + 100}")
+                )
+                features.append(
+                    {"geometry": f"POLYGON (({ring}, {x} {y}))", "properties": {"layer": n_layer, "i": i % 7}}
+                )
+            self.layers.append({"name": f"layer {n_layer}", "features": features})
+
+    def test_same_tile(self):
+        from mapbox_vector_tile.encoder import on_invalid_geometry_make_valid
+
+        for options in (
+            {"on_invalid_geometry": on_invalid_geometry_make_valid},
+            {"on_invalid_geometry": on_invalid_geometry_make_valid, "feature_order": "hilbert"},
+            {"on_invalid_geometry": on_invalid_geometry_make_valid, "make_valid_engine": "geos"},
+        ):
+            expected = encode(self.layers, default_options=options)
+            self.assertEqual(expected, encode(self.layers, default_options=options, threads=4))
+
+    def test_layer_order(self):
+        decoded = decode(encode(self.layers[::-1], threads=3))
+        self.assertEqual([layer["name"] for layer in self.layers[::-1]], list(decoded))
+
+    def test_max_bytes(self):
+        max_bytes = len(encode(self.layers)) // 2
+        self.assertEqual(encode(self.layers, max_bytes=max_bytes), encode(self.layers, max_bytes=max_bytes, threads=2))
+
+    def test_invalid_threads(self):
+        with self.assertRaises(ValueError):
+            encode(self.layers, threads=0)
+
+
 class InvalidGeometryTest(unittest.TestCase):
     def test_invalid_geometry_ignore(self):
         import shapely.wkt
@@ -631,6 +874,203 @@ class InvalidGeometryTest(unittest.TestCase):
         for poly in multipolygon.geoms:
             self.assertTrue(poly.is_valid)
 
+    def test_make_valid_engine_geos(self):
+        import shapely.geometry
+
+        from mapbox_vector_tile.cache import RepairCache
+
+        on_invalid_geometry = RepairCache()
+
+        features = [
+            {"geometry": "POLYGON ((10 10, 20 10, 20 20, 15 15, 15 5, 10 10))", "properties": {"i": 0}},
+            {"geometry": "POLYGON ((0 0, 0 2, 1 1, 2 2, 2 0, 1 1, 0 0))", "properties": {"i": 1}},
+            {"geometry": "POLYGON ((0 0, 0 4, 4 4, 4 0, 0 0))", "properties": {"i": 2}},
+            {"geometry": "LINESTRING (0 0, 4 4)", "properties": {"i": 3}},
+            # collapsed polygon, which GEOS turns into an empty geometry
+            {"geometry": "POLYGON ((0 0, 10 0, 20 0, 0 0))", "properties": {"i": 4}},
+        ]
+        pbf = encode(
+            {"name": "layername", "features": features},
+            default_options={"make_valid_engine": "geos", "on_invalid_geometry": on_invalid_geometry},
+        )
+        result = decode(pbf)["layername"]["features"]
+        self.assertEqual([0, 1, 2, 3], [f["properties"]["i"] for f in result])
+        for feature in result[:3]:
+            shape = shapely.geometry.shape(feature["geometry"])
+            self.assertTrue(shape.is_valid)
+            self.assertGreater(shape.area, 0)
+        self.assertEqual(16, shapely.geometry.shape(result[2]["geometry"]).area)
+        # only the shape GEOS couldn't repair is passed to the handler
+        self.assertEqual(1, on_invalid_geometry.stats["misses"])
+
+    def test_make_valid_engine_other_handlers(self):
+        from mapbox_vector_tile.encoder import on_invalid_geometry_ignore, on_invalid_geometry_raise
+
+        source = {
+            "name": "layername",
+            "features": [{"geometry": "POLYGON ((0 0, 0 2, 1 1, 2 2, 2 0, 1 1, 0 0))", "properties": {}}],
+        }
+        # the handlers which don't repair the shapes get them as without the engine
+        for on_invalid_geometry in (None, on_invalid_geometry_ignore):
+            self.assertEqual(
+                encode(source, default_options={"on_invalid_geometry": on_invalid_geometry}),
+                encode(
+                    source, default_options={"on_invalid_geometry": on_invalid_geometry, "make_valid_engine": "geos"}
+                ),
+            )
+        self.assertEqual(
+            [],
+            decode(encode(source, default_options={"on_invalid_geometry": on_invalid_geometry_ignore}))["layername"][
+                "features"
+            ],
+        )
+        with self.assertRaises(ValueError):
+            encode(
+                source, default_options={"on_invalid_geometry": on_invalid_geometry_raise, "make_valid_engine": "geos"}
+            )
+
+    def test_make_valid_engine_shapely_version(self):
+        from unittest import mock
+
+        from mapbox_vector_tile.utils import EncodeOptions
+
+        with mock.patch("shapely.__version__", "2.0.7"):
+            with self.assertRaises(ValueError) as ex:
+                EncodeOptions(make_valid_engine="geos")
+            self.assertIn("Shapely 2.1", str(ex.exception))
+            EncodeOptions(make_valid_engine=None)
+
+    def test_make_valid_engine_keeps_valid_shapes_in_place(self):
+        from mapbox_vector_tile.encoder import on_invalid_geometry_make_valid
+
+        features = [
+            {"geometry": "POLYGON ((0 0, 0 2, 1 1, 2 2, 2 0, 1 1, 0 0))", "properties": {"i": 0}},
+            {"geometry": "POLYGON ((0 0, 0 4, 4 4, 4 0, 0 0))", "properties": {"i": 1}},
+            {"geometry": "POLYGON ((10 10, 10 13, 13 13, 13 10, 10 10))", "properties": {"i": 2}},
+        ]
+        options = {"on_invalid_geometry": on_invalid_geometry_make_valid, "make_valid_engine": "geos"}
+        pbf = encode({"name": "layername", "features": features}, default_options=options)
+        result = decode(pbf)["layername"]["features"]
+        self.assertEqual([0, 1, 2], [f["properties"]["i"] for f in result])
+        self.assertEqual([0, 0], result[1]["geometry"]["coordinates"][0][0])
+        self.assertEqual([10, 10], result[2]["geometry"]["coordinates"][0][0])
+
+    def test_make_valid_engine_matches_pyclipper(self):
+        import shapely.geometry
+
+        from mapbox_vector_tile.encoder import on_invalid_geometry_make_valid
+
+        source = {
+            "name": "layername",
+            "features": [{"geometry": "POLYGON ((10 10, 20 10, 20 20, 15 15, 15 5, 10 10))", "properties": {}}],
+        }
+        areas = []
+        for engine in (None, "geos"):
+            options = {"on_invalid_geometry": on_invalid_geometry_make_valid, "make_valid_engine": engine}
+            geometry = decode(encode(source, default_options=options))["layername"]["features"][0]["geometry"]
+            areas.append(shapely.geometry.shape(geometry).area)
+        self.assertEqual(areas[0], areas[1])
+
+    def test_repair_max_vertices(self):
+        import shapely.geometry
+
+        from mapbox_vector_tile.encoder import RepairBudgetWarning, VectorTile, on_invalid_geometry_make_valid
+
+        bowtie = "POLYGON ((0 0, 0 20, 10 10, 20 20, 20 0, 10 10, 0 0))"
+        features = [{"geometry": bowtie, "properties": {}, "id": 1}, {"geometry": "POINT (1 1)", "id": 2}]
+        for fallback, expected_area in (("convex_hull", 400), ("buffer", 200), ("simplify", 200), ("drop", None)):
+            tile = VectorTile(
+                default_options={
+                    "on_invalid_geometry": on_invalid_geometry_make_valid,
+                    "repair_max_vertices": 6,
+                    "repair_fallback": fallback,
+                }
+            )
+            with self.assertWarns(RepairBudgetWarning):
+                tile.add_layer("layer", features)
+            self.assertEqual([("layer", features[0])], tile.repair_budget_exceeded)
+            result = decode(tile.tile.SerializeToString())["layer"]["features"]
+            if expected_area is None:
+                self.assertEqual([2], [f["id"] for f in result])
+            else:
+                self.assertEqual([1, 2], [f["id"] for f in result])
+                shape = shapely.geometry.shape(result[0]["geometry"])
+                self.assertTrue(shape.is_valid)
+                self.assertEqual(expected_area, shape.area)
+
+        # within the budget, the geometry is repaired as usual
+        tile = VectorTile(
+            default_options={"on_invalid_geometry": on_invalid_geometry_make_valid, "repair_max_vertices": 7}
+        )
+        tile.add_layer("layer", features)
+        self.assertEqual([], tile.repair_budget_exceeded)
+
+    def test_repair_max_vertices_without_repair(self):
+        import warnings
+
+        from mapbox_vector_tile.encoder import RepairBudgetWarning, on_invalid_geometry_ignore
+
+        bowtie = "POLYGON ((0 0, 0 20, 10 10, 20 20, 20 0, 10 10, 0 0))"
+        source = {"name": "layer", "features": [{"geometry": bowtie, "properties": {}, "id": 1}]}
+        # without a repairing handler, the budget doesn't apply: the shape is kept as is, or dropped
+        for on_invalid_geometry, expected_ids in ((None, [1]), (on_invalid_geometry_ignore, [])):
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", RepairBudgetWarning)
+                pbf = encode(
+                    source, default_options={"on_invalid_geometry": on_invalid_geometry, "repair_max_vertices": 6}
+                )
+            self.assertEqual(pbf, encode(source, default_options={"on_invalid_geometry": on_invalid_geometry}))
+            self.assertEqual(expected_ids, [f["id"] for f in decode(pbf)["layer"]["features"]])
+
+    def test_repair_max_vertices_geos_engine(self):
+        import shapely.geometry
+
+        from mapbox_vector_tile.encoder import RepairBudgetWarning, VectorTile, on_invalid_geometry_make_valid
+
+        small_bowtie = "POLYGON ((30 0, 30 2, 31 1, 32 2, 32 0, 31 1, 30 0))"
+        bowtie = "POLYGON ((0 0, 0 20, 5 15, 10 10, 20 20, 20 0, 10 10, 0 0))"
+        features = [{"geometry": small_bowtie, "properties": {}, "id": 1}, {"geometry": bowtie, "id": 2}]
+        tile = VectorTile(
+            default_options={
+                "on_invalid_geometry": on_invalid_geometry_make_valid,
+                "make_valid_engine": "geos",
+                "repair_max_vertices": 7,
+            }
+        )
+        with self.assertWarns(RepairBudgetWarning):
+            tile.add_layer("layer", features)
+        # the shape over the vertex budget is left out of the GEOS batch and falls back to its convex hull
+        self.assertEqual([("layer", features[1])], tile.repair_budget_exceeded)
+        result = decode(tile.tile.SerializeToString())["layer"]["features"]
+        self.assertEqual([1, 2], [f["id"] for f in result])
+        self.assertEqual(400, shapely.geometry.shape(result[1]["geometry"]).area)
+        self.assertEqual(2, shapely.geometry.shape(result[0]["geometry"]).area)
+
+    def test_repair_time_budget(self):
+        import time
+
+        import shapely.geometry
+
+        from mapbox_vector_tile.encoder import RepairBudgetWarning, on_invalid_geometry_make_valid
+
+        def slow_handler(shape):
+            time.sleep(0.02)
+            return on_invalid_geometry_make_valid(shape)
+
+        source = {
+            "name": "layer",
+            "features": [{"geometry": "POLYGON ((10 10, 20 10, 20 20, 15 15, 15 5, 10 10))", "properties": {}}],
+        }
+        with self.assertWarns(RepairBudgetWarning):
+            pbf = encode(source, default_options={"on_invalid_geometry": slow_handler, "repair_time_budget": 0.001})
+        geometry = shapely.geometry.shape(decode(pbf)["layer"]["features"][0]["geometry"])
+        self.assertEqual("Polygon", geometry.geom_type)
+        self.assertEqual(75, geometry.area)
+
+    def test_invalid_repair_fallback(self):
+        with self.assertRaises(ValueError):
+            get_encode_options(layer_options={"repair_fallback": "retry"}, default_options=None)
+
     def test_bowtie_self_touching(self):
         import shapely.geometry
         import shapely.wkt
@@ -1101,6 +1541,14 @@ class OptionsTestCase(unittest.TestCase):
                 "check_winding_order": True,
                 "extents": 42,
                 "max_geometry_validate_tries": 5,
+                "compact_values": False,
+                "feature_order": None,
+                "make_valid_engine": None,
+                "repair_time_budget": None,
+                "repair_max_vertices": None,
+                "repair_fallback": "convex_hull",
+                "schema": None,
+                "geometry_cache": None,
                 "on_invalid_geometry": None,
                 "quantize_bounds": None,
             },
@@ -1112,6 +1560,14 @@ class OptionsTestCase(unittest.TestCase):
                 "check_winding_order": True,
                 "extents": 42,
                 "max_geometry_validate_tries": 5,
+                "compact_values": False,
+                "feature_order": None,
+                "make_valid_engine": None,
+                "repair_time_budget": None,
+                "repair_max_vertices": None,
+                "repair_fallback": "convex_hull",
+                "schema": None,
+                "geometry_cache": None,
                 "on_invalid_geometry": None,
                 "transformer": None,
                 "y_coord_down": False,
@@ -1124,6 +1580,14 @@ class OptionsTestCase(unittest.TestCase):
                 "check_winding_order": True,
                 "extents": 4096,
                 "max_geometry_validate_tries": 5,
+                "compact_values": False,
+                "feature_order": None,
+                "make_valid_engine": None,
+                "repair_time_budget": None,
+                "repair_max_vertices": None,
+                "repair_fallback": "convex_hull",
+                "schema": None,
+                "geometry_cache": None,
                 "on_invalid_geometry": None,
                 "transformer": None,
                 "y_coord_down": False,
@@ -1136,6 +1600,14 @@ class OptionsTestCase(unittest.TestCase):
                 "check_winding_order": True,
                 "extents": 4096,
                 "max_geometry_validate_tries": 5,
+                "compact_values": False,
+                "feature_order": None,
+                "make_valid_engine": None,
+                "repair_time_budget": None,
+                "repair_max_vertices": None,
+                "repair_fallback": "convex_hull",
+                "schema": None,
+                "geometry_cache": None,
                 "on_invalid_geometry": None,
                 "quantize_bounds": None,
             },
@@ -1162,3 +1634,42 @@ class OptionsTestCase(unittest.TestCase):
                 layer_options={"y_coord_down": False, "max_geometry_validate_tries": 25}, default_options={"extents": 0}
             )
         self.assertEqual(str(ex.exception), expected_result)
+
+    def test_encode_options_object(self):
+        import pickle
+
+        from mapbox_vector_tile.utils import EncodeOptions
+
+        options = EncodeOptions(extents=512, y_coord_down=True)
+        self.assertEqual({**DEFAULT_ENCODE_OPTIONS, "extents": 512, "y_coord_down": True}, options)
+        self.assertEqual(512, options.extents)
+        self.assertEqual(512, options["extents"])
+        # a validated options object is used as is
+        self.assertIs(options, get_encode_options(layer_options=options, default_options={"extents": 42}))
+        self.assertIs(options, get_encode_options(layer_options=None, default_options=options))
+        self.assertEqual(
+            {**options, "compact_values": True},
+            get_encode_options(layer_options={"compact_values": True}, default_options=options),
+        )
+        self.assertEqual(options, pickle.loads(pickle.dumps(options)))
+        self.assertEqual(256, options.replace(extents=256).extents)
+        self.assertEqual(512, options.extents)
+
+        with self.assertRaises(AttributeError):
+            options.extents = 42
+        with self.assertRaises(TypeError):
+            options["extents"] = 42
+        with self.assertRaises(ValueError):
+            EncodeOptions(extents=0)
+        with self.assertRaises(ValueError):
+            EncodeOptions(unknown=23)
+
+        layer = {"name": "layer", "features": [{"geometry": "LINESTRING (0 0, 10 20)", "properties": {"a": 1}}]}
+        self.assertEqual(
+            encode(layer, default_options={"extents": 512, "y_coord_down": True}),
+            encode(layer, default_options=options),
+        )
+        self.assertEqual(
+            encode(layer, per_layer_options={"layer": {"extents": 512, "y_coord_down": True}}),
+            encode(layer, per_layer_options={"layer": options}),
+        )
@@ -0,0 +1,73 @@
+"""
+Tests for vector_tile/mbtiles.py
+"""
+
+import gzip
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from mapbox_vector_tile import decode, encode
+from mapbox_vector_tile.mbtiles import MBTilesReader, MBTilesWriter
+
+
+class MBTilesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "tiles.mbtiles"
+        land = encode({"name": "land", "features": [{"geometry": "POLYGON ((0 0, 4096 0, 4096 4096, 0 4096, 0 0))"}]})
+        self.tiles = [(2, x, y, land) for x in range(4) for y in range(4)]
+        self.tiles[5] = (2, 1, 1, encode({"name": "pois", "features": [{"geometry": "POINT (1 2)"}]}))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_all(self, **kwargs):
+        with MBTilesReader(self.path, **kwargs) as reader:
+            return sorted(reader.tiles())
+
+    def test_round_trip(self):
+        with MBTilesWriter(self.path, {"name": "test", "minzoom": 2}, batch_size=3) as writer:
+            writer.write_tiles(self.tiles)
+        self.assertEqual(sorted(self.tiles), self.read_all(batch_size=5))
+        with MBTilesReader(self.path) as reader:
+            self.assertEqual({"format": "pbf", "name": "test", "minzoom": "2"}, reader.metadata)
+            self.assertEqual(self.tiles[5][3], reader.get_tile(2, 1, 1))
+            self.assertEqual(["pois"], list(decode(reader.get_tile(2, 1, 1))))
+            self.assertIsNone(reader.get_tile(3, 0, 0))
+            self.assertEqual([], list(reader.tiles(min_zoom=3)))
+
+        # the rows are stored in the TMS scheme, and the archive is left in the default journal mode
+        db = sqlite3.connect(str(self.path))
+        self.assertEqual("delete", db.execute("PRAGMA journal_mode").fetchone()[0])
+        self.assertEqual(
+            self.tiles[5][3], db.execute("SELECT tile_data FROM tiles WHERE tile_row = 2").fetchall()[1][0]
+        )
+        db.close()
+
+    def test_deduplicate(self):
+        with MBTilesWriter(self.path, deduplicate=True, compress=True) as writer:
+            writer.write_tiles(self.tiles)
+            # the tiles are replaced
+            writer.write_tile(*self.tiles[0])
+        self.assertEqual(sorted(self.tiles), self.read_all())
+
+        db = sqlite3.connect(str(self.path))
+        self.assertEqual(2, db.execute("SELECT COUNT(*) FROM images").fetchone()[0])
+        self.assertEqual(16, db.execute("SELECT COUNT(*) FROM map").fetchone()[0])
+        data = db.execute("SELECT tile_data FROM tiles").fetchone()[0]
+        self.assertEqual(b"\x1f\x8b", data[:2])
+        self.assertIn(gzip.decompress(data), {tile[3] for tile in self.tiles})
+        db.close()
+
+    def test_failed_batch(self):
+        with self.assertRaises(RuntimeError), MBTilesWriter(self.path, batch_size=10) as writer:
+            writer.write_tiles(self.tiles[:12])
+            raise RuntimeError
+        # only the committed batch is kept
+        self.assertEqual(10, len(self.read_all()))
+
+    def test_invalid_batch_size(self):
+        with self.assertRaises(ValueError):
+            MBTilesWriter(self.path, batch_size=0)
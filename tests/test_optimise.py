@@ -1,8 +1,12 @@
+import gzip
+import sqlite3
+import tempfile
 import unittest
+from pathlib import Path
 
 import mapbox_vector_tile
 from mapbox_vector_tile.Mapbox import vector_tile_pb2 as vector_tile
-from mapbox_vector_tile.optimise import optimise_tile
+from mapbox_vector_tile.optimise import OptimiseStats, main, optimise_directory, optimise_mbtiles, optimise_tile
 
 
 class BaseTestCase(unittest.TestCase):
@@ -63,3 +67,104 @@ class BaseTestCase(unittest.TestCase):
         self.assertEqual(
             decoded_geometry["coordinates"], [[[0, 0], [0, 1], [1, 1]], [[1, 1], [2, 2]], [[2, 2], [3, 2]]]
         )
+
+        # Buffer-protocol objects are parsed like the bytes
+        self.assertEqual(optimise_tile(memoryview(tile_data)), result)
+        self.assertEqual(optimise_tile(bytearray(tile_data)), result)
+
+
+class BatchOptimiseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tile_data = mapbox_vector_tile.encode(
+            {
+                "name": "water",
+                "features": [
+                    {"geometry": "MULTILINESTRING ((0 0, 0 1, 1 1), (2 2, 3 2), (1 1, 2 2))", "properties": {"a": 1}},
+                    {"geometry": "POINT (1 1)", "properties": {"b": 2, "a": 1}},
+                ],
+            }
+        )
+        self.expected = optimise_tile(self.tile_data)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_optimise_directory(self):
+        input_dir = self.root / "in"
+        for z, x, y in ((0, 0, 0), (1, 0, 1), (1, 1, 1)):
+            path = input_dir / str(z) / str(x) / f"{y}.mvt"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(self.tile_data)
+        # not a tile
+        (input_dir / "metadata.json").write_text("{}")
+
+        output_dir = self.root / "out"
+        stats = optimise_directory(input_dir, output_dir, processes=1)
+        self.assertEqual(3, stats.tiles)
+        self.assertEqual(3 * len(self.tile_data), stats.bytes_before)
+        self.assertEqual(3 * len(self.expected), stats.bytes_after)
+        self.assertEqual(self.expected, (output_dir / "1" / "1" / "1.mvt").read_bytes())
+        self.assertFalse((output_dir / "metadata.json").exists())
+        # no leftover temporary files
+        self.assertEqual(3, len([p for p in output_dir.rglob("*") if p.is_file()]))
+
+    def test_optimise_directory_in_place_gzip(self):
+        path = self.root / "2" / "1" / "3.pbf"
+        path.parent.mkdir(parents=True)
+        path.write_bytes(gzip.compress(self.tile_data))
+
+        stats = optimise_directory(self.root, processes=2)
+        self.assertEqual(1, stats.tiles)
+        self.assertEqual(self.expected, gzip.decompress(path.read_bytes()))
+
+    def test_optimise_mbtiles(self):
+        input_path = self.root / "in.mbtiles"
+        db = sqlite3.connect(str(input_path))
+        db.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        db.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+        db.execute("INSERT INTO metadata VALUES ('format', 'pbf')")
+        db.executemany(
+            "INSERT INTO tiles VALUES (?, ?, ?, ?)",
+            [(0, 0, 0, self.tile_data), (1, 0, 0, gzip.compress(self.tile_data))],
+        )
+        db.commit()
+        db.close()
+
+        output_path = self.root / "out.mbtiles"
+        stats = optimise_mbtiles(input_path, output_path, processes=1)
+        self.assertEqual(2, stats.tiles)
+
+        db = sqlite3.connect(str(output_path))
+        self.assertEqual([("format", "pbf")], db.execute("SELECT name, value FROM metadata").fetchall())
+        rows = dict(db.execute("SELECT zoom_level, tile_data FROM tiles").fetchall())
+        db.close()
+        self.assertEqual(self.expected, rows[0])
+        self.assertEqual(self.expected, gzip.decompress(rows[1]))
+
+    def test_main_single_file_is_binary(self):
+        input_path = self.root / "tile.mvt"
+        output_path = self.root / "optimised.mvt"
+        input_path.write_bytes(self.tile_data)
+        main([str(input_path), "--output-file", str(output_path)])
+        self.assertEqual(self.expected, output_path.read_bytes())
+
+    def test_stats(self):
+        stats = OptimiseStats()
+        for i in range(1, 101):
+            stats.add(10, 8, i / 1000.0)
+        self.assertEqual(100, stats.tiles)
+        self.assertEqual(1000, stats.bytes_before)
+        self.assertEqual(800, stats.bytes_after)
+        self.assertAlmostEqual(0.05, stats.percentile(50))
+        self.assertAlmostEqual(0.09, stats.percentile(90))
+        self.assertAlmostEqual(0.1, stats.percentile(100))
+        self.assertIn("tiles processed: 100", stats.summary())
+
+    def test_percentile_nearest_rank(self):
+        for n, expected in ((10, {0: 1, 50: 5, 90: 9, 100: 10}), (8, {50: 4, 90: 8}), (1, {0: 1, 50: 1, 100: 1})):
+            stats = OptimiseStats()
+            for i in range(1, n + 1):
+                stats.add(10, 8, i)
+            self.assertEqual(expected, {q: stats.percentile(q) for q in expected})
@@ -0,0 +1,106 @@
+"""
+Tests for vector_tile/pmtiles.py
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from mapbox_vector_tile import decode, encode
+from mapbox_vector_tile.pmtiles import PMTilesReader, PMTilesWriter, tile_id_to_zxy, zxy_to_tile_id
+
+
+class TileIdTest(unittest.TestCase):
+    def test_tile_ids(self):
+        tiles = [(0, 0, 0), (1, 0, 0), (1, 0, 1), (1, 1, 1), (1, 1, 0), (2, 0, 0)]
+        self.assertEqual(list(range(6)), [zxy_to_tile_id(*tile) for tile in tiles])
+        for tile in [*tiles, (12, 3423, 1763), (20, 1, 1), (20, 2**20 - 1, 0)]:
+            self.assertEqual(tile, tile_id_to_zxy(zxy_to_tile_id(*tile)))
+        with self.assertRaises(ValueError):
+            zxy_to_tile_id(1, 2, 0)
+
+
+class PMTilesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "tiles.pmtiles"
+        self.ocean = encode({"name": "water", "features": [{"geometry": "POLYGON ((0 0, 4096 0, 4096 4096, 0 0))"}]})
+        self.tiles = {(3, x, y): self.ocean for x in range(8) for y in range(8)}
+        for i in range(10):
+            self.tiles[3, i % 8, i // 8] = encode({"name": "pois", "features": [{"geometry": f"POINT ({i} {i})"}]})
+        self.tiles[0, 0, 0] = encode({"name": "land", "features": [{"geometry": "POINT (1 1)"}]})
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, **kwargs):
+        with PMTilesWriter(self.path, {"name": "test"}, **kwargs) as writer:
+            writer.write_tiles((z, x, y, data) for (z, x, y), data in self.tiles.items())
+
+    def read_all(self):
+        with PMTilesReader(self.path) as reader:
+            return {(z, x, y): bytes(data) for z, x, y, data in reader.tiles()}
+
+    def test_round_trip(self):
+        self.write()
+        self.assertEqual(self.tiles, self.read_all())
+        with PMTilesReader(self.path) as reader:
+            self.assertEqual({"name": "test"}, reader.metadata)
+            self.assertEqual((0, 3), (reader.min_zoom, reader.max_zoom))
+            tile = reader.get_tile(3, 1, 1)
+            self.assertIsInstance(tile, memoryview)
+            self.assertEqual(["pois"], list(decode(tile)))
+            tile.release()
+            self.assertEqual(self.ocean, bytes(reader.get_tile(3, 7, 7)))
+            self.assertIsNone(reader.get_tile(1, 0, 0))
+            self.assertIsNone(reader.get_tile(4, 0, 0))
+
+    def test_deduplicate(self):
+        self.write()
+        # the ocean tile is stored once, and the runs of consecutive ocean tiles share a directory entry
+        self.assertLess(self.path.stat().st_size, 11 * len(self.ocean) + 1024)
+        with PMTilesReader(self.path) as reader:
+            entries = list(reader._entries(reader.root_offset, reader.root_length))
+        self.assertLess(len(entries), len(self.tiles))
+        self.assertEqual(len(self.tiles), sum(run_length for _, run_length, _, _ in entries))
+
+    def test_data_layout(self):
+        self.write()
+        with PMTilesReader(self.path) as reader:
+            entries = list(reader._entries(reader.root_offset, reader.root_length))
+            # the unique tiles are copied from the spool in the order of the tile ids
+            offsets = [offset for _, _, offset, _ in entries]
+            self.assertEqual(sorted(set(offsets)), list(dict.fromkeys(offsets)))
+            self.assertEqual(sum(len(data) for data in set(self.tiles.values())), reader.data_length)
+
+    def test_empty(self):
+        with PMTilesWriter(self.path):
+            pass
+        self.assertEqual({}, self.read_all())
+
+    def test_compress(self):
+        self.write(compress=True)
+        self.assertEqual(self.tiles, self.read_all())
+
+    @mock.patch("mapbox_vector_tile.pmtiles.PMTILES_ROOT_SIZE", 160)
+    @mock.patch("mapbox_vector_tile.pmtiles.PMTILES_LEAF_SIZE", 2)
+    def test_leaf_directories(self):
+        self.write()
+        self.assertEqual(self.tiles, self.read_all())
+        with PMTilesReader(self.path, cache_size=2) as reader:
+            self.assertGreater(reader.leaves_length, 0)
+            for (z, x, y), data in self.tiles.items():
+                self.assertEqual(data, bytes(reader.get_tile(z, x, y)))
+            self.assertEqual(2, len(reader._directories))
+
+    def test_duplicate_tile(self):
+        with self.assertRaises(ValueError), PMTilesWriter(self.path) as writer:
+            writer.write_tile(0, 0, 0, self.ocean)
+            writer.write_tile(0, 0, 0, self.ocean)
+        self.assertFalse(self.path.exists())
+
+    def test_invalid_archive(self):
+        self.path.write_bytes(b"not an archive")
+        with self.assertRaises(ValueError):
+            PMTilesReader(self.path)
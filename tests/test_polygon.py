@@ -6,8 +6,9 @@ import unittest
 from pathlib import Path
 
 from shapely import wkt
+from shapely.geometry import Polygon
 
-from mapbox_vector_tile.polygon import make_it_valid
+from mapbox_vector_tile.polygon import RepairBudgetExceededError, make_it_valid, repair_time_budget
 
 
 class TestPolygonMakeValid(unittest.TestCase):
@@ -227,3 +228,27 @@ class TestPolygonMakeValid(unittest.TestCase):
         # and the smaller inners sum up to area 11, so we'll take +/-6 from
         # 1545.
         self.assertAlmostEqual(1545, fixed.area, delta=6)
+
+    def test_polygon_thousands_of_inners(self):
+        inners = []
+        for i in range(40):
+            for j in range(40):
+                x, y = 10 + 20 * i, 10 + 20 * j
+                inners.append([(x, y), (x, y + 5), (x + 5, y + 5), (x + 5, y), (x, y)])
+        # duplicating an inner makes the polygon invalid, and the even-odd rule fills it back
+        geom = Polygon([(0, 0), (0, 820), (820, 820), (820, 0), (0, 0)], [*inners, inners[0]])
+        self.assertFalse(geom.is_valid)
+        fixed = make_it_valid(geom)
+        self.assertTrue(fixed.is_valid)
+        self.assertEqual("Polygon", fixed.geom_type)
+        self.assertEqual(1599, len(fixed.interiors))
+        self.assertEqual(820 * 820 - 1599 * 25, fixed.area)
+
+    def test_repair_time_budget(self):
+        geom = wkt.loads("POLYGON ((0 0, 0 2, 1 1, 2 2, 2 0, 1 1, 0 0))")
+        with self.assertRaises(RepairBudgetExceededError), repair_time_budget(-1):
+            make_it_valid(geom)
+        with repair_time_budget(60):
+            self.assertTrue(make_it_valid(geom).is_valid)
+        with repair_time_budget(None):
+            self.assertTrue(make_it_valid(geom).is_valid)
@@ -0,0 +1,91 @@
+"""
+Tests for vector_tile/pyramid.py
+"""
+
+import unittest
+
+import shapely
+
+from mapbox_vector_tile import decode, encode
+from mapbox_vector_tile.pyramid import TilePyramid
+from mapbox_vector_tile.tiles import tile_bounds
+
+
+class TilePyramidTest(unittest.TestCase):
+    def setUp(self):
+        self.layers = [
+            {
+                "name": "pois",
+                "features": [
+                    {"geometry": "POINT (-1000000 1000000)", "properties": {"kind": "school"}, "id": 1},
+                    {"geometry": "POINT (1000000 -1000000)", "properties": {"kind": "shop"}, "id": 2},
+                ],
+            },
+            {
+                "name": "roads",
+                "features": [{"geometry": "LINESTRING (-3000000 10, 3000000 10)", "properties": {"kind": "primary"}}],
+                "min_zoom": 1,
+            },
+        ]
+
+    def test_tiles(self):
+        pyramid = TilePyramid(self.layers, max_zoom=2, lonlat=False, buffer=0)
+        tiles = {(z, x, y): data for z, x, y, data in pyramid.tiles()}
+        self.assertEqual([(0, 0, 0), (1, 0, 0), (1, 1, 0), (1, 1, 1), (2, 1, 1), (2, 2, 1), (2, 2, 2)], list(tiles))
+        self.assertEqual(["pois"], list(decode(tiles[0, 0, 0])))
+        self.assertEqual(["pois", "roads"], list(decode(tiles[1, 0, 0])))
+        self.assertEqual(["roads"], list(decode(tiles[1, 1, 0])))
+
+        expected = encode(
+            [
+                {"name": "pois", "features": [self.layers[0]["features"][0]]},
+                {
+                    "name": "roads",
+                    "features": [{"geometry": "LINESTRING (-3000000 10, 0 10)", "properties": {"kind": "primary"}}],
+                },
+            ],
+            default_options={"quantize_bounds": tile_bounds(1, 0, 0)},
+        )
+        self.assertEqual(decode(expected), decode(tiles[1, 0, 0]))
+
+    def test_buffer(self):
+        pyramid = TilePyramid(self.layers[1:], min_zoom=1, max_zoom=1, lonlat=False, buffer=64)
+        tiles = {(z, x, y): data for z, x, y, data in pyramid.tiles()}
+        # the line touches the buffer of the southern tiles
+        self.assertEqual([(1, 0, 0), (1, 0, 1), (1, 1, 0), (1, 1, 1)], list(tiles))
+        coordinates = decode(tiles[1, 1, 0])["roads"]["features"][0]["geometry"]["coordinates"]
+        self.assertEqual([[-64, 0], [613, 0]], coordinates)
+
+    def test_lonlat(self):
+        layers = [{"name": "pois", "features": [{"geometry": shapely.Point(2.35, 48.85), "properties": {}}]}]
+        tiles = [(z, x, y) for z, x, y, _ in TilePyramid(layers, max_zoom=10, buffer=0).tiles()]
+        self.assertEqual((10, 518, 352), tiles[-1])
+        self.assertEqual(11, len(tiles))
+
+    def test_geometry_formats(self):
+        expected = list(TilePyramid(self.layers, max_zoom=2, lonlat=False).tiles())
+        for to_spec in (
+            lambda geometry: geometry,
+            lambda geometry: geometry.wkb,
+            lambda geometry: geometry.wkb_hex,
+        ):
+            layers = [
+                {
+                    **layer,
+                    "features": [
+                        {**f, "geometry": to_spec(shapely.from_wkt(f["geometry"]))} for f in layer["features"]
+                    ],
+                }
+                for layer in self.layers
+            ]
+            self.assertEqual(expected, list(TilePyramid(layers, max_zoom=2, lonlat=False).tiles()))
+
+    def test_processes(self):
+        pyramid = TilePyramid(self.layers, max_zoom=4, lonlat=False)
+        self.assertEqual(list(pyramid.tiles()), list(pyramid.tiles(processes=2)))
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            TilePyramid(self.layers, min_zoom=3, max_zoom=2)
+        with self.assertRaises(ValueError):
+            TilePyramid(self.layers, buffer=-1)
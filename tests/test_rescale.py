@@ -0,0 +1,179 @@
+"""
+Tests for vector_tile/rescale.py
+"""
+
+import unittest
+
+from shapely.geometry import shape
+
+from mapbox_vector_tile import decode, encode
+from mapbox_vector_tile.Mapbox import vector_tile_pb2 as vector_tile
+from mapbox_vector_tile.rescale import decode_geometry, encode_geometry, overzoom, rescale_extent
+
+RAW_OPTIONS = {"y_coord_down": True}
+
+
+def features(tile_bytes, layer_name):
+    return decode(tile_bytes, default_options=RAW_OPTIONS)[layer_name]["features"]
+
+
+class CommandStreamTest(unittest.TestCase):
+    def test_round_trip(self):
+        tile = encode(
+            {
+                "name": "layer",
+                "features": [
+                    {"geometry": "MULTIPOINT (1 2, 30 40)"},
+                    {"geometry": "MULTILINESTRING ((0 0, 10 0, 10 10), (20 20, 30 30))"},
+                    {"geometry": "POLYGON ((0 0, 100 0, 100 100, 0 100, 0 0), (10 10, 10 20, 20 20, 20 10, 10 10))"},
+                ],
+            },
+            default_options=RAW_OPTIONS,
+        )
+        parsed = vector_tile.tile()
+        parsed.ParseFromString(tile)
+        for feature in parsed.layers[0].features:
+            parts = decode_geometry(feature.geometry)
+            self.assertEqual(list(feature.geometry), encode_geometry(feature.type, parts))
+        self.assertEqual(
+            [[(0, 0), (10, 0), (10, 10)], [(20, 20), (30, 30)]], decode_geometry(parsed.layers[0].features[1].geometry)
+        )
+
+
+class OverzoomTest(unittest.TestCase):
+    def setUp(self):
+        self.parent = encode(
+            [
+                {
+                    "name": "pois",
+                    "features": [
+                        {"geometry": "POINT (1024 1024)", "properties": {"kind": "school"}},
+                        {"geometry": "POINT (3072 1024)", "properties": {"kind": "shop"}},
+                    ],
+                },
+                {
+                    "name": "roads",
+                    "features": [{"geometry": "LINESTRING (1000 1000, 3000 1000, 3000 3000)", "properties": {}}],
+                },
+                {
+                    "name": "water",
+                    "features": [
+                        {"geometry": "POLYGON ((100 100, 500 100, 500 500, 100 500, 100 100))"},
+                        {
+                            "geometry": "POLYGON ((1000 1000, 3000 1000, 3000 3000, 1000 3000, 1000 1000), "
+                            "(1200 1200, 1200 1400, 1400 1400, 1400 1200, 1200 1200))"
+                        },
+                    ],
+                },
+            ],
+            default_options=RAW_OPTIONS,
+        )
+
+    def test_points(self):
+        child = overzoom(self.parent, (10, 100, 200), (11, 200, 400))
+        pois = features(child, "pois")
+        self.assertEqual([{"kind": "school"}], [f["properties"] for f in pois])
+        self.assertEqual([2048, 2048], pois[0]["geometry"]["coordinates"])
+
+        child = overzoom(self.parent, (10, 100, 200), (12, 403, 801))
+        pois = features(child, "pois")
+        self.assertEqual([{"kind": "shop"}], [f["properties"] for f in pois])
+        self.assertEqual([0, 0], pois[0]["geometry"]["coordinates"])
+
+    def test_pruned_values(self):
+        tile = vector_tile.tile()
+        tile.ParseFromString(overzoom(self.parent, (10, 100, 200), (11, 200, 400)))
+        pois = tile.layers[0]
+        self.assertEqual(["kind"], list(pois.keys))
+        self.assertEqual(["school"], [value.string_value for value in pois.values])
+
+    def test_lines(self):
+        roads = features(overzoom(self.parent, (10, 100, 200), (11, 200, 400)), "roads")
+        self.assertEqual([[2000, 2000], [4096, 2000]], roads[0]["geometry"]["coordinates"])
+        roads = features(overzoom(self.parent, (10, 100, 200), (11, 201, 400), buffer=8), "roads")
+        self.assertEqual([[-8, 2000], [1904, 2000], [1904, 4104]], roads[0]["geometry"]["coordinates"])
+        # the line doesn't cross the child tile
+        self.assertEqual([], features(overzoom(self.parent, (10, 100, 200), (12, 400, 803)), "roads"))
+
+    def test_polygons(self):
+        water = features(overzoom(self.parent, (10, 100, 200), (11, 200, 400)), "water")
+        self.assertEqual(2, len(water))
+        # the small square is inside the child tile, and is only scaled
+        self.assertEqual(800 * 800, shape(water[0]["geometry"]).area)
+        # the large square is clipped by GEOS, with its hole inside the child tile
+        clipped = shape(water[1]["geometry"])
+        self.assertTrue(clipped.is_valid)
+        self.assertEqual(2096 * 2096 - 400 * 400, clipped.area)
+
+        water = features(overzoom(self.parent, (10, 100, 200), (11, 201, 401)), "water")
+        self.assertEqual(1, len(water))
+        self.assertEqual(1904 * 1904, shape(water[0]["geometry"]).area)
+
+    def test_layers(self):
+        # the layers are kept, even without features
+        child = overzoom(self.parent, (10, 100, 200), (12, 400, 803))
+        self.assertEqual(["pois", "roads", "water"], list(decode(child)))
+        self.assertEqual(self.parent, overzoom(self.parent, (10, 100, 200), (10, 100, 200)))
+
+    def test_invalid_tiles(self):
+        with self.assertRaises(ValueError):
+            overzoom(self.parent, (10, 100, 200), (11, 202, 400))
+        with self.assertRaises(ValueError):
+            overzoom(self.parent, (10, 100, 200), (9, 50, 100))
+        with self.assertRaises(ValueError):
+            overzoom(self.parent, (10, 100, 200), (11, 200, 400), buffer=-1)
+
+
+class RescaleExtentTest(unittest.TestCase):
+    def setUp(self):
+        self.layers = [
+            {
+                "name": "pois",
+                "features": [
+                    {"geometry": "MULTIPOINT (1024 1024, 3000 17)", "properties": {"kind": "school"}},
+                ],
+            },
+            {
+                "name": "roads",
+                "features": [
+                    {"geometry": "LINESTRING (1000 1000, 3000 1003, 3001 3000)", "properties": {"kind": "primary"}},
+                    # too short to survive at the lower extent
+                    {"geometry": "LINESTRING (96 96, 99 99)", "properties": {"kind": "track"}},
+                ],
+            },
+            {
+                "name": "water",
+                "features": [
+                    {
+                        "geometry": "POLYGON ((1000 1000, 3000 1000, 3000 3000, 1000 3000, 1000 1000), "
+                        "(1200 1200, 1200 1400, 1400 1400, 1400 1200, 1200 1200), "
+                        "(2000 2000, 2000 2002, 2002 2002, 2002 2000, 2000 2000))"
+                    },
+                    {"geometry": "POLYGON ((10 10, 13 10, 13 13, 10 13, 10 10))"},
+                ],
+            },
+        ]
+        self.tile = encode(self.layers)
+
+    def test_same_as_encode(self):
+        rescaled = rescale_extent(self.tile, 512)
+        expected = encode(self.layers, default_options={"extents": 512, "quantize_bounds": (0, 0, 4096, 4096)})
+        self.assertEqual(decode(expected), decode(rescaled))
+        self.assertEqual(512, decode(rescaled)["roads"]["extent"])
+        # the degenerate geometries are dropped
+        self.assertEqual(1, len(decode(rescaled)["roads"]["features"]))
+        self.assertEqual(2, len(decode(rescaled)["water"]["features"][0]["geometry"]["coordinates"]))
+
+    def test_pruned_values(self):
+        tile = vector_tile.tile()
+        tile.ParseFromString(rescale_extent(self.tile, 512))
+        self.assertEqual(["primary"], [value.string_value for value in tile.layers[1].values])
+
+    def test_upscale(self):
+        rescaled = rescale_extent(rescale_extent(self.tile, 8192), 4096)
+        self.assertEqual(decode(self.tile), decode(rescaled))
+        self.assertEqual(self.tile, rescale_extent(self.tile, 4096))
+
+    def test_invalid_extent(self):
+        with self.assertRaises(ValueError):
+            rescale_extent(self.tile, 0)
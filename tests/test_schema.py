@@ -0,0 +1,74 @@
+"""
+Tests for vector_tile/schema.py
+"""
+
+import unittest
+
+from mapbox_vector_tile import decode, encode
+from mapbox_vector_tile.Mapbox import vector_tile_pb2 as vector_tile
+from mapbox_vector_tile.schema import LayerSchema
+
+
+class LayerSchemaTest(unittest.TestCase):
+    def setUp(self):
+        kinds = ["primary", "secondary", "track"]
+        self.features = [
+            {
+                "geometry": f"LINESTRING ({i} 0, {i} 100)",
+                "properties": {"kind": kinds[i % 3], "lanes": i % 4, "oneway": i % 2 == 0, "name": f"road {i}"},
+            }
+            for i in range(30)
+        ]
+        self.layer = {"name": "roads", "features": self.features}
+        self.schema = LayerSchema(keys=["kind", "lanes", "oneway", "unused"], values=["primary", "secondary", True, 1])
+
+    def test_same_properties(self):
+        self.assertEqual(
+            decode(encode(self.layer)), decode(encode(self.layer, default_options={"schema": self.schema}))
+        )
+
+    def test_tables(self):
+        tile = vector_tile.tile()
+        tile.ParseFromString(encode(self.layer, default_options={"schema": self.schema}))
+        layer = tile.layers[0]
+        # the schema comes first, then the undeclared keys and values
+        self.assertEqual(["kind", "lanes", "oneway", "unused", "name"], list(layer.keys))
+        self.assertEqual("primary", layer.values[0].string_value)
+        self.assertEqual("secondary", layer.values[1].string_value)
+        self.assertTrue(layer.values[2].bool_value)
+        self.assertEqual(1, layer.values[3].int_value)
+        self.assertEqual([0, 1, 1, 3], list(layer.features[1].tags[:4]))
+        # values are not duplicated
+        self.assertEqual(len({str(value) for value in layer.values}), len(layer.values))
+
+    def test_compact_values(self):
+        options = {"schema": LayerSchema(keys=["lanes"], values=[1, -1, 0.5]), "compact_values": True}
+        tile = vector_tile.tile()
+        tile.ParseFromString(encode(self.layer, default_options=options))
+        values = tile.layers[0].values
+        self.assertEqual(1, values[0].uint_value)
+        self.assertEqual(-1, values[1].sint_value)
+        self.assertEqual(0.5, values[2].float_value)
+
+    def test_reused_schema(self):
+        for n_tile in range(3):
+            layer = {"name": "roads", "features": self.features[n_tile::3]}
+            self.assertEqual(decode(encode(layer)), decode(encode(layer, default_options={"schema": self.schema})))
+
+    def test_max_bytes(self):
+        max_bytes = len(encode(self.layer, default_options={"schema": self.schema})) // 2
+        encoded = encode(self.layer, default_options={"schema": self.schema}, max_bytes=max_bytes)
+        self.assertLessEqual(len(encoded), max_bytes)
+        tile = vector_tile.tile()
+        tile.ParseFromString(encoded)
+        self.assertEqual(["kind", "lanes", "oneway", "unused"], list(tile.layers[0].keys[:4]))
+
+    def test_invalid_schema(self):
+        with self.assertRaises(ValueError):
+            LayerSchema(keys=["kind", "kind"])
+        with self.assertRaises(ValueError):
+            LayerSchema(keys=[1])
+        with self.assertRaises(ValueError):
+            LayerSchema(keys=["kind"], values=[None])
+        with self.assertRaises(ValueError):
+            encode(self.layer, default_options={"schema": ["kind"]})
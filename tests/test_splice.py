@@ -0,0 +1,141 @@
+"""
+Tests for vector_tile/splice.py
+"""
+
+import unittest
+
+from mapbox_vector_tile import decode, encode
+from mapbox_vector_tile.splice import (
+    add_layer,
+    drop_layers,
+    filter_tile,
+    get_layer,
+    list_layers,
+    merge_tiles,
+    replace_layer,
+)
+
+
+def make_layer(name, n_features=3, offset=0):
+    return {
+        "name": name,
+        "features": [
+            {"geometry": f"POINT ({i + offset} {2 * i})", "properties": {"layer": name, "i": i}}
+            for i in range(n_features)
+        ],
+    }
+
+
+class SpliceTest(unittest.TestCase):
+    def setUp(self):
+        self.layers = [make_layer("water"), make_layer("roads", 200), make_layer("pois")]
+        self.tile = encode(self.layers)
+
+    def test_list_layers(self):
+        self.assertEqual(["water", "roads", "pois"], list_layers(self.tile))
+        self.assertEqual([], list_layers(b""))
+        self.assertEqual(["water", "roads", "pois"], list_layers(memoryview(self.tile)))
+
+    def test_drop_layers(self):
+        self.assertEqual(encode([self.layers[0], self.layers[2]]), drop_layers(self.tile, ["roads"]))
+        self.assertEqual(encode(self.layers[1:]), drop_layers(self.tile, "water"))
+        self.assertEqual(self.tile, drop_layers(self.tile, ["unknown"]))
+
+    def test_replace_layer(self):
+        new_roads = make_layer("roads", 5, offset=100)
+        layer_bytes = get_layer(encode(new_roads), "roads")
+        replaced = replace_layer(self.tile, "roads", layer_bytes)
+        self.assertEqual(encode([self.layers[0], new_roads, self.layers[2]]), replaced)
+        self.assertEqual(decode(encode([self.layers[0], new_roads, self.layers[2]])), decode(replaced))
+
+        # the layer is appended when it is missing
+        buildings = make_layer("buildings")
+        self.assertEqual(
+            encode([*self.layers, buildings]),
+            replace_layer(self.tile, "buildings", get_layer(encode(buildings), "buildings")),
+        )
+
+        with self.assertRaises(ValueError):
+            replace_layer(self.tile, "roads", get_layer(self.tile, "water"))
+
+    def test_add_layer(self):
+        buildings = make_layer("buildings")
+        self.assertEqual(
+            encode([*self.layers, buildings]), add_layer(self.tile, get_layer(encode(buildings), "buildings"))
+        )
+        with self.assertRaises(ValueError) as ex:
+            add_layer(self.tile, get_layer(self.tile, "pois"))
+        self.assertEqual("The layer name 'pois' already exists in the vector tile.", str(ex.exception))
+
+    def test_merge_tiles(self):
+        tiles = [encode(layer) for layer in self.layers]
+        self.assertEqual(self.tile, merge_tiles(tiles))
+        with self.assertRaises(ValueError):
+            merge_tiles([self.tile, tiles[1]])
+
+    def test_get_layer(self):
+        self.assertIsNone(get_layer(self.tile, "unknown"))
+        self.assertEqual(
+            self.tile, merge_tiles([add_layer(b"", get_layer(self.tile, name)) for name in list_layers(self.tile)])
+        )
+
+    def test_invalid_tile(self):
+        with self.assertRaises(ValueError):
+            list_layers(self.tile[:-3])
+        with self.assertRaises(ValueError):
+            list_layers(b"\xff")
+
+
+class FilterTileTest(unittest.TestCase):
+    def setUp(self):
+        self.layers = [
+            {
+                "name": "pois",
+                "features": [
+                    {"geometry": f"POINT ({i} {i})", "properties": {"kind": ["school", "shop"][i % 2], "debug": i}}
+                    for i in range(10)
+                ],
+            },
+            make_layer("roads"),
+        ]
+        self.tile = encode(self.layers)
+
+    def expected(self, layers):
+        return decode(encode(layers))
+
+    def test_layers(self):
+        self.assertEqual(self.expected(self.layers[1:]), decode(filter_tile(self.tile, layers=["roads"])))
+        self.assertEqual(encode(self.layers[1:]), filter_tile(self.tile, layers="roads"))
+        self.assertEqual(self.tile, filter_tile(self.tile))
+
+    def test_keys(self):
+        without_debug = [
+            {
+                "name": "pois",
+                "features": [
+                    {"geometry": feature["geometry"], "properties": {"kind": feature["properties"]["kind"]}}
+                    for feature in self.layers[0]["features"]
+                ],
+            },
+            {
+                "name": "roads",
+                "features": [
+                    {"geometry": feature["geometry"], "properties": {}} for feature in self.layers[1]["features"]
+                ],
+            },
+        ]
+        self.assertEqual(self.expected(without_debug), decode(filter_tile(self.tile, keep_keys=["kind"])))
+        filtered = filter_tile(self.tile, drop_keys=["debug", "layer", "i"])
+        self.assertEqual(self.expected(without_debug), decode(filtered))
+        # the value tables are compacted
+        self.assertEqual(encode(without_debug), filtered)
+
+    def test_feature_predicate(self):
+        def is_school(layer_name, feature):
+            return layer_name != "pois" or feature["properties"]["kind"] == "school"
+
+        schools = [
+            {"name": "pois", "features": self.layers[0]["features"][::2]},
+            self.layers[1],
+        ]
+        self.assertEqual(encode(schools), filter_tile(self.tile, feature_predicate=is_school))
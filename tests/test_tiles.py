@@ -0,0 +1,83 @@
+"""
+Tests for vector_tile/tiles.py
+"""
+
+import unittest
+
+import shapely
+
+from mapbox_vector_tile.tiles import MERCATOR_HALF_SIZE, _bbox_cover, lonlat_to_mercator, tile_bounds, tile_cover
+
+
+class TileMathTest(unittest.TestCase):
+    def test_tile_bounds(self):
+        h = MERCATOR_HALF_SIZE
+        self.assertEqual((-h, -h, h, h), tile_bounds(0, 0, 0))
+        self.assertEqual((-h, 0, 0, h), tile_bounds(1, 0, 0))
+        self.assertEqual((0, -h, h, 0), tile_bounds(1, 1, 1))
+
+    def test_lonlat_to_mercator(self):
+        point = lonlat_to_mercator(shapely.Point(180, 0))
+        self.assertAlmostEqual(MERCATOR_HALF_SIZE, point.x)
+        self.assertAlmostEqual(0, point.y)
+        # the latitudes are clamped to the Web Mercator world
+        self.assertAlmostEqual(MERCATOR_HALF_SIZE, lonlat_to_mercator(shapely.Point(0, 90)).y, places=3)
+
+    def test_bbox_cover(self):
+        h = MERCATOR_HALF_SIZE
+        bounds = [(-h, -h, h, h), (1, 1, 2, 2), (float("nan"),) * 4, (-1, -1, 1, 1)]
+        indices, x, y = _bbox_cover(bounds, 1)
+        self.assertEqual(
+            [(0, 0, 0), (0, 1, 0), (0, 0, 1), (0, 1, 1), (1, 1, 0), (3, 0, 0), (3, 1, 0), (3, 0, 1), (3, 1, 1)],
+            list(zip(indices.tolist(), x.tolist(), y.tolist())),
+        )
+
+
+class TileCoverTest(unittest.TestCase):
+    def setUp(self):
+        # in tile units of the zoom level 3, away from the grid lines
+        def mercator(geometry):
+            size = 2 * MERCATOR_HALF_SIZE / 8
+            return shapely.transform(geometry, lambda c: c * (size, -size) + (-MERCATOR_HALF_SIZE, MERCATOR_HALF_SIZE))
+
+        self.geometries = [
+            mercator(shapely.from_wkt(wkt))
+            for wkt in (
+                "POINT (2.5 3.5)",
+                "LINESTRING (0.5 0.5, 7.5 7.1)",
+                "POLYGON ((0.5 0.5, 6.5 0.5, 6.5 6.5, 0.5 6.5, 0.5 0.5), "
+                "(1.5 1.5, 1.5 5.5, 5.5 5.5, 5.5 1.5, 1.5 1.5))",
+                "MULTIPOINT (0.5 0.5, 7.5 7.5)",
+                "POINT EMPTY",
+                "GEOMETRYCOLLECTION (POINT (4.2 4.2), LINESTRING (1.1 6.6, 1.2 6.7))",
+            )
+        ]
+
+    def expected(self, exact):
+        rows = []
+        for index, geometry in enumerate(self.geometries):
+            for y in range(8):
+                for x in range(8):
+                    tile = shapely.box(*tile_bounds(3, x, y))
+                    target = geometry if exact else shapely.box(*geometry.bounds)
+                    if not geometry.is_empty and target.intersects(tile) and not target.touches(tile):
+                        rows.append((index, x, y))
+        return rows
+
+    def test_bbox(self):
+        cover = tile_cover(self.geometries, 3)
+        self.assertEqual(self.expected(exact=False), [tuple(row) for row in cover.tolist()])
+
+    def test_exact(self):
+        cover = tile_cover(self.geometries, 3, exact=True)
+        self.assertEqual(self.expected(exact=True), [tuple(row) for row in cover.tolist()])
+        # the diagonal line crosses 15 tiles, out of the 64 tiles of its bounding box
+        self.assertEqual(15, sum(1 for row in cover.tolist() if row[0] == 1))
+        # the tiles inside the hole of the polygon are not covered
+        self.assertNotIn([2, 3, 3], cover.tolist())
+        self.assertIn([2, 3, 0], cover.tolist())
+
+    def test_empty(self):
+        self.assertEqual((0, 3), tile_cover([], 5).shape)
+        self.assertEqual((0, 3), tile_cover([], 5, exact=True).shape)
+        self.assertEqual([[0, 16, 15]], tile_cover(shapely.Point(1, 1), 5, exact=True).tolist())